@@ -0,0 +1,169 @@
+import logging
+import re
+import threading
+import time
+from ipaddress import IPv6Address
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ip_snapshot import IPSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Export formats served by /malicious-ips/blocklist, with their content types
+BLOCKLIST_FORMATS = {
+    "text": "text/plain; charset=utf-8",
+    "ipset": "text/plain; charset=utf-8",
+    "nftables": "text/plain; charset=utf-8",
+}
+# Rendered exports kept per snapshot generation (one per format and filter combination)
+BLOCKLIST_CACHE_SIZE = 32
+DEFAULT_SET_NAME = "lctm_blocklist"
+# ipset names are at most 31 characters, and the IPv6 set appends "6" to the name
+SET_NAME = re.compile(r"[A-Za-z0-9_][A-Za-z0-9_.-]{0,29}")
+# Elements per "add element" statement in nftables output
+NFT_CHUNK = 1000
+
+
+def collapse_ranges(addresses: Iterable[int]) -> Iterator[Tuple[int, int]]:
+    """Runs of consecutive addresses, as inclusive (first, last) pairs; ``addresses`` must be sorted."""
+    first = last = None
+    for address in addresses:
+        if last is not None and address == last + 1:
+            last = address
+            continue
+        if last is not None and address == last:
+            continue
+        if first is not None:
+            yield first, last
+        first = last = address
+    if first is not None:
+        yield first, last
+
+
+def range_cidrs(first: int, last: int, bits: int) -> Iterator[Tuple[int, int]]:
+    """The fewest aligned blocks covering exactly ``first``..``last``, as (network, prefix length)."""
+    while first <= last:
+        # Largest block that starts at ``first`` (alignment) and does not run past ``last``
+        alignment = (first & -first).bit_length() - 1 if first else bits
+        span = (last - first + 1).bit_length() - 1
+        host_bits = min(alignment, span)
+        yield first, bits - host_bits
+        first += 1 << host_bits
+
+
+def minimal_cidrs(addresses: Iterable[int], bits: int) -> List[Tuple[int, int]]:
+    """Minimal CIDR list matching exactly the sorted ``addresses`` (nothing outside the set is covered)."""
+    return [block for first, last in collapse_ranges(addresses) for block in range_cidrs(first, last, bits)]
+
+
+def format_cidr(network: int, prefix: int, version: int) -> str:
+    if version == 4:
+        address = ".".join(str((network >> shift) & 0xFF) for shift in (24, 16, 8, 0))
+    else:
+        address = str(IPv6Address(network))
+    return f"{address}/{prefix}"
+
+
+class Blocklist:
+    """Minimal CIDR blocks of one snapshot, optionally limited to some sources and types.
+
+    A record is kept when any of ``sources`` listed it and its type is one of
+    ``types`` (None keeps all). The snapshot's addresses are already sorted,
+    so adjacent addresses are merged in one pass per family.
+    """
+    def __init__(self, snapshot: IPSnapshot, sources: Optional[List[str]] = None, types: Optional[List[str]] = None):
+        started = time.perf_counter()
+        self.generation = snapshot.generation
+        mask = 0
+        for name in sources or ():
+            mask |= 1 << snapshot.sources.index(name)
+        type_ids = None if types is None else {index for index, name in enumerate(snapshot.types) if name in types}
+        masks, record_types = snapshot.masks, snapshot.type_ids
+
+        def kept(index: int) -> bool:
+            return (not mask or masks[index] & mask) and (type_ids is None or record_types[index] in type_ids)
+
+        if not mask and type_ids is None:
+            v4 = iter(snapshot.v4)
+            v6 = (int.from_bytes(snapshot.v6[i * 16:i * 16 + 16], "big") for i in range(snapshot.n6))
+        else:
+            v4 = (snapshot.v4[i] for i in range(snapshot.n4) if kept(i))
+            v6 = (int.from_bytes(snapshot.v6[i * 16:i * 16 + 16], "big") for i in range(snapshot.n6)
+                  if kept(snapshot.n4 + i))
+        self.v4 = [format_cidr(network, prefix, 4) for network, prefix in minimal_cidrs(v4, 32)]
+        self.v6 = [format_cidr(network, prefix, 6) for network, prefix in minimal_cidrs(v6, 128)]
+        logger.info(f"Blocklist: Collapsed generation {self.generation} to {len(self.v4)} IPv4 and "
+                    f"{len(self.v6)} IPv6 blocks in {time.perf_counter() - started:.2f}s")
+
+    def __len__(self) -> int:
+        return len(self.v4) + len(self.v6)
+
+    def render(self, fmt: str, name: str = DEFAULT_SET_NAME) -> bytes:
+        """The blocks as ``text`` (one per line), an ``ipset restore`` script or an ``nft -f`` script.
+
+        ``name`` is the ipset set (``<name>`` and ``<name>6``) or the nftables
+        table holding sets ``v4`` and ``v6``. Both scripts create what is
+        missing and replace the set contents, so they can be reloaded as is.
+        """
+        if fmt == "text":
+            lines = self.v4 + self.v6
+        elif fmt == "ipset":
+            lines = []
+            for family, set_name, blocks in (("inet", name, self.v4), ("inet6", f"{name}6", self.v6)):
+                lines.append(f"create {set_name} hash:net family {family} maxelem {max(65536, len(blocks))} -exist")
+                lines.append(f"flush {set_name}")
+                lines.extend(f"add {set_name} {block}" for block in blocks)
+        elif fmt == "nftables":
+            lines = [f"add table inet {name}"]
+            for set_name, address_type, blocks in (("v4", "ipv4_addr", self.v4), ("v6", "ipv6_addr", self.v6)):
+                lines.append(f"add set inet {name} {set_name} {{ type {address_type}; flags interval; }}")
+                lines.append(f"flush set inet {name} {set_name}")
+                for start in range(0, len(blocks), NFT_CHUNK):
+                    lines.append(f"add element inet {name} {set_name} {{ {', '.join(blocks[start:start + NFT_CHUNK])} }}")
+        else:
+            raise ValueError(f"unknown format {fmt!r}; expected one of {', '.join(BLOCKLIST_FORMATS)}")
+        return "".join(line + "\n" for line in lines).encode("utf-8")
+
+
+class BlocklistCache:
+    """Process-wide rendered blocklists of the current snapshot, regenerated once per generation.
+
+    Collapsed blocks are kept per filter and rendered bytes per format and
+    set name; everything is dropped when a new snapshot generation arrives.
+    """
+    def __init__(self, size: int = BLOCKLIST_CACHE_SIZE):
+        self.size = size
+        self.generation: Optional[int] = None
+        self._blocklists: Dict[tuple, Blocklist] = {}
+        self._rendered: Dict[tuple, bytes] = {}
+        self._lock = threading.Lock()
+
+    def get(self, snapshot: IPSnapshot, fmt: str, sources: Optional[List[str]] = None,
+            types: Optional[List[str]] = None, name: str = DEFAULT_SET_NAME) -> bytes:
+        if fmt not in BLOCKLIST_FORMATS:
+            raise ValueError(f"unknown format {fmt!r}; expected one of {', '.join(BLOCKLIST_FORMATS)}")
+        if not SET_NAME.fullmatch(name):
+            raise ValueError(f"invalid set name {name!r}; use up to 30 letters, digits, '_', '.' or '-'")
+        unknown = [source for source in sources or () if source not in snapshot.sources]
+        if unknown:
+            raise ValueError(f"unknown source(s) {', '.join(unknown)}; expected {', '.join(snapshot.sources)}")
+        filters = (tuple(sorted(sources or ())), None if types is None else tuple(sorted(types)))
+        key = (filters, fmt, name if fmt != "text" else "")
+        with self._lock:
+            if self.generation != snapshot.generation:
+                self.generation = snapshot.generation
+                self._blocklists.clear()
+                self._rendered.clear()
+            rendered = self._rendered.get(key)
+            if rendered is None:
+                blocklist = self._blocklists.get(filters)
+                if blocklist is None:
+                    blocklist = Blocklist(snapshot, sources, types)
+                    if len(self._blocklists) >= self.size:
+                        self._blocklists.pop(next(iter(self._blocklists)))
+                    self._blocklists[filters] = blocklist
+                rendered = blocklist.render(fmt, name)
+                if len(self._rendered) >= self.size:
+                    self._rendered.pop(next(iter(self._rendered)))
+                self._rendered[key] = rendered
+        return rendered
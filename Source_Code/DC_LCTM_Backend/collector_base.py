@@ -0,0 +1,157 @@
+import asyncio
+import json
+import logging
+import os
+import random
+from typing import AsyncGenerator, Dict, List, Optional, Set
+
+import aiohttp
+from aiohttp.client_exceptions import ClientError
+
+from country_data import country_name, country_code, country_centroid
+from dedup import RotatingBloomFilter
+from http_pool import get_session, request_headers
+from offload import offload
+
+logger = logging.getLogger(__name__)
+
+# Proxy configuration from environment variables
+PROXY = os.getenv('HTTP_PROXY', None)
+
+class PollCursor:
+    """High-watermark of a polled source, plus a page size that adapts to bursts.
+
+    Records stamped before the watermark were emitted by an earlier poll and
+    are skipped before they are parsed. Records stamped exactly at the
+    watermark are told apart by a key, since more can arrive within the same
+    timestamp after a poll. When a poll comes back full, records may have
+    been cut off, so the page size doubles (up to ``max_page_size``); it
+    halves back towards ``page_size`` once polls come back under half full.
+    """
+    def __init__(self, page_size: int = 20, max_page_size: int = 1000):
+        self.min_page_size = page_size
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+        self.watermark: Optional[int] = None
+        self.boundary: Set = set()
+        self._pending: List[tuple] = []
+
+    def accept(self, timestamp_ms: int, key) -> bool:
+        """True if a record is newer than the watermark; accepted records are committed by ``advance``."""
+        if self.watermark is not None and (timestamp_ms < self.watermark or
+                                           (timestamp_ms == self.watermark and key in self.boundary)):
+            return False
+        self._pending.append((timestamp_ms, key))
+        return True
+
+    def advance(self, returned: Optional[int] = None) -> None:
+        """Move the watermark past the accepted records; ``returned`` is the size of the page received."""
+        if self._pending:
+            latest = max(timestamp_ms for timestamp_ms, _ in self._pending)
+            keys = {key for timestamp_ms, key in self._pending if timestamp_ms == latest}
+            if latest == self.watermark:
+                self.boundary |= keys
+            else:
+                self.watermark, self.boundary = latest, keys
+            self._pending = []
+        if returned is not None:
+            if returned >= self.page_size:
+                self.page_size = min(self.page_size * 2, self.max_page_size)
+            elif returned < self.page_size // 2:
+                self.page_size = max(self.page_size // 2, self.min_page_size)
+
+    def state(self) -> Dict:
+        return {"watermark": self.watermark, "boundary": [list(key) for key in self.boundary],
+                "page_size": self.page_size}
+
+    def restore(self, state: Dict) -> None:
+        """Resume from a ``state()`` saved by an earlier run."""
+        self.watermark = state.get("watermark")
+        self.boundary = {tuple(key) for key in state.get("boundary", ())}
+        self.page_size = min(max(state.get("page_size", self.page_size), self.min_page_size), self.max_page_size)
+
+class BaseDataCollector:
+    """Base class for data collectors with anti-blocking provisions.
+
+    With a ``dedup_window`` (seconds), ``seen_records`` remembers the
+    fingerprints of recently emitted records in fixed memory, and
+    ``drop_seen`` filters out records already emitted by an earlier poll.
+    """
+    def __init__(self, source_name: str, interval: float = 10.0, max_retries: int = 5, dedup_window: float = 0.0):
+        self.source_name = source_name
+        self.interval = interval
+        self.max_retries = max_retries
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.seen_records: Optional[RotatingBloomFilter] = RotatingBloomFilter(dedup_window) if dedup_window else None
+
+    async def initialize(self):
+        """Attach to the process-wide HTTP session shared by every collector."""
+        self.session = get_session()
+
+    async def close(self):
+        """Detach from the shared session; ``ThreatIntelligenceAggregator.close`` closes it."""
+        self.session = None
+
+    @staticmethod
+    def get_country_name(code: Optional[str]) -> Optional[str]:
+        return country_name(code)
+
+    @staticmethod
+    def get_country_code(name: Optional[str]) -> Optional[str]:
+        return country_code(name)
+    
+    @staticmethod
+    def get_country_coordinates(code: Optional[str] = None, name: Optional[str] = None, coord_type: str = "lat") -> Optional[float]:
+        if not code and not name:
+            return None
+        if name and not code:
+            code = country_code(name)
+        if code:
+            lat, lon = country_centroid(code)
+            return lat if coord_type.lower() == "lat" else lon
+        return None
+
+    async def fetch_with_retry(self, url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None,
+                               stage: Optional[str] = None) -> Optional[Dict]:
+        """GET ``url`` with backoff and decode its JSON body off the event loop, timed as ``stage``."""
+        for attempt in range(self.max_retries):
+            try:
+                async with self.session.get(url, params=params, headers=request_headers(headers), proxy=PROXY) as response:
+                    if response.status in [429, 403]:
+                        backoff = min((2 ** attempt) + random.uniform(0, 0.5), 600)
+                        logger.warning(f"{self.source_name} received {response.status}, retrying after {backoff}s")
+                        await asyncio.sleep(backoff)
+                        continue
+                    response.raise_for_status()
+                    body = await response.read()
+                return await offload(f"{stage or self.source_name} json", json.loads, body, pure=True)
+            except ClientError as e:
+                logger.error(f"{self.source_name} fetch error (attempt {attempt + 1}): {e}")
+                if attempt < self.max_retries - 1:
+                    await asyncio.sleep((2 ** attempt) + random.uniform(0, 0.5))
+        return None
+
+    def drop_seen(self, records: List) -> List:
+        """Keep the records whose ``fingerprint()`` was not seen within the dedup window."""
+        if self.seen_records is None:
+            return records
+        fresh = [record for record in records if self.seen_records.add(record.fingerprint())]
+        if len(fresh) < len(records):
+            logger.info(f"{self.source_name}: Dropped {len(records) - len(fresh)} records seen in earlier polls")
+        return fresh
+
+    async def fetch_data(self) -> List[Dict]:
+        raise NotImplementedError
+
+    async def stream_data(self) -> AsyncGenerator[List[Dict], None]:
+        await self.initialize()
+        while True:
+            try:
+                data = await self.fetch_data()
+                if data:
+                    yield data
+                await asyncio.sleep(self.interval + random.uniform(0, 0.5))
+            except Exception as e:
+                logger.error(f"Error in {self.source_name}: {e}")
+                yield []
+                await asyncio.sleep(self.interval + random.uniform(0, 0.5))
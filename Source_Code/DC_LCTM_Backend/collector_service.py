@@ -0,0 +1,132 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+from typing import Callable, Dict, Set
+
+from cyber_threat_intel import ThreatIntelligenceAggregator, logger
+from offload import loop_monitor
+from stream_hub import SNAPSHOT_TOPICS
+from threat_event import ThreatEvent, to_public
+
+# Unix socket shared by the collector service and the web workers
+DEFAULT_SOCKET = os.getenv("LCTM_COLLECTOR_SOCKET", "/tmp/lctm-collector.sock")
+# Snapshot frames (full IP lists) can be several megabytes on one line
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+CLIENT_QUEUE_SIZE = 256
+
+
+def encode_frame(topic: str, data) -> bytes:
+    """Encode one message as a newline-delimited JSON frame."""
+    if topic == "threats":
+        data = to_public(data)
+    return json.dumps({"topic": topic, "data": data}, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+class CollectorPublisher:
+    """Owns every collector and publishes their output over a Unix socket.
+
+    Threat batches are forwarded as they are produced; news and malicious IPs
+    are published as snapshots, and the latest snapshots are replayed to each
+    web worker when it connects so it can serve immediately.
+    """
+    def __init__(self, socket_path: str = DEFAULT_SOCKET):
+        self.socket_path = socket_path
+        self.aggregator = ThreatIntelligenceAggregator()
+        self.snapshots: Dict[str, bytes] = {}
+        self.clients: Set[asyncio.Queue] = set()
+        self.server = None
+
+    def publish(self, topic: str, data) -> None:
+        frame = encode_frame(topic, data)
+        if topic in SNAPSHOT_TOPICS:
+            self.snapshots[topic] = frame
+        for client in list(self.clients):
+            try:
+                client.put_nowait(frame)
+            except asyncio.QueueFull:
+                logger.warning(f"Collector service: Dropping {topic} frame for a slow worker")
+        logger.debug(f"Collector service: Published {topic} to {len(self.clients)} workers")
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        for frame in self.snapshots.values():
+            client.put_nowait(frame)
+        self.clients.add(client)
+        logger.info(f"Collector service: Worker connected ({len(self.clients)} connected)")
+        try:
+            while True:
+                writer.write(await client.get())
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clients.discard(client)
+            writer.close()
+            logger.info(f"Collector service: Worker disconnected ({len(self.clients)} connected)")
+
+    async def serve(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        logger.info(f"Collector service: Listening on {self.socket_path}")
+        try:
+            await asyncio.gather(self.aggregator.start_collectors(publish=self.publish), loop_monitor.run())
+        finally:
+            self.server.close()
+            await self.aggregator.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+class CollectorSubscriber:
+    """Web-worker side of the collector service: forwards frames to ``publish``."""
+    def __init__(self, publish: Callable[[str, object], None], socket_path: str = DEFAULT_SOCKET):
+        self.publish = publish
+        self.socket_path = socket_path
+
+    async def run(self):
+        """Stay subscribed, reconnecting with backoff while the service is unavailable."""
+        attempt = 0
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=MAX_FRAME_BYTES)
+                logger.info(f"Collector subscriber: Connected to {self.socket_path}")
+                attempt = 0
+                try:
+                    while True:
+                        line = await reader.readline()
+                        if not line:
+                            break
+                        try:
+                            message = json.loads(line)
+                        except json.JSONDecodeError as e:
+                            logger.warning(f"Collector subscriber: Bad frame: {e}")
+                            continue
+                        topic, data = message["topic"], message["data"]
+                        if topic == "threats":
+                            data = [ThreatEvent.from_public(record) for record in data]
+                        self.publish(topic, data)
+                finally:
+                    writer.close()
+            except (OSError, ValueError) as e:
+                logger.warning(f"Collector subscriber: {e}")
+            backoff = min(2 ** attempt, 30) + random.uniform(0, 0.5)
+            attempt += 1
+            logger.info(f"Collector subscriber: Reconnecting in {backoff:.1f}s")
+            await asyncio.sleep(backoff)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run all collectors and publish to web workers")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket path to publish on")
+    parser.add_argument("--verbose", action="store_true", help="Enable debug logging")
+    args = parser.parse_args()
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+    try:
+        asyncio.run(CollectorPublisher(args.socket).serve())
+    except KeyboardInterrupt:
+        logger.info("Collector service stopped by user")
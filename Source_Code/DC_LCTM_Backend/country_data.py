@@ -0,0 +1,111 @@
+import json
+import logging
+import os
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+COORDINATES_PATH = os.path.join(BASE_DIR, "assets", "country_coordinates.json")
+COUNTRY_DATA_PATH = os.path.join(BASE_DIR, "assets", "country_data.json")
+# Files the backend writes and reads back across restarts (stores, caches, snapshots)
+DATA_DIR = os.path.abspath(os.getenv("LCTM_DATA_DIR", os.path.join(BASE_DIR, "data")))
+
+# Names the upstream feeds use that pycountry does not resolve on its own
+NAME_ALIASES = {
+    "turkey": "TR",
+}
+
+_table: Optional[Dict[str, Dict]] = None
+
+
+def ensure_parent(path: str) -> None:
+    """Create the directory holding ``path`` if it does not exist yet."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+
+def build_country_table() -> Dict[str, Dict]:
+    """Compile pycountry and the centroid file into a flat lookup table."""
+    import pycountry
+
+    with open(COORDINATES_PATH, "r") as f:
+        centroids = json.load(f)
+
+    codes = {}
+    names = {}
+    for country in pycountry.countries:
+        lat, lon = centroids.get(country.alpha_2, [None, None])
+        codes[country.alpha_2] = [country.name, lat, lon]
+        for attr in ("name", "official_name", "common_name", "alpha_3"):
+            value = getattr(country, attr, None)
+            if value:
+                names.setdefault(value.lower(), country.alpha_2)
+    # Centroids for codes pycountry no longer carries (e.g. AN, XK)
+    for code, (lat, lon) in centroids.items():
+        codes.setdefault(code, [None, lat, lon])
+    names.update(NAME_ALIASES)
+    return {"codes": codes, "names": names}
+
+
+def write_country_table(path: str = COUNTRY_DATA_PATH) -> int:
+    """Regenerate the precomputed country table; returns the number of codes."""
+    table = build_country_table()
+    with open(path, "w") as f:
+        json.dump(table, f, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    return len(table["codes"])
+
+
+def load_country_table() -> Dict[str, Dict]:
+    """Load the precomputed table once per process, building it if it is missing."""
+    global _table
+    if _table is None:
+        try:
+            with open(COUNTRY_DATA_PATH, "r") as f:
+                _table = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            logger.warning(f"Precomputed country data unavailable ({e}); building from pycountry")
+            _table = build_country_table()
+    return _table
+
+
+def country_name(code: Optional[str]) -> Optional[str]:
+    if not code or not code.strip():
+        return None
+    entry = load_country_table()["codes"].get(code.strip().upper())
+    return entry[0] if entry else None
+
+
+def country_code(name: Optional[str]) -> Optional[str]:
+    if not name or not name.strip():
+        return None
+    code = load_country_table()["names"].get(name.strip().lower())
+    if code:
+        return code
+    return _fuzzy_country_code(name.strip().lower())
+
+
+def country_centroid(code: Optional[str]) -> Tuple[Optional[float], Optional[float]]:
+    if not code or not code.strip():
+        return None, None
+    entry = load_country_table()["codes"].get(code.strip().upper())
+    if not entry:
+        return None, None
+    return entry[1], entry[2]
+
+
+@lru_cache(maxsize=1024)
+def _fuzzy_country_code(name: str) -> Optional[str]:
+    """Fall back to pycountry's fuzzy search for names missing from the table."""
+    import pycountry
+
+    try:
+        return pycountry.countries.search_fuzzy(name)[0].alpha_2
+    except (AttributeError, LookupError):
+        return None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    count = write_country_table()
+    logger.info(f"Wrote {count} countries to {COUNTRY_DATA_PATH}")
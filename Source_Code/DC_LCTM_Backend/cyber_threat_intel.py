@@ -1,20 +1,26 @@
 import asyncio
-import aiohttp
 import json
 import logging
 import re
-import feedparser
 import time
 import random
 import os
-from datetime import datetime
-from ipaddress import ip_address
-import pycountry
-from typing import Dict, List, Set, Optional, AsyncGenerator
 from collections import deque
-from aiohttp.client_exceptions import ClientError
-import geoip2.database
-from geoip2.errors import AddressNotFoundError
+from datetime import datetime
+from typing import Callable, Deque, Dict, List, Sequence, Set, Optional, Tuple
+from collector_base import PROXY, BaseDataCollector, PollCursor
+from dedup import DEDUP_WINDOW
+from geoip import GeoIPDatabase, geoip
+from http_pool import close_session, request_headers
+from ip_reputation import ReputationEnricher
+from ip_snapshot import write_ip_snapshot
+from news_store import NewsStore
+from offload import offload
+from pipeline import BoundedQueue, Pipeline, Stage, PIPELINE_QUEUE_SIZE
+from sources import IPListSource, ThreatSource, create_source, is_valid_ip, source_names
+from threat_event import ThreatEvent, to_public, group_by_pair, COUNTRIES, ATTACK_TYPES, ATTACK_TYPES_PATH
+from warm_start import (STATE_INTERVAL, STATE_PATH, STATE_THREAT_WINDOW, load_state, pack_ips, save_state,
+                        unpack_ips)
 
 # Configure logging
 logging.basicConfig(
@@ -23,391 +29,193 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# User-Agent pool for rotation
-USER_AGENTS = [
-    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36',
-    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36',
-    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:130.0) Gecko/20100101 Firefox/130.0',
-    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14.6) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Safari/605.1.15',
-    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36'
+# Default source sets; LCTM_SOURCES (comma-separated names) restricts which ones run
+THREAT_SOURCES = ["fortiguard", "checkpoint", "radware"]
+NEWS_SOURCES = [
+    {"name": "hackernews", "url": "https://feeds.feedburner.com/TheHackersNews"},
+    {"name": "darkreading", "url": "https://www.darkreading.com/rss.xml"},
+    {"name": "420in", "url": "https://the420.in/feed"}
 ]
-
-# Proxy configuration from environment variables
-PROXY = os.getenv('HTTP_PROXY', None)
-
-class BaseDataCollector:
-    """Base class for data collectors with anti-blocking provisions."""
-    def __init__(self, source_name: str, interval: float = 10.0, max_retries: int = 5):
-        self.source_name = source_name
-        self.interval = interval
-        self.max_retries = max_retries
-        self.session: Optional[aiohttp.ClientSession] = None
-        self.seen_records: Set = set()
-        self.session_refresh_interval = 3600
-
-    async def initialize(self):
-        """Initialize or refresh the aiohttp session."""
-        if self.session:
-            await self.session.close()
-        self.session = aiohttp.ClientSession(
-            headers={'User-Agent': random.choice(USER_AGENTS)},
-            connector=aiohttp.TCPConnector(limit=50),
-            timeout=aiohttp.ClientTimeout(total=30)
-        )
-
-    async def close(self):
-        """Close the aiohttp session."""
-        if self.session:
-            await self.session.close()
-            self.session = None
-
-    @staticmethod
-    def get_country_name(code: Optional[str]) -> Optional[str]:
-        if not code or not code.strip():
-            return None
-        try:
-            return pycountry.countries.get(alpha_2=code.upper()).name
-        except (AttributeError, LookupError):
-            return None
-
-    @staticmethod
-    def get_country_code(name: Optional[str]) -> Optional[str]:
-        if not name or not name.strip():
-            return None
-        if name.lower() == "turkey":
-            name = "Türkiye"
-        try:
-            return pycountry.countries.search_fuzzy(name)[0].alpha_2
-        except (AttributeError, LookupError):
-            return None
-    
-    @staticmethod
-    def get_country_coordinates(code: Optional[str] = None, name: Optional[str] = None, coord_type: str = "lat") -> Optional[float]:
-        try:
-            BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-            json_path = os.path.join(BASE_DIR, "assets", "country_coordinates.json")
-            if not os.path.exists(json_path):
-                logger.error(f"Country coordinates file not found at {json_path}")
-                return None
-            with open(json_path, "r") as f:
-                COUNTRY_CENTROIDS = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            logger.error(f"Error loading country coordinates: {e}")
-            return None
-        if not code and not name:
-            return None
-        if name and not code:
-            if name.lower() == "turkey":
-                name = "Türkiye"
-            try:
-                code = pycountry.countries.search_fuzzy(name)[0].alpha_2
-            except (AttributeError, LookupError):
-                return None
-        if code:
-            code = code.upper()
-            coords = COUNTRY_CENTROIDS.get(code, [None, None])
-            return coords[0] if coord_type.lower() == "lat" else coords[1]
+IP_SOURCES = ["alienvault", "bd_banlist", "fraudguard", "talos"]
+# Off by default; each runs only when LCTM_SOURCES names it
+OPT_IN_IP_SOURCES = ["bd_tor"]
+# Bit order of the per-IP source masks (kept stable across snapshots and checkpoints)
+IP_SOURCE_BITS = IP_SOURCES + OPT_IN_IP_SOURCES
+
+# Refresh intervals (seconds) used when collectors run continuously
+NEWS_INTERVAL = float(os.getenv("LCTM_NEWS_INTERVAL", "300"))
+IP_INTERVAL = float(os.getenv("LCTM_IP_INTERVAL", "60"))
+# Workers per threat pipeline stage, e.g. "normalize=2"; stages in SERIAL_STAGES always run one
+PIPELINE_CONCURRENCY = {
+    name.strip(): int(count)
+    for name, _, count in (item.partition("=") for item in os.getenv("LCTM_PIPELINE_CONCURRENCY", "").split(","))
+    if name.strip() and count.strip()
+}
+SERIAL_STAGES = ("dedupe", "aggregate", "publish")
+# Caps on events buffered outside the pipeline (Checkpoint between polls, queued threats and IPs)
+BUFFER_SIZE = int(os.getenv("LCTM_BUFFER_SIZE", "50000"))
+
+def enabled_sources() -> Optional[Set[str]]:
+    """Return the names enabled through LCTM_SOURCES, or None when all sources are enabled."""
+    value = os.getenv("LCTM_SOURCES", "").strip()
+    if not value:
         return None
-
-    async def fetch_with_retry(self, url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None) -> Optional[Dict]:
-        for attempt in range(self.max_retries):
-            try:
-                async with self.session.get(url, params=params, headers=headers, proxy=PROXY) as response:
-                    if response.status in [429, 403]:
-                        backoff = min((2 ** attempt) + random.uniform(0, 0.5), 600)
-                        logger.warning(f"{self.source_name} received {response.status}, retrying after {backoff}s")
-                        await asyncio.sleep(backoff)
-                        continue
-                    response.raise_for_status()
-                    return await response.json(content_type=None)
-            except ClientError as e:
-                logger.error(f"{self.source_name} fetch error (attempt {attempt + 1}): {e}")
-                if attempt < self.max_retries - 1:
-                    await asyncio.sleep((2 ** attempt) + random.uniform(0, 0.5))
-        return None
-
-    async def fetch_data(self) -> List[Dict]:
-        raise NotImplementedError
-
-    async def stream_data(self) -> AsyncGenerator[List[Dict], None]:
-        await self.initialize()
-        last_session_refresh = time.time()
-        while True:
-            try:
-                if time.time() - last_session_refresh > self.session_refresh_interval:
-                    await self.initialize()
-                    last_session_refresh = time.time()
-                    logger.info(f"{self.source_name} session refreshed")
-
-                data = await self.fetch_data()
-                if data:
-                    yield data
-                await asyncio.sleep(self.interval + random.uniform(0, 0.5))
-            except Exception as e:
-                logger.error(f"Error in {self.source_name}: {e}")
-                yield []
-                await asyncio.sleep(self.interval + random.uniform(0, 0.5))
+    return {name.strip().lower() for name in value.split(",") if name.strip()}
+
+def aggregate_events(events: List[ThreatEvent]) -> List[ThreatEvent]:
+    """Collapse repeats of an attack per source/destination, then group events per pair."""
+    # Remove redundant data
+    unique_attacks = {}
+    for event in events:
+        key = (event.attack_name, event.src, event.dst)
+        if key not in unique_attacks:
+            unique_attacks[key] = event
+    return group_by_pair(unique_attacks.values())
 
 class ThreatDataCollector(BaseDataCollector):
-    """Collector for threat data from multiple sources."""
+    """Collector for threat data from the registered threat sources named in ``sources``.
+
+    ``fetch_data`` runs one fused poll of every source. For continuous
+    collection, ``pipeline`` instead connects the sources to
+    normalize -> dedupe -> aggregate -> publish stages through bounded
+    queues, so a slow stage sheds load rather than stalling the sources.
+    """
     def __init__(self, sources: List[str], interval: float = 10.0, max_retries: int = 5):
-        super().__init__("threat_data", interval, max_retries)
+        super().__init__("threat_data", interval, max_retries, dedup_window=DEDUP_WINDOW)
         self.sources = sources
-        self.checkpoint_buffer = []
-        self.checkpoint_task = None
-        self.checkpoint_running = False
-
-    async def initialize(self):
-        """Initialize session and start Checkpoint SSE in the background."""
+        self.feeds: Dict[str, ThreatSource] = {
+            name: create_source(name, interval=interval, max_retries=max_retries)
+            for name in sources if name in source_names("threats")
+        }
+        # Poll cursors of the polled feeds, saved in warm-start checkpoints
+        self.cursors: Dict[str, PollCursor] = {name: feed.cursor for name, feed in self.feeds.items() if feed.cursor}
+        # Events of streaming feeds (Checkpoint) read in the background between polls
+        self.stream_buffer = BoundedQueue("stream_buffer", BUFFER_SIZE, "drop-oldest")
+        self.stream_tasks: Dict[str, asyncio.Task] = {}
+
+    async def initialize(self, background_streams: bool = True):
+        """Initialize the feeds and, unless the pipeline polls them, read streaming feeds in the background."""
         await super().initialize()
-        if "checkpoint" in self.sources and not self.checkpoint_running:
-            self.checkpoint_running = True
-            self.checkpoint_task = asyncio.create_task(self._collect_checkpoint_background())
+        await asyncio.gather(*(feed.initialize() for feed in self.feeds.values()))
+        if background_streams:
+            for name, feed in self.feeds.items():
+                if feed.streaming and name not in self.stream_tasks:
+                    self.stream_tasks[name] = asyncio.create_task(self._collect_stream_background(feed))
 
     async def close(self):
-        """Close session and stop Checkpoint SSE."""
-        self.checkpoint_running = False
-        if self.checkpoint_task:
-            self.checkpoint_task.cancel()
-            try:
-                await self.checkpoint_task
-            except asyncio.CancelledError:
-                pass
-            self.checkpoint_task = None
+        """Stop the background streams and detach the feeds."""
+        for task in self.stream_tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.stream_tasks.values(), return_exceptions=True)
+        self.stream_tasks = {}
+        await asyncio.gather(*(feed.close() for feed in self.feeds.values()))
         await super().close()
 
-    async def _collect_checkpoint_background(self):
-        """Collect Checkpoint SSE data continuously in the background."""
-        while self.checkpoint_running:
+    async def _collect_stream_background(self, feed: ThreatSource):
+        """Read a streaming feed continuously in the background."""
+        while True:
             try:
-                data = await self._fetch_checkpoint()
+                data = await feed.fetch_data()
                 if data:
-                    self.checkpoint_buffer.extend(data)
-                    logger.debug(f"Checkpoint: Added {len(data)} entries to buffer")
+                    self.stream_buffer.extend(data)
+                    logger.debug(f"{feed.name}: Added {len(data)} entries to buffer")
                 await asyncio.sleep(0.1)  # Prevent tight loop
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.error(f"Checkpoint background: Error: {e}")
+                logger.error(f"{feed.name} background: Error: {e}")
                 await asyncio.sleep(1)
 
-    async def fetch_data(self) -> List[Dict]:
+    async def fetch_data(self) -> List[ThreatEvent]:
         """Fetch, filter, and preprocess threat data from all sources."""
-        # Initialize tasks for Fortiguard and Radware, use Checkpoint buffer
-        tasks = []
-        if "fortiguard" in self.sources:
-            tasks.append(self._fetch_fortiguard())
-        if "radware" in self.sources:
-            tasks.append(self._fetch_radware())
-        
-        # Fetch Fortiguard and Radware data
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
+        # Streaming feeds read in the background are drained; every other feed is polled now
+        polled = [feed for name, feed in self.feeds.items() if name not in self.stream_tasks]
+        results = await asyncio.gather(*(feed.fetch_data() for feed in polled), return_exceptions=True)
+
         # Step 1: Collect all data into a single list
-        all_data = []
-        discarded_count = 0
-        
-        # Add Checkpoint buffer data (empty at t=0, populated at t=10s)
-        if "checkpoint" in self.sources:
-            all_data.extend(self.checkpoint_buffer)
-            logger.debug(f"Checkpoint: Added {len(self.checkpoint_buffer)} buffered entries")
-            self.checkpoint_buffer = []  # Clear buffer after using
-        
-        # Add Fortiguard and Radware data
-        for result in results:
+        all_data: List[ThreatEvent] = self.stream_buffer.drain()
+        if all_data:
+            logger.debug(f"{self.source_name}: Added {len(all_data)} buffered stream entries")
+        for feed, result in zip(polled, results):
             if isinstance(result, list):
                 all_data.extend(result)
             else:
-                logger.error(f"Error in source fetch: {result}")
-        
-        # Step 2: Filter invalid data (either source or dest is missing)
-        filtered_data = []
-        for item in all_data:
-            src_cc = item.get("Source Country Code")
-            dst_cc = item.get("Destination Country Code")
-            if not src_cc or not dst_cc:
-                logger.debug(f"{self.source_name}: Discarding entry with missing source or destination country code: {item}")
-                discarded_count += 1
-                continue
-            filtered_data.append(item)
-        logger.info(f"{self.source_name}: Discarded {discarded_count} entries due to missing country codes")
-        
-        # Step 3: Preprocessing
-        # 3.1 Remove redundant data
-        unique_attacks = {}
-        for item in filtered_data:
-            key = (item["Attack Name"], item["Source Country Code"], item["Destination Country Code"])
-            if key not in unique_attacks:
-                unique_attacks[key] = item
-        
-        # Step 3.2 Group attacks by source and destination
-        grouped_attacks = {}
-        for item in unique_attacks.values():
-            key = (item["Source Country Code"], item["Destination Country Code"])
-            if key not in grouped_attacks:
-                grouped_attacks[key] = {
-                    "Attack Count": 0,
-                    "Attack Types": set(),
-                    "Source Country Code": item["Source Country Code"],
-                    "Source Country Name": item["Source Country Name"],
-                    "Source Latitude": item.get("Source Latitude"),
-                    "Source Longitude": item.get("Source Longitude"),
-                    "Destination Country Code": item["Destination Country Code"],
-                    "Destination Country Name": item["Destination Country Name"],
-                    "Destination Latitude": item.get("Destination Latitude"),
-                    "Destination Longitude": item.get("Destination Longitude"),
-                    "Timestamp": item["Timestamp"]
-                }
-            grouped_attacks[key]["Attack Count"] += item.get("Attack Count", 1) or 1
-            grouped_attacks[key]["Attack Types"].add(item["Attack Type"])
-        
-        # Step 4: Convert to final list
-        final_data = [
-            {
-                "Source Country Code": data["Source Country Code"],
-                "Source Country Name": data["Source Country Name"],
-                "Source Latitude": data["Source Latitude"],
-                "Source Longitude": data["Source Longitude"],
-                "Destination Country Code": data["Destination Country Code"],
-                "Destination Country Name": data["Destination Country Name"],
-                "Destination Latitude": data["Destination Latitude"],
-                "Destination Longitude": data["Destination Longitude"],
-                "Attack Count": data["Attack Count"],
-                "Attack Types": list(data["Attack Types"]),
-                "Timestamp": data["Timestamp"]
-            }
-            for data in grouped_attacks.values()
-        ]
-        
+                logger.error(f"{feed.name}: Error in source fetch: {result}")
+
+        # Filter invalid data, drop events from earlier polls, then aggregate
+        final_data = aggregate_events(self.drop_seen(self.normalize(all_data)))
         logger.info(f"{self.source_name}: Returning {len(final_data)} preprocessed threat entries")
         return final_data
 
-    async def _fetch_fortiguard(self) -> List[Dict]:
-        url = "https://fortiguard.fortinet.com/api/threatmap/live/outbreak"
-        params = {"outbreak_id": 0}
-        headers = {
-            'Accept': 'application/json',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Connection': 'keep-alive',
-            'Referer': 'https://fortiguard.fortinet.com/',
-            'User-Agent': USER_AGENTS[0]
-        }
-        data = await self.fetch_with_retry(url, params=params, headers=headers)
-        if not data:
-            logger.error(f"fortiguard: Failed to retrieve data")
-            return []
-    
-        parsed_data = []
-        ips_data = data.get("ips", {})
-        for timestamp_key, attacks in ips_data.items():
-            for attack in attacks:
-                entry = {
-                    "Attack Count": attack.get("count"),
-                    "Attack Name": attack.get("vuln_name"),
-                    "Attack Type": attack.get("vuln_type"),
-                    "Destination Country Code": attack.get("dest_country"),
-                    "Destination Country Name": self.get_country_name(attack.get("dest_country")),
-                    "Destination Latitude": attack.get("dest_lat"),
-                    "Destination Longitude": attack.get("dest_long"),
-                    "Source Country Code": attack.get("src_country"),
-                    "Source Country Name": self.get_country_name(attack.get("src_country")),
-                    "Source Latitude": attack.get("src_lat"),
-                    "Source Longitude": attack.get("src_long"),
-                    "Timestamp": datetime.utcnow().isoformat() if not attack.get("timestamp") else attack.get("timestamp"),
-                }
-                parsed_data.append(entry)
-        logger.debug(f"fortiguard: Collected {len(parsed_data)} entries")
-        return parsed_data
-
-    async def _fetch_checkpoint(self) -> List[Dict]:
-        """Fetch attack data from Check Point SSE stream for 10 seconds."""
-        url = "https://threatmap-api.checkpoint.com/ThreatMap/api/feed"
-        threat_data_list = []
-        current_event = None
-        start_time = time.time()
-        max_duration = 10.0
-
-        try:
-            async with self.session.get(url, headers={'Accept': 'text/event-stream'}, proxy=PROXY, timeout=10) as response:
-                if response.status != 200:
-                    logger.warning(f"checkpoint: Status {response.status}")
-                    return []
-                
-                async for line in response.content:
-                    if time.time() - start_time > max_duration:
-                        logger.debug(f"checkpoint: Stopping collection after {max_duration}s")
-                        break
-                    if line:
-                        decoded_line = line.decode('utf-8').strip()
-                        if decoded_line.startswith("event:"):
-                            current_event = decoded_line[6:].strip()
-                        elif decoded_line.startswith("data:") and current_event == "attack":
-                            try:
-                                json_data = json.loads(decoded_line[5:])
-                                mapping = {
-                                    "a_c": "Attack Count", "a_n": "Attack Name", "a_t": "Attack Type",
-                                    "d_co": "Destination Country Code", "d_la": "Destination Latitude",
-                                    "d_lo": "Destination Longitude", "s_co": "Source Country Code",
-                                    "s_lo": "Source Longitude", "s_la": "Source Latitude", "t": "Timestamp"
-                                }
-                                threat_data = {}
-                                for key, label in mapping.items():
-                                    value = json_data.get(key)
-                                    if value not in [None, "None"]:
-                                        threat_data[label] = value
-                                if threat_data:
-                                    threat_data["Destination Country Name"] = self.get_country_name(threat_data.get("Destination Country Code"))
-                                    threat_data["Source Country Name"] = self.get_country_name(threat_data.get("Source Country Code"))
-                                    if not threat_data.get("Timestamp"):
-                                        threat_data["Timestamp"] = datetime.utcnow().isoformat()
-                                    threat_data_list.append(threat_data)
-                            except json.JSONDecodeError as e:
-                                logger.warning(f"checkpoint: Failed to parse JSON: {decoded_line}, error: {e}")
-                                continue
-        except Exception as e:
-            logger.error(f"checkpoint: Fetch error: {e}")
-        
-        logger.debug(f"checkpoint: Collected {len(threat_data_list)} events in {max_duration}s")
-        return threat_data_list
-
-    async def _fetch_radware(self) -> List[Dict]:
-        url = "https://ltm-prod-api.radware.com/map/attacks?limit=20"
-        data = await self.fetch_with_retry(url)
-        if not data:
-            logger.error(f"radware: Failed to retrieve data")
-            return []
-        parsed_data = []
-        for attack_group in data:
-            if not isinstance(attack_group, list):
-                logger.debug(f"radware: Skipping non-list attack group: {attack_group}")
-                continue
-            for attack in attack_group:
-                if not isinstance(attack, dict):
-                    logger.debug(f"radware: Skipping non-dict attack: {attack}")
-                    continue
-                dst_cc = attack.get("destinationCountry", "").strip() or None
-                src_cc = attack.get("sourceCountry", "").strip() or None
-                entry = {
-                    "Attack Count": None,
-                    "Attack Name": attack.get("type"),
-                    "Attack Type": attack.get("type"),
-                    "Destination Country Code": dst_cc,
-                    "Destination Country Name": self.get_country_name(dst_cc),
-                    "Destination Latitude": self.get_country_coordinates(code=dst_cc, coord_type="lat"),
-                    "Destination Longitude": self.get_country_coordinates(code=dst_cc, coord_type="long"),
-                    "Source Country Code": src_cc,
-                    "Source Country Name": self.get_country_name(src_cc),
-                    "Source Latitude": self.get_country_coordinates(code=src_cc, coord_type="lat"),
-                    "Source Longitude": self.get_country_coordinates(code=src_cc, coord_type="long"),
-                    "Timestamp": attack.get("attackTime") or datetime.utcnow().isoformat()
-                }
-                parsed_data.append(entry)
-        logger.debug(f"radware: Collected {len(parsed_data)} entries")
-        return parsed_data
+    def normalize(self, events: List[ThreatEvent]) -> List[ThreatEvent]:
+        """Discard events missing a source or destination country."""
+        filtered_data = [event for event in events if event.src and event.dst]
+        discarded_count = len(events) - len(filtered_data)
+        if discarded_count:
+            logger.info(f"{self.source_name}: Discarded {discarded_count} entries due to missing country codes")
+        return filtered_data
+
+    async def _poll_source(self, feed: ThreatSource, out: BoundedQueue) -> None:
+        """Pipeline source: poll one feed and queue each non-empty batch."""
+        # A streaming feed's fetch already reads for a while, so it is polled back to back
+        interval = 0.1 if feed.streaming else self.interval
+        while True:
+            try:
+                batch = await feed.fetch_data()
+                if batch:
+                    out.put(batch)
+            except Exception as e:
+                logger.error(f"{feed.name}: Poll failed: {e}")
+            await asyncio.sleep(interval + random.uniform(0, 0.5))
+
+    def pipeline(self, emit: Callable[[List[ThreatEvent]], None],
+                 concurrency: Optional[Dict[str, int]] = None, queue_size: int = PIPELINE_QUEUE_SIZE) -> Pipeline:
+        """Build source -> normalize -> dedupe -> aggregate -> publish, ending in ``emit(batch)``.
+
+        Source batches are sampled when the sources outpace normalization,
+        intermediate queues drop their oldest batch, and aggregated batches
+        waiting to be published are coalesced per country pair, so memory
+        stays bounded whichever stage falls behind. The aggregate stage
+        groups everything that arrived within one poll interval.
+
+        Only normalize takes more than one worker (run in the offload pool):
+        dedupe shares one filter, aggregate owns the window and publish
+        feeds the hub, so each of them runs a single worker on the loop.
+        """
+        concurrency = {**PIPELINE_CONCURRENCY, **(concurrency or {})}
+        for name in SERIAL_STAGES:
+            if concurrency.get(name, 1) != 1:
+                logger.warning(f"{self.source_name}: Stage {name} runs a single worker; "
+                               f"ignoring concurrency {concurrency[name]}")
+        raw = BoundedQueue("raw", queue_size, "sample")
+        normalized = BoundedQueue("normalized", queue_size, "drop-oldest")
+        deduped = BoundedQueue("deduped", queue_size, "drop-oldest")
+        aggregated = BoundedQueue("aggregated", queue_size, "coalesce",
+                                  merge=lambda older, newer: group_by_pair(older + newer))
+
+        pipeline = Pipeline(self.source_name)
+        for feed in self.feeds.values():
+            pipeline.add_source(self._poll_source(feed, raw))
+        pipeline.add_stage(Stage("normalize", self.normalize, raw, normalized, concurrency.get("normalize", 1),
+                                 offload=True))
+        pipeline.add_stage(Stage("dedupe", self.drop_seen, normalized, deduped))
+        pipeline.add_stage(Stage(
+            "aggregate", lambda batches: aggregate_events([event for batch in batches for event in batch]),
+            deduped, aggregated, window=self.interval
+        ))
+        pipeline.add_stage(Stage("publish", emit, aggregated))
+        return pipeline
 
 class NewsDataCollector(BaseDataCollector):
-    """Collector for news data from multiple RSS feeds."""
-    def __init__(self, sources: List[Dict[str, str]], max_retries: int = 3):
+    """Collector for news data from multiple RSS feeds.
+
+    With a ``store``, ``fetch_data`` returns only articles the store has not
+    seen before, deduplicated across feeds and polls.
+    """
+    def __init__(self, sources: List[Dict[str, str]], max_retries: int = 3, store: Optional[NewsStore] = None):
         super().__init__("news_data", interval=0.0, max_retries=max_retries)
         self.sources = sources
+        self.store = store
         self.primary_keywords = [
             "ransomware", "malware", "exploit", "vulnerability", "breach",
             "zero-day", "attack", "compromised", "infected", "stolen",
@@ -433,15 +241,29 @@ class NewsDataCollector(BaseDataCollector):
         results = await asyncio.gather(*tasks, return_exceptions=True)
 
         all_articles = []
-        for result in results:
+        for source, result in zip(self.sources, results):
             if isinstance(result, list):
                 all_articles.extend(result)
+            else:
+                logger.error(f"{source['name']}: Failed to fetch feed: {result}")
+        if self.store is not None:
+            all_articles = await offload("news store", self.store.add, all_articles)
 
         logger.debug(f"{self.source_name}: Returning {len(all_articles)} news articles")
         return all_articles
 
     async def _fetch_source(self, source_name: str, rss_url: str) -> List[Dict]:
-        feed = feedparser.parse(rss_url)
+        # Fetched through the shared pool; feedparser only parses
+        async with self.session.get(rss_url, headers=request_headers(), proxy=PROXY) as response:
+            response.raise_for_status()
+            body = await response.read()
+        content_type = response.headers.get("Content-Type", "")
+        return await offload("news parse", self._parse_feed, source_name, body, content_type)
+
+    def _parse_feed(self, source_name: str, body: bytes, content_type: str) -> List[Dict]:
+        """Parse one feed and keep its relevant articles (runs in the offload pool)."""
+        import feedparser  # Deferred: only loaded once a news feed is actually polled
+        feed = feedparser.parse(body, response_headers={"content-type": content_type})
         if not feed.entries:
             logger.debug(f"{source_name}: No entries in feed")
             return []
@@ -456,12 +278,18 @@ class NewsDataCollector(BaseDataCollector):
             if not title or not link:
                 continue
             text = f"{title} {summary}"
-            is_relevant, _ = self.is_relevant_article(text)
+            is_relevant, matches = self.is_relevant_article(text)
             if is_relevant:
                 article = {
                     "title": title,
                     "link": link,
-                    "timestamp": published
+                    "timestamp": published,
+                    "source": source_name,
+                    "summary": summary,
+                    "keywords": {
+                        "primary": [kw for kw in matches if kw in self.primary_keywords],
+                        "secondary": [kw for kw in matches if kw not in self.primary_keywords]
+                    }
                 }
                 filtered_articles.append(article)
         return filtered_articles
@@ -477,47 +305,44 @@ class NewsDataCollector(BaseDataCollector):
         return True, primary_matches + secondary_matches
 
 class MaliciousIPCollector(BaseDataCollector):
-    """Collector for malicious IPs from multiple sources."""
+    """Collector for malicious IPs from the registered IP sources named in ``sources``."""
     def __init__(self, sources: List[str], interval: float = 0.0, max_retries: int = 5, geodb_path: str = None):  # Increased max_retries
         super().__init__("malicious_ip", interval, max_retries)
         self.sources = sources
-        self.urls = {
-            "alienvault": "https://reputation.alienvault.com/reputation.unix",
-            "bd_banlist": "https://www.binarydefense.com/banlist.txt", 
-            "fraudguard": "https://api.fraudguard.io/landing-page-map",
-            "talos": "https://talosintelligence.com/cloud_intel/top_senders_list"
+        self.feeds: Dict[str, IPListSource] = {
+            name: create_source(name, max_retries=max_retries) for name in sources if name in source_names("ips")
         }
-        self.ip_regex = re.compile(r'\b(?:\d{1,3}\.){3}\d{1,3}\b')
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        default_geodb_path = os.path.join(BASE_DIR, "assets", "GeoLite2-City.mmdb")
-        self.geodb_path = os.path.abspath(os.getenv("GEOLITE2_DB_PATH", geodb_path or default_geodb_path))
-        self.geo_reader = None
+        # The process-wide reader, unless this collector is given a database of its own
+        self.geoip = geoip if geodb_path is None else GeoIPDatabase(os.path.abspath(geodb_path))
+        # Bitmask of the sources (bit = index in IP_SOURCE_BITS) that listed each IP on the last fetch
+        self.source_masks: Dict[str, int] = {}
 
     async def initialize(self):
         await super().initialize()
-        try:
-            if not os.path.exists(self.geodb_path):
-                raise FileNotFoundError(f"GeoLite2 database not found at {self.geodb_path}")
-            self.geo_reader = geoip2.database.Reader(self.geodb_path)
-        except Exception as e:
-            logger.error(f"{self.source_name}: Failed to initialize GeoLite2 reader: {e}")
-            self.geo_reader = None
+        if not self.sources:
+            return
+        await asyncio.gather(*(feed.initialize() for feed in self.feeds.values()))
+        await offload("geoip open", self.geoip.open)
 
     async def close(self):
+        await asyncio.gather(*(feed.close() for feed in self.feeds.values()))
         await super().close()
-        if self.geo_reader:
-            self.geo_reader.close()
 
     async def fetch_data(self) -> List[Dict]:
         """Fetch and deduplicate malicious IPs from all sources."""
         tasks = [self._fetch_source(source) for source in self.sources]
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
-        # Step 1: Collect all IPs into a single list
+        # Step 1: Collect all IPs into a single list, noting which sources listed them
         all_ips = []
-        for result in results:
+        source_masks = {}
+        for source, result in zip(self.sources, results):
             if isinstance(result, list):
                 all_ips.extend(result)
+                bit = 1 << IP_SOURCE_BITS.index(source) if source in IP_SOURCE_BITS else 0
+                for item in result:
+                    source_masks[item["ip"]] = source_masks.get(item["ip"], 0) | bit
+        self.source_masks = source_masks
         
         # Step 2: Remove redundant IPs
         unique_ips = {}
@@ -532,79 +357,20 @@ class MaliciousIPCollector(BaseDataCollector):
         return final_data
 
     async def _fetch_source(self, source: str) -> List[Dict]:
-        if source == "alienvault":
-            return await self._fetch_alienvault()
-        elif source == "bd_banlist":
-            return await self._fetch_bd_banlist()
-        elif source == "fraudguard":
-            return await self._fetch_fraudguard()
-        elif source == "talos":
-            return await self._fetch_talos()
-        else:
+        feed = self.feeds.get(source)
+        if feed is None:
             logger.error(f"Unknown source: {source}")
             return []
+        ips = await feed.fetch_data()
+        return await offload(f"{source} geoip", self._create_ip_entries, ips, feed.source_type)
 
-    async def _fetch_alienvault(self) -> List[Dict]:
-        url = self.urls["alienvault"]
-        try:
-            async with self.session.get(url, proxy=PROXY, timeout=10) as response:
-                if response.status != 200:
-                    return []
-                data = await response.text()
-                ips = sorted(set(ip for ip in self.ip_regex.findall(data) if self.is_valid_ip(ip)))
-                return [self._create_ip_entry(ip, "malicious") for ip in ips]
-        except Exception as e:
-            logger.error(f"alienvault: Error fetching: {e}")
-            return []
+    def _create_ip_entries(self, ips: List[str], source_type: str) -> List[Dict]:
+        """Geolocate a whole list at once (runs in the offload pool), with one database version."""
+        reader = self.geoip.reader
+        return [self._create_ip_entry(ip, source_type, reader) for ip in ips]
 
-    async def _fetch_bd_banlist(self) -> List[Dict]:
-        url = self.urls["bd_banlist"]
-        try:
-            async with self.session.get(url, proxy=PROXY, timeout=10) as response:
-                if response.status != 200:
-                    return []
-                data = await response.text()
-                ips = sorted(set(ip.strip() for ip in data.splitlines() if ip.strip() and self.is_valid_ip(ip.strip())))
-                return [self._create_ip_entry(ip, "malicious") for ip in ips]
-        except Exception as e:
-            logger.error(f"bd_banlist: Error fetching: {e}")
-            return []
-
-    async def _fetch_fraudguard(self) -> List[Dict]:
-        url = self.urls["fraudguard"]
-        try:
-            async with self.session.get(url, proxy=PROXY, timeout=10) as response:
-                if response.status != 200:
-                    return []
-                text = await response.text()
-                match = re.search(r'const threatData = (\[.*?\]);', text, re.DOTALL)
-                if not match:
-                    return []
-                attacks_data = json.loads(match.group(1))
-                ips = set()
-                for attack in attacks_data:
-                    ip = attack.get("ip")
-                    if ip and self.is_valid_ip(ip):
-                        ips.add(ip)
-                return [self._create_ip_entry(ip, "malicious") for ip in sorted(ips)]
-        except Exception as e:
-            logger.error(f"fraudguard: Error fetching: {e}")
-            return []
-
-    async def _fetch_talos(self) -> List[Dict]:
-        url = self.urls["talos"]
-        data = await self.fetch_with_retry(url)
-        if not data:
-            return []
-        ips = set()
-        for entry in data.get("spam", []):
-            ip = entry.get("ip")
-            if ip and self.is_valid_ip(ip):
-                ips.add(ip)
-        return [self._create_ip_entry(ip, "spam") for ip in sorted(ips)]
-
-    def _create_ip_entry(self, ip: str, source_type: str) -> Dict:
-        latitude, longitude = self.get_ip_coordinates(ip)
+    def _create_ip_entry(self, ip: str, source_type: str, reader=None) -> Dict:
+        latitude, longitude = self.geoip.coordinates(ip, reader)
         return {
             "ip": ip,
             "latitude": latitude,
@@ -613,57 +379,159 @@ class MaliciousIPCollector(BaseDataCollector):
         }
 
     def is_valid_ip(self, ip_str: str) -> bool:
-        try:
-            ip_address(ip_str)
-            return True
-        except ValueError:
-            return False
+        return is_valid_ip(ip_str)
 
     def get_ip_coordinates(self, ip: str) -> tuple[Optional[float], Optional[float]]:
-        if not self.geo_reader:
-            return None, None
-        try:
-            response = self.geo_reader.city(ip)
-            return response.location.latitude, response.location.longitude
-        except Exception:
-            return None, None
+        return self.geoip.coordinates(ip)
 
 class ThreatIntelligenceAggregator:
-    """Aggregates data from threat, news, and IP collectors."""
-    def __init__(self):
-        self.threat_collector = ThreatDataCollector(
-            sources=["fortiguard", "checkpoint", "radware"],
-            interval=10.0
-        )
-        self.news_collector = NewsDataCollector(
-            sources=[
-                {"name": "hackernews", "url": "https://feeds.feedburner.com/TheHackersNews"},
-                {"name": "darkreading", "url": "https://www.darkreading.com/rss.xml"},
-                {"name": "420in", "url": "https://the420.in/feed"}
-            ]
-        )
-        self.ip_collector = MaliciousIPCollector(
-            sources=["alienvault", "bd_banlist", "fraudguard", "talos"]
-        )
-        self.threat_queue = deque()
+    """Aggregates data from threat, news, and IP collectors.
+
+    Collectors are created on first access and only receive the sources
+    enabled through LCTM_SOURCES, so a worker never pays for a source it
+    does not serve.
+    """
+    def __init__(self, enabled: Optional[Set[str]] = None):
+        self.enabled = enabled if enabled is not None else enabled_sources()
+        self._threat_collector: Optional[ThreatDataCollector] = None
+        self._news_collector: Optional[NewsDataCollector] = None
+        self._ip_collector: Optional[MaliciousIPCollector] = None
+        # Batches waiting for get_*_batch when nothing is published; the oldest are dropped past BUFFER_SIZE
+        self.threat_queue = BoundedQueue("threat_queue", BUFFER_SIZE, "drop-oldest")
+        self.threat_pipeline: Optional[Pipeline] = None
+        self.news_store = NewsStore()
         self.news_list = []
-        self.ip_queue = deque()
+        self.ip_queue = BoundedQueue("ip_queue", BUFFER_SIZE, "drop-oldest")
+        # Reputation checks of collected IPs, when LCTM_REPUTATION_PROVIDER (or ABUSEIPDB_API_KEY) is set
+        self.reputation: Optional[ReputationEnricher] = None
+        # What the next state checkpoint saves: recent threat batches (with their arrival time) and the last IP set
+        self.recent_threats: Deque[Tuple[float, List[ThreatEvent]]] = deque()
+        self.ip_data: List[Dict] = []
+        self.state_path = STATE_PATH
+        self._collecting = False
+
+    def filter_sources(self, names: List[str], opt_in: Sequence[str] = ()) -> List[str]:
+        """``names`` enabled through LCTM_SOURCES (all when unset), followed by the ``opt_in`` ones it names."""
+        if self.enabled is None:
+            return list(names)
+        return [name for name in (*names, *opt_in) if name in self.enabled]
+
+    @property
+    def threat_collector(self) -> ThreatDataCollector:
+        if self._threat_collector is None:
+            self._threat_collector = ThreatDataCollector(
+                sources=self.filter_sources(THREAT_SOURCES),
+                interval=10.0
+            )
+        return self._threat_collector
+
+    @property
+    def news_collector(self) -> NewsDataCollector:
+        if self._news_collector is None:
+            enabled = set(self.filter_sources([source["name"] for source in NEWS_SOURCES]))
+            self._news_collector = NewsDataCollector(
+                sources=[source for source in NEWS_SOURCES if source["name"] in enabled],
+                store=self.news_store
+            )
+        return self._news_collector
+
+    @property
+    def ip_collector(self) -> MaliciousIPCollector:
+        if self._ip_collector is None:
+            self._ip_collector = MaliciousIPCollector(
+                sources=self.filter_sources(IP_SOURCES, OPT_IN_IP_SOURCES)
+            )
+        return self._ip_collector
+
+    async def start_collectors(self, publish: Optional[Callable[[str, object], None]] = None):
+        """Start all collectors that have enabled sources and store their data.
+
+        When ``publish`` is given, output is forwarded as ``publish(topic, data)``
+        instead: "threats" carries each new batch, "news" carries the newest
+        stored articles whenever new ones arrive, "ips" announces each newly written
+        memory-mappable IP snapshot file, and "dictionary" carries the country
+        and attack-type id tables whenever they grow.
+        """
+        self.news_collector.interval = NEWS_INTERVAL
+        self.ip_collector.interval = IP_INTERVAL
+        ATTACK_TYPES.load(ATTACK_TYPES_PATH)
+        vocabulary_size = [len(COUNTRIES), len(ATTACK_TYPES)]
+
+        def publish_vocabulary():
+            """Persist and announce new id assignments before any batch that uses them."""
+            size = [len(COUNTRIES), len(ATTACK_TYPES)]
+            if size != vocabulary_size:
+                vocabulary_size[:] = size
+                try:
+                    ATTACK_TYPES.save(ATTACK_TYPES_PATH)
+                except OSError as e:
+                    logger.warning(f"Could not save attack type ids: {e}")
+            publish("dictionary", {"countries": COUNTRIES.values(), "attack_types": ATTACK_TYPES.values()})
+
+        def emit_threats(data: List[ThreatEvent], received: Optional[float] = None):
+            now = time.time()
+            self.recent_threats.append((received or now, data))
+            while self.recent_threats and self.recent_threats[0][0] < now - STATE_THREAT_WINDOW:
+                self.recent_threats.popleft()
+            if publish:
+                if [len(COUNTRIES), len(ATTACK_TYPES)] != vocabulary_size:
+                    publish_vocabulary()
+                publish("threats", data)
+            else:
+                self.threat_queue.extend(data)
 
-    async def start_collectors(self):
-        """Start all collectors and store their data."""
         async def collect_threat():
-            async for data in self.threat_collector.stream_data():
-                self.threat_queue.extend(data)
+            if publish:
+                publish_vocabulary()
+            # The pipeline polls streaming feeds itself instead of buffering them in the background
+            await self.threat_collector.initialize(background_streams=False)
+            self.threat_pipeline = self.threat_collector.pipeline(emit_threats)
+            await self.threat_pipeline.run()
 
         async def collect_news():
+            # Articles stored by earlier runs are served until the first poll completes
+            self.news_list = self.news_store.latest()
+            if publish and self.news_list:
+                publish("news", self.news_list)
             async for data in self.news_collector.stream_data():
-                self.news_list = data  # Replace with latest data
+                if data:  # Only articles the store had not seen
+                    self.news_list = self.news_store.latest()
+                    if publish:
+                        publish("news", self.news_list)
 
         async def collect_ips():
             async for data in self.ip_collector.stream_data():
-                self.ip_queue.extend(data)
-
-        await asyncio.gather(collect_threat(), collect_news(), collect_ips())
+                if data:
+                    self.ip_data = data
+                if publish:
+                    if data:
+                        # Workers map the written file; only its location is published
+                        metadata = await offload("ip snapshot", write_ip_snapshot, data,
+                                                 self.ip_collector.source_masks, IP_SOURCE_BITS)
+                        publish("ips", metadata)
+                else:
+                    self.ip_queue.extend(data)
+                if self.reputation and data:
+                    await self.reputation.submit([item["ip"] for item in data])
+
+        # Serve the last run's data until every collector has completed a cycle
+        self._collecting = True
+        state = await offload("state load", load_state, self.state_path)
+        if state:
+            await self.restore_state(state, emit_threats, publish)
+
+        tasks = [self.checkpoint_state()] if self.state_path else []
+        if self.threat_collector.sources:
+            tasks.append(collect_threat())
+        if self.news_collector.sources:
+            tasks.append(collect_news())
+        if self.ip_collector.sources:
+            tasks.append(collect_ips())
+            tasks.append(self.ip_collector.geoip.watch())
+            self.reputation = ReputationEnricher.from_env()
+            if self.reputation:
+                tasks.append(self.reputation.run())
+        await asyncio.gather(*tasks)
 
     async def get_threat_batch(self, batch_size: int) -> List[Dict]:
         """Retrieve a batch of threat data."""
@@ -679,17 +547,76 @@ class ThreatIntelligenceAggregator:
             batch.append(self.ip_queue.popleft())
         return batch
 
+    async def restore_state(self, state: Dict, emit_threats: Callable, publish: Optional[Callable[[str, object], None]]):
+        """Replay a checkpoint: cursors resume, saved threats are emitted and the saved IP set is served."""
+        started = time.perf_counter()
+        for name, cursor_state in state.get("cursors", {}).items():
+            if name in self.threat_collector.sources and name in self.threat_collector.cursors:
+                self.threat_collector.cursors[name].restore(cursor_state)
+        threat_count = 0
+        oldest = time.time() - STATE_THREAT_WINDOW
+        for received_ms, records in state.get("threats", []):
+            if received_ms / 1000 >= oldest and records:
+                emit_threats([ThreatEvent.from_public(record) for record in records], received_ms / 1000)
+                threat_count += len(records)
+        ip_count = 0
+        if state.get("ips") and self.ip_collector.sources:
+            entries, source_masks = unpack_ips(state["ips"])
+            self.ip_data = entries
+            self.ip_collector.source_masks = source_masks
+            if publish:
+                publish("ips", await offload("ip snapshot", write_ip_snapshot, entries, source_masks, IP_SOURCE_BITS))
+            else:
+                self.ip_queue.extend(entries)
+            ip_count = len(entries)
+        logger.info(f"Warm start: Restored {threat_count} threats, {ip_count} IPs and "
+                    f"{len(state.get('cursors', {}))} cursors in {time.perf_counter() - started:.2f}s")
+
+    def _write_state(self, threats: List[Tuple[float, List[ThreatEvent]]], ip_data: List[Dict],
+                     source_masks: Dict[str, int], cursors: Dict[str, Dict]) -> int:
+        return save_state({
+            "threats": [[int(received * 1000), to_public(batch)] for received, batch in threats],
+            "ips": pack_ips(ip_data, source_masks) if ip_data else None,
+            "cursors": cursors,
+        }, self.state_path)
+
+    async def save_state(self) -> None:
+        """Checkpoint recent threats, the IP set and the poll cursors (the news store is already on disk)."""
+        cursors = {}
+        if self._threat_collector:
+            cursors = {name: cursor.state() for name, cursor in self._threat_collector.cursors.items()
+                       if cursor.watermark is not None}
+        source_masks = self._ip_collector.source_masks if self._ip_collector else {}
+        try:
+            size = await offload("state save", self._write_state, list(self.recent_threats), self.ip_data,
+                                 source_masks, cursors)
+            logger.debug(f"Warm start: Saved {size} bytes of state to {self.state_path}")
+        except OSError as e:
+            logger.warning(f"Warm start: Could not save state to {self.state_path}: {e}")
+
+    async def checkpoint_state(self):
+        while True:
+            await asyncio.sleep(STATE_INTERVAL)
+            await self.save_state()
+
+    def pipeline_stats(self) -> Dict[str, Dict]:
+        """Queue sizes, drop counters and per-stage work of the threat pipeline."""
+        stats = self.threat_pipeline.stats() if self.threat_pipeline else {"queues": {}, "stages": {}}
+        for queue in (self.threat_queue, self.ip_queue):
+            stats["queues"][queue.name] = queue.stats()
+        return stats
+
     async def get_news(self) -> List[Dict]:
         """Retrieve the latest news data."""
         return self.news_list
 
     async def close(self):
-        """Close all collector sessions."""
-        await asyncio.gather(
-            self.threat_collector.close(),
-            self.news_collector.close(),
-            self.ip_collector.close()
-        )
+        """Save a final state checkpoint, stop every collector that was created and close the shared HTTP session."""
+        if self._collecting and self.state_path:
+            await self.save_state()
+        collectors = [self._threat_collector, self._news_collector, self._ip_collector]
+        await asyncio.gather(*(collector.close() for collector in collectors if collector))
+        await close_session()
 
 if __name__ == "__main__":
     async def run_menu():
@@ -712,7 +639,7 @@ if __name__ == "__main__":
                     try:
                         async for data_batch in aggregator.threat_collector.stream_data():
                             with open("threat_data.txt", "w") as f:
-                                f.write(json.dumps(data_batch, indent=2))
+                                f.write(json.dumps(to_public(data_batch), indent=2))
                             print(f"Collected {len(data_batch)} threat data entries. Saved to threat_data.txt")
                     except KeyboardInterrupt:
                         print("\nStopped threat stream.")
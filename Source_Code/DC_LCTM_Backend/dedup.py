@@ -0,0 +1,65 @@
+import hashlib
+import math
+import os
+import time
+from typing import List, Optional
+
+# Seconds an event stays recognizable as a duplicate; should cover the overlap between polls
+DEDUP_WINDOW = float(os.getenv("LCTM_DEDUP_WINDOW", "600"))
+# Distinct events expected per window, and the accepted chance of dropping a new event as a duplicate
+DEDUP_CAPACITY = int(os.getenv("LCTM_DEDUP_CAPACITY", "100000"))
+DEDUP_ERROR_RATE = float(os.getenv("LCTM_DEDUP_ERROR_RATE", "0.001"))
+
+
+class RotatingBloomFilter:
+    """Fixed-memory set of recently seen fingerprints.
+
+    Holds ``generations`` Bloom filters, each collecting the fingerprints of
+    one ``window / (generations - 1)`` slice of time. When a slice ends the
+    oldest filter is cleared and reused, so a fingerprint is remembered for
+    at least ``window`` seconds and memory never grows. Each filter is sized
+    for its share of ``capacity`` at ``error_rate / generations``, keeping the
+    overall false-positive rate (a new event taken for a duplicate) within
+    ``error_rate`` while the capacity is respected.
+    """
+    def __init__(self, window: float = DEDUP_WINDOW, capacity: int = DEDUP_CAPACITY,
+                 error_rate: float = DEDUP_ERROR_RATE, generations: int = 4):
+        self.span = window / (generations - 1)
+        per_generation = max(1, math.ceil(capacity / (generations - 1)))
+        error = error_rate / generations
+        self.bits = max(64, math.ceil(-per_generation * math.log(error) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / per_generation * math.log(2)))
+        self.filters: List[bytearray] = [bytearray((self.bits + 7) // 8) for _ in range(generations)]
+        self.current = 0
+        self.rotated_at = time.monotonic()
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(len(bits) for bits in self.filters)
+
+    def _positions(self, fingerprint: bytes) -> List[int]:
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(fingerprint, digest_size=16).digest()
+        a, b = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(a + i * b) % self.bits for i in range(self.hashes)]
+
+    def _rotate(self, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        elapsed = int((now - self.rotated_at) // self.span)
+        for _ in range(min(elapsed, len(self.filters))):
+            self.current = (self.current + 1) % len(self.filters)
+            self.filters[self.current][:] = bytes(len(self.filters[self.current]))
+        if elapsed:
+            self.rotated_at += elapsed * self.span
+
+    def add(self, fingerprint: bytes) -> bool:
+        """Record a fingerprint; returns False if it was (probably) seen within the window."""
+        self._rotate()
+        positions = self._positions(fingerprint)
+        for bits in self.filters:
+            if all(bits[position >> 3] & (1 << (position & 7)) for position in positions):
+                return False
+        bits = self.filters[self.current]
+        for position in positions:
+            bits[position >> 3] |= 1 << (position & 7)
+        return True
@@ -0,0 +1,149 @@
+import logging
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from ip_snapshot import IPSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Clusters are precomputed for zoom levels 0..MAX_CLUSTER_ZOOM; deeper zooms reuse the last level
+MAX_CLUSTER_ZOOM = int(os.getenv("LCTM_MAX_CLUSTER_ZOOM", "12"))
+# Each map tile is split into 2**CELL_BITS x 2**CELL_BITS grid cells
+CELL_BITS = 2
+# Web Mercator cannot show the poles
+MAX_LATITUDE = 85.05112878
+
+
+def cell_position(lat: float, lon: float, bits: int) -> Tuple[int, int]:
+    """Web Mercator grid cell of a point on a 2**bits x 2**bits grid."""
+    size = 1 << bits
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    x = (lon + 180.0) / 360.0
+    y = (1.0 - math.log(math.tan(math.radians(lat)) + 1.0 / math.cos(math.radians(lat))) / math.pi) / 2.0
+    return min(size - 1, max(0, int(x * size))), min(size - 1, max(0, int(y * size)))
+
+
+class Cluster:
+    __slots__ = ("count", "lat_sum", "lon_sum", "types", "index")
+
+    def __init__(self):
+        self.count = 0
+        self.lat_sum = 0.0
+        self.lon_sum = 0.0
+        self.types: Dict[int, int] = {}
+        self.index = -1  # Snapshot record of a single-IP cluster
+
+    def merge(self, other: "Cluster") -> None:
+        self.count += other.count
+        self.lat_sum += other.lat_sum
+        self.lon_sum += other.lon_sum
+        for type_id, count in other.types.items():
+            self.types[type_id] = self.types.get(type_id, 0) + count
+        self.index = other.index if self.count == other.count else -1
+
+
+class ClusterIndex:
+    """Grid clusters of one IP snapshot for every zoom level, bucketed by map tile.
+
+    Geolocated IPs are binned once into grid cells at the deepest zoom; each
+    shallower level merges the four cells below it. A cluster is reported at
+    the mean position of its IPs, with its count and per-type counts (and the
+    address itself when it holds a single IP).
+    """
+    def __init__(self, snapshot: IPSnapshot, max_zoom: int = MAX_CLUSTER_ZOOM):
+        started = time.perf_counter()
+        self.generation = snapshot.generation
+        self.max_zoom = max_zoom
+        levels: List[Dict[Tuple[int, int], Cluster]] = [{} for _ in range(max_zoom + 1)]
+        finest = levels[max_zoom]
+        latitudes, longitudes, type_ids = snapshot.latitudes, snapshot.longitudes, snapshot.type_ids
+        for index in range(len(snapshot)):
+            lat, lon = latitudes[index], longitudes[index]
+            if math.isnan(lat) or math.isnan(lon):
+                continue
+            cell = cell_position(lat, lon, max_zoom + CELL_BITS)
+            cluster = finest.get(cell)
+            if cluster is None:
+                cluster = finest[cell] = Cluster()
+                cluster.index = index
+            else:
+                cluster.index = -1
+            cluster.count += 1
+            cluster.lat_sum += lat
+            cluster.lon_sum += lon
+            cluster.types[type_ids[index]] = cluster.types.get(type_ids[index], 0) + 1
+        for zoom in range(max_zoom - 1, -1, -1):
+            level = levels[zoom]
+            for (x, y), child in levels[zoom + 1].items():
+                parent = level.get((x >> 1, y >> 1))
+                if parent is None:
+                    parent = level[(x >> 1, y >> 1)] = Cluster()
+                parent.merge(child)
+
+        # (cell x, cell y, public record), grouped by the map tile containing the cell
+        self.tiles: List[Dict[Tuple[int, int], List[Tuple[int, int, Dict]]]] = []
+        self.counts: List[int] = []
+        for level in levels:
+            tiles: Dict[Tuple[int, int], List[Tuple[int, int, Dict]]] = {}
+            for (x, y), cluster in level.items():
+                tiles.setdefault((x >> CELL_BITS, y >> CELL_BITS), []).append((x, y, self._public(snapshot, cluster)))
+            self.tiles.append(tiles)
+            self.counts.append(len(level))
+        logger.info(f"Geo clusters: Built zooms 0-{max_zoom} for generation {self.generation} "
+                    f"({self.counts[-1]} cells at zoom {max_zoom}) in {time.perf_counter() - started:.2f}s")
+
+    @staticmethod
+    def _public(snapshot: IPSnapshot, cluster: Cluster) -> Dict:
+        record = {
+            "lat": round(cluster.lat_sum / cluster.count, 4),
+            "lon": round(cluster.lon_sum / cluster.count, 4),
+            "count": cluster.count,
+            "types": {snapshot.types[type_id]: count for type_id, count in cluster.types.items()},
+        }
+        if cluster.count == 1:
+            record["ip"] = snapshot._address(cluster.index)
+        return record
+
+    def query(self, zoom: int, bbox: Optional[Tuple[float, float, float, float]] = None) -> List[Dict]:
+        """Clusters at ``zoom`` whose grid cell overlaps ``bbox`` (west, south, east, north).
+
+        A bbox with west > east crosses the antimeridian.
+        """
+        zoom = max(0, min(zoom, self.max_zoom))
+        tiles = self.tiles[zoom]
+        if bbox is None:
+            return [record for entries in tiles.values() for _, _, record in entries]
+        west, south, east, north = bbox
+        spans = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+        found = []
+        for span_west, span_east in spans:
+            x0, y0 = cell_position(north, span_west, zoom + CELL_BITS)
+            x1, y1 = cell_position(south, span_east, zoom + CELL_BITS)
+            tx0, ty0, tx1, ty1 = x0 >> CELL_BITS, y0 >> CELL_BITS, x1 >> CELL_BITS, y1 >> CELL_BITS
+            if (tx1 - tx0 + 1) * (ty1 - ty0 + 1) > len(tiles):
+                candidates = [entry for entries in tiles.values() for entry in entries]
+            else:
+                candidates = [entry for x in range(tx0, tx1 + 1) for y in range(ty0, ty1 + 1)
+                              for entry in tiles.get((x, y), ())]
+            found.extend(record for x, y, record in candidates if x0 <= x <= x1 and y0 <= y <= y1)
+        return found
+
+
+class ClusterCache:
+    """Process-wide ``ClusterIndex`` of the current snapshot, rebuilt once per generation."""
+    def __init__(self, max_zoom: int = MAX_CLUSTER_ZOOM):
+        self.max_zoom = max_zoom
+        self._index: Optional[ClusterIndex] = None
+        self._lock = threading.Lock()
+
+    def get(self, snapshot: IPSnapshot) -> ClusterIndex:
+        index = self._index
+        if index is None or index.generation != snapshot.generation:
+            with self._lock:
+                if self._index is None or self._index.generation != snapshot.generation:
+                    self._index = ClusterIndex(snapshot, self.max_zoom)
+                index = self._index
+        return index
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Optional, Tuple
+
+from offload import offload
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GEOLITE2_DB_PATH = os.path.abspath(os.getenv("GEOLITE2_DB_PATH",
+                                             os.path.join(BASE_DIR, "assets", "GeoLite2-City.mmdb")))
+# Seconds between checks for a replaced database file
+GEOIP_CHECK_INTERVAL = float(os.getenv("LCTM_GEOIP_CHECK_INTERVAL", "60"))
+
+
+def open_reader(path: str):
+    """Open ``path`` memory-mapped, with the C extension when it is installed."""
+    import geoip2.database  # Deferred: only loaded when IP sources are enabled
+    from maxminddb import MODE_MMAP, MODE_MMAP_EXT
+    try:
+        return geoip2.database.Reader(path, mode=MODE_MMAP_EXT)
+    except ValueError:  # maxminddb was installed without its C extension
+        return geoip2.database.Reader(path, mode=MODE_MMAP)
+
+
+class GeoIPDatabase:
+    """Process-wide GeoLite2 City reader that follows the database file as it is replaced.
+
+    The file is memory-mapped, so every process using it shares the page
+    cache instead of holding its own copy. ``watch`` checks the file every
+    ``interval`` seconds; a new version (new inode, size or modification
+    time) is opened and checked first, then swapped in with one reference
+    assignment. Lookups in flight keep the reader they started with, and an
+    old reader is unmapped once the last of them drops it. Replace the file
+    with a rename (``mv``), not by overwriting it in place, since a mapped
+    file must not change under its readers. A version that fails to open
+    leaves the current one in service.
+    """
+    def __init__(self, path: str = GEOLITE2_DB_PATH, interval: float = GEOIP_CHECK_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.reader = None
+        self.version: Optional[Tuple[int, int, int]] = None
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._watching = False
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def open(self) -> bool:
+        """Open the database if it is missing or has been replaced; True if a new version was swapped in."""
+        version = self._stat()
+        if version is None:
+            if self.reader is None:
+                logger.error(f"GeoIP: GeoLite2 database not found at {self.path}")
+            return False
+        if version == self.version:
+            return False
+        with self._lock:
+            if version == self.version:
+                return False
+            try:
+                reader = open_reader(self.path)
+                metadata = reader.metadata()
+                if "City" not in metadata.database_type:
+                    raise ValueError(f"expected a City database, found {metadata.database_type}")
+            except Exception as e:
+                logger.error(f"GeoIP: Failed to open {self.path}: {e}")
+                self.version = version  # Not retried until the file changes again
+                return False
+            previous, self.reader, self.version = self.reader, reader, version
+        logger.info(f"GeoIP: {'Reloaded' if previous else 'Opened'} {metadata.database_type} "
+                    f"built {metadata.build_epoch} from {self.path}")
+        if previous is not None:
+            self.reloads += 1
+        return True
+
+    def coordinates(self, ip: str, reader=None) -> Tuple[Optional[float], Optional[float]]:
+        """Latitude and longitude of ``ip`` (None, None when unknown); pass ``reader`` to pin one version."""
+        reader = reader or self.reader
+        if reader is None:
+            return None, None
+        try:
+            location = reader.city(ip).location
+            return location.latitude, location.longitude
+        except Exception:
+            return None, None
+
+    async def watch(self) -> None:
+        """Reload the database whenever its file is replaced; a second call on a watching instance returns at once."""
+        if self._watching:
+            return
+        self._watching = True
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                if self._stat() != self.version:
+                    await offload("geoip reload", self.open)
+        finally:
+            self._watching = False
+
+
+# Shared by every collector of this process
+geoip = GeoIPDatabase()
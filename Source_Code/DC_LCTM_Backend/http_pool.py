@@ -0,0 +1,64 @@
+import asyncio
+import logging
+import os
+import random
+from typing import Dict, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# User-Agent pool for rotation
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:130.0) Gecko/20100101 Firefox/130.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14.6) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Safari/605.1.15',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36'
+]
+
+# Connection limits for the whole process and for any single upstream host
+HTTP_LIMIT = int(os.getenv("LCTM_HTTP_LIMIT", "100"))
+HTTP_LIMIT_PER_HOST = int(os.getenv("LCTM_HTTP_LIMIT_PER_HOST", "8"))
+# Seconds resolved addresses are cached, and idle keep-alive connections are held open
+DNS_CACHE_TTL = int(os.getenv("LCTM_DNS_CACHE_TTL", "300"))
+KEEPALIVE_TIMEOUT = float(os.getenv("LCTM_KEEPALIVE_TIMEOUT", "60"))
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    """The process-wide client session, created on first use on the running event loop.
+
+    Every collector shares its connector, so keep-alive connections, TLS
+    sessions and cached DNS results carry over between polls and sources.
+    Sessions carry no default User-Agent; use ``request_headers`` per request.
+    """
+    global _session
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session.loop is not loop:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=HTTP_LIMIT,
+                limit_per_host=HTTP_LIMIT_PER_HOST,
+                ttl_dns_cache=DNS_CACHE_TTL,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ),
+            timeout=aiohttp.ClientTimeout(total=30),
+        )
+        logger.info(f"HTTP pool: Created shared session ({HTTP_LIMIT} connections, {HTTP_LIMIT_PER_HOST} per host)")
+    return _session
+
+
+def request_headers(headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Headers for one request: a freshly picked User-Agent, overridden by ``headers``."""
+    return {"User-Agent": random.choice(USER_AGENTS), **(headers or {})}
+
+
+async def close_session() -> None:
+    """Close the shared session; the next ``get_session`` opens a new one."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logger.info("HTTP pool: Closed shared session")
+    _session = None
@@ -0,0 +1,267 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import aiohttp
+
+from country_data import DATA_DIR, ensure_parent
+from http_pool import get_session, request_headers
+from offload import offload
+
+logger = logging.getLogger(__name__)
+
+# Provider used to enrich malicious IPs: "abuseipdb", "mock" (offline, deterministic) or "" to disable.
+# Defaults to abuseipdb when an API key is configured.
+ABUSEIPDB_API_KEY = os.getenv("ABUSEIPDB_API_KEY", "")
+REPUTATION_PROVIDER = os.getenv("LCTM_REPUTATION_PROVIDER", "abuseipdb" if ABUSEIPDB_API_KEY else "").lower()
+# Shared by the enriching process and every worker serving /ip/<addr>
+REPUTATION_DB_PATH = os.getenv("LCTM_REPUTATION_DB", os.path.join(DATA_DIR, "reputation.sqlite3"))
+# Seconds a cached reputation stays fresh before the IP is checked again
+REPUTATION_TTL = float(os.getenv("LCTM_REPUTATION_TTL", str(24 * 3600)))
+# Provider requests per second (shared by every check) and the burst allowed above it
+REPUTATION_RATE = float(os.getenv("LCTM_REPUTATION_RATE", "1"))
+REPUTATION_BURST = int(os.getenv("LCTM_REPUTATION_BURST", "5"))
+# IPs checked per batch, and at most this many waiting to be checked
+REPUTATION_BATCH = int(os.getenv("LCTM_REPUTATION_BATCH", "25"))
+REPUTATION_BACKLOG = int(os.getenv("LCTM_REPUTATION_BACKLOG", "10000"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reputation (
+    ip TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    checked_ms INTEGER NOT NULL,
+    expires_ms INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reputation_expires ON reputation (expires_ms);
+"""
+
+
+class RateLimiter:
+    """Token bucket shared by every request to one provider.
+
+    ``pause`` empties the bucket for a while, e.g. after the provider answers
+    429, so every waiting check backs off together.
+    """
+    def __init__(self, rate: float = REPUTATION_RATE, burst: int = REPUTATION_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        self.tokens = -seconds * self.rate
+        self.updated = time.monotonic()
+
+
+class ReputationCache:
+    """Persistent TTL cache of reputation results in SQLite (one connection per thread)."""
+    def __init__(self, path: str = REPUTATION_DB_PATH, ttl: float = REPUTATION_TTL):
+        self.path = path
+        self.ttl_ms = int(ttl * 1000)
+        self._local = threading.local()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            ensure_parent(self.path)
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def get(self, ip: str) -> Optional[Dict]:
+        """The cached entry for ``ip`` with its check and expiry times, fresh or not."""
+        row = self.db.execute("SELECT data, checked_ms, expires_ms FROM reputation WHERE ip = ?", (ip,)).fetchone()
+        if row is None:
+            return None
+        data, checked_ms, expires_ms = row
+        return {**json.loads(data), "checked_ms": checked_ms, "expires_ms": expires_ms,
+                "stale": expires_ms <= time.time() * 1000}
+
+    def fresh(self, ips: Iterable[str]) -> set:
+        """The subset of ``ips`` with an unexpired entry."""
+        ips = list(ips)
+        now_ms = int(time.time() * 1000)
+        found = set()
+        for start in range(0, len(ips), 500):
+            chunk = ips[start:start + 500]
+            rows = self.db.execute(
+                f"SELECT ip FROM reputation WHERE expires_ms > ? AND ip IN ({','.join('?' * len(chunk))})",
+                (now_ms, *chunk)
+            )
+            found.update(row[0] for row in rows)
+        return found
+
+    def put_many(self, results: Dict[str, Dict]) -> None:
+        now_ms = int(time.time() * 1000)
+        with self.db as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO reputation (ip, data, checked_ms, expires_ms) VALUES (?, ?, ?, ?)",
+                [(ip, json.dumps(data), now_ms, now_ms + self.ttl_ms) for ip, data in results.items()]
+            )
+
+
+class ProviderBusy(Exception):
+    """Raised by a provider asked to slow down; ``retry_after`` is in seconds."""
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limited, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AbuseIPDBProvider:
+    """Checks IPs against the AbuseIPDB v2 ``check`` API."""
+    name = "abuseipdb"
+    url = "https://api.abuseipdb.com/api/v2/check"
+
+    def __init__(self, api_key: str = ABUSEIPDB_API_KEY, max_age_days: int = 90):
+        if not api_key:
+            raise ValueError("ABUSEIPDB_API_KEY is not set")
+        self.api_key = api_key
+        self.max_age_days = max_age_days
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def initialize(self):
+        self.session = get_session()
+
+    async def close(self):
+        self.session = None
+
+    async def check(self, ip: str) -> Dict:
+        params = {"ipAddress": ip, "maxAgeInDays": str(self.max_age_days)}
+        headers = request_headers({"Accept": "application/json", "Key": self.api_key})
+        async with self.session.get(self.url, params=params, headers=headers) as response:
+            if response.status == 429:
+                raise ProviderBusy(float(response.headers.get("Retry-After", 60)))
+            response.raise_for_status()
+            data = (await response.json(content_type=None)).get("data", {})
+        return {
+            "ip": ip,
+            "provider": self.name,
+            "score": data.get("abuseConfidenceScore"),
+            "reports": data.get("totalReports"),
+            "last_reported": data.get("lastReportedAt"),
+            "country": data.get("countryCode"),
+            "isp": data.get("isp"),
+            "usage_type": data.get("usageType"),
+        }
+
+
+class MockReputationProvider:
+    """Offline provider with scores derived from a hash of the IP, for local runs."""
+    name = "mock"
+
+    async def initialize(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def check(self, ip: str) -> Dict:
+        digest = hashlib.sha1(ip.encode("utf-8")).digest()
+        return {
+            "ip": ip,
+            "provider": self.name,
+            "score": digest[0] * 100 // 255,
+            "reports": digest[1],
+            "last_reported": None,
+            "country": None,
+            "isp": None,
+            "usage_type": None,
+        }
+
+
+PROVIDERS = {"abuseipdb": AbuseIPDBProvider, "mock": MockReputationProvider}
+
+
+class ReputationEnricher:
+    """Checks submitted IPs against a provider in rate-limited batches.
+
+    ``submit`` queues the IPs without a fresh cache entry (replacing any still
+    waiting, newest first, up to ``backlog``); ``run`` checks them a batch at
+    a time, each request waiting on the shared rate limiter, and stores every
+    batch's results in the cache in one transaction. Cache reads and writes
+    run in the offload pool; a check that fails is logged and skipped, so one
+    bad response never stops the loop.
+    """
+    def __init__(self, provider, cache: Optional[ReputationCache] = None, limiter: Optional[RateLimiter] = None,
+                 batch_size: int = REPUTATION_BATCH, backlog: int = REPUTATION_BACKLOG):
+        self.provider = provider
+        self.cache = cache or ReputationCache()
+        self.limiter = limiter or RateLimiter()
+        self.batch_size = batch_size
+        self.backlog = backlog
+        self.pending: Dict[str, None] = {}
+        self._wake = asyncio.Event()
+
+    @classmethod
+    def from_env(cls) -> Optional["ReputationEnricher"]:
+        """The enricher configured by LCTM_REPUTATION_PROVIDER, or None when disabled."""
+        if not REPUTATION_PROVIDER:
+            return None
+        try:
+            return cls(PROVIDERS[REPUTATION_PROVIDER]())
+        except (KeyError, ValueError) as e:
+            logger.error(f"Reputation: Cannot use provider {REPUTATION_PROVIDER!r}: {e}")
+            return None
+
+    async def submit(self, ips: List[str]) -> None:
+        fresh = await offload("reputation cache", self.cache.fresh, ips)
+        stale = [ip for ip in ips if ip not in fresh][:self.backlog]
+        self.pending = dict.fromkeys(stale)
+        logger.info(f"Reputation: {len(stale)} of {len(ips)} IPs queued for checks ({len(fresh)} cached)")
+        self._wake.set()
+
+    async def _check(self, ip: str) -> Optional[Dict]:
+        while True:
+            await self.limiter.acquire()
+            try:
+                return await self.provider.check(ip)
+            except ProviderBusy as e:
+                logger.warning(f"Reputation: {self.provider.name} {e}")
+                self.limiter.pause(e.retry_after)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"Reputation: Check of {ip} failed: {e}")
+                return None
+            except Exception as e:
+                # E.g. a 200 whose body is not the JSON the provider documents
+                logger.error(f"Reputation: Check of {ip} returned an unusable response: {e!r}")
+                return None
+
+    async def run(self):
+        await self.provider.initialize()
+        try:
+            while True:
+                if not self.pending:
+                    self._wake.clear()
+                    await self._wake.wait()
+                batch = list(itertools.islice(self.pending, self.batch_size))
+                for ip in batch:
+                    self.pending.pop(ip, None)
+                results = await asyncio.gather(*(self._check(ip) for ip in batch))
+                checked = {ip: result for ip, result in zip(batch, results) if result is not None}
+                if checked:
+                    await offload("reputation cache", self.cache.put_many, checked)
+                logger.debug(f"Reputation: Checked {len(checked)} IPs, {len(self.pending)} pending")
+        finally:
+            await self.provider.close()
@@ -0,0 +1,270 @@
+import json
+import logging
+import math
+import mmap
+import os
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from ipaddress import ip_address
+from typing import Dict, Iterator, List, Optional
+
+from country_data import DATA_DIR, ensure_parent
+
+logger = logging.getLogger(__name__)
+
+# Shared by the process that writes the snapshot and every worker that maps it
+IP_SNAPSHOT_PATH = os.getenv("LCTM_IP_SNAPSHOT", os.path.join(DATA_DIR, "malicious-ips.bin"))
+
+MAGIC = b"LCTMIPS1"
+# magic, byte order (0 = little, 1 = big), IPv4 count, IPv6 count, metadata length, generation (epoch ms)
+HEADER = struct.Struct("=8sBxxxIIIq")
+NAN = float("nan")
+
+
+def _pad8(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def write_ip_snapshot(entries: List[Dict], source_masks: Dict[str, int], sources: List[str],
+                      path: str = IP_SNAPSHOT_PATH) -> Dict:
+    """Write the merged IP set as a packed, sorted binary snapshot and atomically replace ``path``.
+
+    Layout after the header and JSON metadata (each section 8-byte aligned):
+    IPv4 addresses (uint32), IPv6 addresses (16 bytes each), latitudes and
+    longitudes (float32, NaN when unknown), source bitmasks (uint16) and
+    type ids (uint8). IPv4 records come first, each family sorted by address.
+    """
+    types: List[str] = []
+    v4, v6 = [], []
+    for item in entries:
+        address = ip_address(item["ip"])
+        if item.get("type") not in types:
+            types.append(item.get("type"))
+        record = (int(address), item, types.index(item.get("type")))
+        (v4 if address.version == 4 else v6).append(record)
+    v4.sort(key=lambda record: record[0])
+    v6.sort(key=lambda record: record[0])
+    records = v4 + v6
+
+    generation = int(time.time() * 1000)
+    meta = json.dumps({"sources": sources, "types": types}).encode("utf-8")
+    sections = [
+        array("I", (record[0] for record in v4)).tobytes(),
+        b"".join(record[0].to_bytes(16, "big") for record in v6),
+        array("f", (NAN if r[1].get("latitude") is None else r[1]["latitude"] for r in records)).tobytes(),
+        array("f", (NAN if r[1].get("longitude") is None else r[1]["longitude"] for r in records)).tobytes(),
+        array("H", (source_masks.get(r[1]["ip"], 0) for r in records)).tobytes(),
+        array("B", (r[2] for r in records)).tobytes(),
+    ]
+
+    ensure_parent(path)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".lctm-ips-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            byte_order = 0 if sys.byteorder == "little" else 1
+            f.write(HEADER.pack(MAGIC, byte_order, len(v4), len(v6), len(meta), generation))
+            f.write(meta.ljust(_pad8(len(meta)), b"\0"))
+            for section in sections:
+                f.write(section.ljust(_pad8(len(section)), b"\0"))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    logger.info(f"IP snapshot: Wrote {len(records)} IPs (generation {generation}) to {path}")
+    return {"path": path, "generation": generation, "count": len(records)}
+
+
+class IPSnapshot:
+    """Read-only view over one memory-mapped snapshot file."""
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        magic, byte_order, n4, n6, meta_len, self.generation = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an IP snapshot")
+        if byte_order != (0 if sys.byteorder == "little" else 1):
+            raise ValueError(f"{path} was written on a machine with a different byte order")
+        offset = HEADER.size
+        meta = json.loads(bytes(buffer[offset:offset + meta_len]))
+        self.sources: List[str] = meta["sources"]
+        self.types: List[str] = meta["types"]
+        self._type_json = [json.dumps(name) for name in self.types]
+        offset += _pad8(meta_len)
+        self.n4, self.n6 = n4, n6
+        total = n4 + n6
+
+        def section(size: int, fmt: Optional[str] = None):
+            nonlocal offset
+            view = buffer[offset:offset + size]
+            offset += _pad8(size)
+            return view.cast(fmt) if fmt else view
+
+        self.v4 = section(4 * n4, "I")
+        self.v6 = section(16 * n6)
+        self.latitudes = section(4 * total, "f")
+        self.longitudes = section(4 * total, "f")
+        self.masks = section(2 * total, "H")
+        self.type_ids = section(total, "B")
+
+    def __len__(self) -> int:
+        return self.n4 + self.n6
+
+    def _address(self, index: int) -> str:
+        if index < self.n4:
+            return socket.inet_ntop(socket.AF_INET, self.v4[index].to_bytes(4, "big"))
+        start = (index - self.n4) * 16
+        return socket.inet_ntop(socket.AF_INET6, bytes(self.v6[start:start + 16]))
+
+    def find(self, ip: str) -> Optional[int]:
+        """Binary-search the packed addresses; returns the record index or None."""
+        try:
+            address = ip_address(ip)
+        except ValueError:
+            return None
+        if address.version == 4:
+            value = int(address)
+            index = bisect_left(self.v4, value)
+            return index if index < self.n4 and self.v4[index] == value else None
+        packed = address.packed
+        lo, hi = 0, self.n6
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(self.v6[mid * 16:mid * 16 + 16]) < packed:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.n6 and bytes(self.v6[lo * 16:lo * 16 + 16]) == packed:
+            return self.n4 + lo
+        return None
+
+    def record(self, index: int) -> Dict:
+        """Build the public JSON shape of one record, plus the sources that listed it."""
+        latitude, longitude = self.latitudes[index], self.longitudes[index]
+        mask = self.masks[index]
+        return {
+            "ip": self._address(index),
+            "latitude": None if math.isnan(latitude) else round(latitude, 4),
+            "longitude": None if math.isnan(longitude) else round(longitude, 4),
+            "type": self.types[self.type_ids[index]],
+            "sources": [name for bit, name in enumerate(self.sources) if mask & (1 << bit)],
+        }
+
+    def lookup(self, ip: str) -> Optional[Dict]:
+        index = self.find(ip)
+        return None if index is None else self.record(index)
+
+    def _key(self, index: int) -> int:
+        # Sort key across both families: IPv4 records sort before every IPv6 record
+        if index < self.n4:
+            return self.v4[index]
+        start = (index - self.n4) * 16
+        return (1 << 128) + int.from_bytes(self.v6[start:start + 16], "big")
+
+    def _same(self, index: int, other: "IPSnapshot", other_index: int) -> bool:
+        # NaN never equals itself, so coordinates are compared as raw float32 bits
+        return (struct.pack("ff", self.latitudes[index], self.longitudes[index])
+                == struct.pack("ff", other.latitudes[other_index], other.longitudes[other_index])
+                and self.masks[index] == other.masks[other_index]
+                and self.types[self.type_ids[index]] == other.types[other.type_ids[other_index]])
+
+    def diff(self, base: "IPSnapshot") -> Dict:
+        """Changes from ``base`` to this snapshot, found by one merge walk over both sorted sets.
+
+        Returns ``added`` and ``changed`` as records and ``removed`` as addresses.
+        """
+        added, changed, removed = [], [], []
+        i = j = 0
+        while i < len(self) or j < len(base):
+            if j >= len(base) or (i < len(self) and self._key(i) < base._key(j)):
+                added.append(self.record(i))
+                i += 1
+            elif i >= len(self) or base._key(j) < self._key(i):
+                removed.append(base._address(j))
+                j += 1
+            else:
+                if not self._same(i, base, j):
+                    changed.append(self.record(i))
+                i += 1
+                j += 1
+        return {"base": base.generation, "generation": self.generation,
+                "added": added, "changed": changed, "removed": removed}
+
+    def _public_json(self, index: int) -> str:
+        # Formatted directly: addresses need no escaping and type names are pre-encoded
+        latitude, longitude = self.latitudes[index], self.longitudes[index]
+        return (f'{{"ip": "{self._address(index)}", '
+                f'"latitude": {"null" if math.isnan(latitude) else round(latitude, 4)}, '
+                f'"longitude": {"null" if math.isnan(longitude) else round(longitude, 4)}, '
+                f'"type": {self._type_json[self.type_ids[index]]}}}')
+
+    def iter_json(self, chunk_size: int = 1000) -> Iterator[str]:
+        """Stream the records as one JSON array, in chunks of ``chunk_size`` records."""
+        yield "["
+        for start in range(0, len(self), chunk_size):
+            end = min(start + chunk_size, len(self))
+            prefix = "," if start else ""
+            yield prefix + ",".join(self._public_json(index) for index in range(start, end))
+        yield "]"
+
+    def iter_ndjson(self, chunk_size: int = 1000) -> Iterator[str]:
+        """Stream the records as newline-delimited JSON."""
+        for start in range(0, len(self), chunk_size):
+            end = min(start + chunk_size, len(self))
+            yield "".join(self._public_json(index) + "\n" for index in range(start, end))
+
+
+class IPSnapshotReader:
+    """Process-wide handle on the current snapshot, swapped when the file is replaced.
+
+    The writer replaces the file with ``os.replace``, so a new inode means a new
+    snapshot. Requests already holding the previous ``IPSnapshot`` keep reading
+    it; its mapping is released once the last of them drops the reference.
+    """
+    def __init__(self, path: str = IP_SNAPSHOT_PATH):
+        self.path = path
+        self._snapshot: Optional[IPSnapshot] = None
+        self._lock = threading.Lock()
+        # Recent deltas by (base generation, generation), shared by every WebSocket client
+        self._deltas: Dict[tuple, Dict] = {}
+
+    def current(self) -> Optional[IPSnapshot]:
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return self._snapshot
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.inode != inode:
+            with self._lock:
+                if self._snapshot is None or self._snapshot.inode != inode:
+                    try:
+                        self._snapshot = IPSnapshot(self.path)
+                        logger.info(f"IP snapshot: Mapped generation {self._snapshot.generation} ({len(self._snapshot)} IPs)")
+                    except (OSError, ValueError, struct.error) as e:
+                        logger.error(f"IP snapshot: Failed to map {self.path}: {e}")
+                snapshot = self._snapshot
+        return snapshot
+
+    def delta(self, base: IPSnapshot, snapshot: IPSnapshot) -> Dict:
+        """``snapshot.diff(base)``, computed once per pair of generations."""
+        key = (base.generation, snapshot.generation)
+        with self._lock:
+            cached = self._deltas.get(key)
+        if cached is None:
+            cached = snapshot.diff(base)
+            logger.info(f"IP snapshot: Delta {key[0]} -> {key[1]}: {len(cached['added'])} added, "
+                        f"{len(cached['changed'])} changed, {len(cached['removed'])} removed")
+            with self._lock:
+                self._deltas[key] = cached
+                while len(self._deltas) > 8:
+                    del self._deltas[next(iter(self._deltas))]
+        return cached
@@ -0,0 +1,376 @@
+"""Load test for /threats: how many concurrent subscribers one server process holds.
+
+Runs a synthetic (or replayed) collector service on a Unix socket, starts a
+server subscribed to it (or targets one already running with ``--url``) and
+opens SSE and/or WebSocket clients in steps. For each step it reports
+end-to-end delivery latency percentiles (collector send to client receive),
+server memory per connection, server CPU per delivered event and its own
+CPU, and stops at the first step where latency breaks down.
+
+    python loadtest.py --steps 100,500,1000,2000 --rate 200
+    python loadtest.py --protocol mixed --replay data/state.json.gz
+
+Linux only: server memory and CPU are read from /proc.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from collector_service import encode_frame
+from threat_event import COUNTRIES, ThreatEvent, parse_timestamp
+
+logger = logging.getLogger("loadtest")
+
+ATTACK_TYPES = ["DDoS", "Web Attacker", "Scanner", "Intrusion", "Malware", "Botnet"]
+# Launches a threaded development server on the given host and port
+SERVE = ("import sys, server; server.ensure_started(); "
+         "server.app.run(host=sys.argv[1], port=int(sys.argv[2]), threaded=True)")
+CONNECT_CHUNK = 200
+
+
+def load_replay(path: str) -> List[Dict]:
+    """Public threat records from a JSON array, NDJSON or a warm-start checkpoint (.gz)."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt") as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(data, dict):  # Warm-start checkpoint: [[received_ms, records], ...]
+        return [record for _, records in data.get("threats", []) for record in records]
+    return data
+
+
+class SyntheticCollector:
+    """Collector service stand-in publishing ``rate`` threat events per second, stamped as they are sent."""
+    def __init__(self, socket_path: str, rate: float, batch_size: int, replay: Optional[List[Dict]] = None):
+        self.socket_path = socket_path
+        self.rate = rate
+        self.batch_size = batch_size
+        self.replay = replay
+        self.clients: List[asyncio.StreamWriter] = []
+        self.sent = 0
+        self._codes = [code for code in COUNTRIES.values() if code]
+        self._position = 0
+
+    def _events(self, now_ms: int) -> List[ThreatEvent]:
+        if self.replay:
+            records = [self.replay[(self._position + i) % len(self.replay)] for i in range(self.batch_size)]
+            self._position += self.batch_size
+            events = [ThreatEvent.from_public(record) for record in records]
+        else:
+            # Counts stay under the priority threshold so events take the paced path
+            events = [ThreatEvent.from_raw(now_ms, random.choice(self._codes), random.choice(self._codes),
+                                           random.choice(ATTACK_TYPES), count=random.randint(1, 50))
+                      for _ in range(self.batch_size)]
+        for event in events:
+            event.timestamp_ms = now_ms
+        return events
+
+    async def _accept(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.clients.append(writer)
+
+    async def run(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self._accept, path=self.socket_path)
+        interval = self.batch_size / self.rate
+        next_send = time.monotonic()
+        try:
+            while True:
+                next_send += interval
+                await asyncio.sleep(max(0.0, next_send - time.monotonic()))
+                frame = encode_frame("threats", self._events(int(time.time() * 1000)))
+                for writer in list(self.clients):
+                    if writer.is_closing():
+                        self.clients.remove(writer)
+                        continue
+                    writer.write(frame)
+                self.sent += self.batch_size
+        finally:
+            server.close()
+
+
+class ClientStats:
+    def __init__(self):
+        self.reset()
+        self.failures = 0
+        self.disconnects = 0
+
+    def reset(self):
+        self.latencies: List[float] = []
+        self.frames = 0
+        self.events = 0
+
+
+async def sse_client(session: aiohttp.ClientSession, url: str, stats: ClientStats, measure: bool,
+                     connected: asyncio.Event):
+    """One /threats subscriber; ``measure`` parses frames for latency, the rest only count them."""
+    try:
+        async with session.get(f"{url}/threats", timeout=aiohttp.ClientTimeout(total=None, sock_read=30)) as response:
+            response.raise_for_status()
+            connected.set()
+            async for line in response.content:
+                if not line.startswith(b"data: "):
+                    continue
+                stats.frames += 1
+                if measure:
+                    received_ms = time.time() * 1000
+                    events = json.loads(line[6:])
+                    stats.events += len(events)
+                    stats.latencies.extend(received_ms - parse_timestamp(event["Timestamp"]) for event in events)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError) as e:
+        if connected.is_set():
+            stats.disconnects += 1
+        else:
+            stats.failures += 1
+            logger.debug(f"SSE client failed: {e}")
+    finally:
+        connected.set()
+
+
+async def ws_client(session: aiohttp.ClientSession, url: str, stats: ClientStats, measure: bool,
+                    connected: asyncio.Event):
+    """One /ws subscriber to the threats topic (json encoding)."""
+    try:
+        async with session.ws_connect(f"{url}/ws?encoding=json", heartbeat=30) as ws:
+            await ws.send_str(json.dumps({"op": "subscribe", "topic": "threats"}))
+            connected.set()
+            async for message in ws:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    break
+                stats.frames += 1
+                if measure:
+                    received_ms = time.time() * 1000
+                    frame = json.loads(message.data)
+                    if frame.get("topic") == "threats":
+                        events = frame.get("data") or []
+                        stats.events += len(events)
+                        stats.latencies.extend(received_ms - parse_timestamp(event["Timestamp"]) for event in events)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError) as e:
+        if connected.is_set():
+            stats.disconnects += 1
+        else:
+            stats.failures += 1
+            logger.debug(f"WebSocket client failed: {e}")
+    finally:
+        connected.set()
+
+
+def process_usage(pid: int) -> Dict[str, float]:
+    """Resident memory (bytes) and CPU seconds of a process, from /proc."""
+    with open(f"/proc/{pid}/status") as f:
+        rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    return {"rss": rss, "cpu": cpu}
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def server_pid(port: int) -> Optional[int]:
+    """Pid of the process listening on ``port`` (for ``--url`` runs), found through /proc/net/tcp."""
+    inodes = set()
+    for table in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(table) as f:
+                for line in f.readlines()[1:]:
+                    fields = line.split()
+                    if fields[3] == "0A" and int(fields[1].rsplit(":", 1)[1], 16) == port:
+                        inodes.add(fields[9])
+        except OSError:
+            continue
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            for fd in os.listdir(f"/proc/{pid}/fd"):
+                target = os.readlink(f"/proc/{pid}/fd/{fd}")
+                if target.startswith("socket:[") and target[8:-1] in inodes:
+                    return int(pid)
+        except OSError:
+            continue
+    return None
+
+
+async def wait_for_server(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{url}/dictionary") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Server at {url} did not come up within {timeout:.0f}s")
+            await asyncio.sleep(0.2)
+
+
+async def run(args) -> List[Dict]:
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    steps = [int(step) for step in args.steps.split(",")]
+    if max(steps) * 2 + 64 > hard:
+        logger.warning(f"Open file limit {hard} may be too low for {max(steps)} clients")
+
+    replay = load_replay(args.replay) if args.replay else None
+    collector = SyntheticCollector(args.socket, args.rate, args.batch_size, replay)
+    collector_task = asyncio.create_task(collector.run())
+    await asyncio.sleep(0.1)
+
+    server = None
+    url = args.url
+    if url is None:
+        url = f"http://127.0.0.1:{args.port}"
+        env = {**os.environ, "LCTM_COLLECTOR_SOCKET": args.socket, "LCTM_LATENCY_BUDGET": "0"}
+        server = subprocess.Popen([sys.executable, "-c", SERVE, "127.0.0.1", str(args.port)],
+                                  cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                                  stdout=subprocess.DEVNULL, stderr=open(args.server_log, "w"))
+        pid = server.pid
+    else:
+        pid = server_pid(int(url.rsplit(":", 1)[1].split("/")[0])) if not args.pid else args.pid
+        logger.info(f"Targeting {url} (pid {pid}); it should subscribe to {args.socket} with LCTM_LATENCY_BUDGET=0")
+
+    results = []
+    clients: List[asyncio.Task] = []
+    stats = ClientStats()
+    own_start = time.process_time()
+    try:
+        await wait_for_server(url)
+        await asyncio.sleep(args.settle)
+        baseline = process_usage(pid) if pid else None
+        connector = aiohttp.TCPConnector(limit=0, force_close=False)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            for target in steps:
+                while len(clients) < target:
+                    chunk = []
+                    for _ in range(min(CONNECT_CHUNK, target - len(clients))):
+                        index = len(clients)
+                        websocket = args.protocol == "ws" or (args.protocol == "mixed" and index % 2)
+                        measure = index < args.measure_clients
+                        connected = asyncio.Event()
+                        client = ws_client if websocket else sse_client
+                        clients.append(asyncio.create_task(client(session, url, stats, measure, connected)))
+                        chunk.append(connected.wait())
+                    await asyncio.gather(*chunk)
+                await asyncio.sleep(args.settle)
+
+                stats.reset()
+                sent_before = collector.sent
+                server_before = process_usage(pid) if pid else None
+                own_before = time.process_time()
+                started = time.monotonic()
+                await asyncio.sleep(args.duration)
+                elapsed = time.monotonic() - started
+                own_cpu = (time.process_time() - own_before) / elapsed
+                server_after = process_usage(pid) if pid else None
+
+                measuring = min(target, args.measure_clients)
+                sent = collector.sent - sent_before
+                events_per_client = stats.events / max(1, measuring)
+                delivered = events_per_client * target
+                row = {
+                    "clients": target,
+                    "failures": stats.failures,
+                    "disconnects": stats.disconnects,
+                    "events_sent": sent,
+                    "delivery_ratio": round(events_per_client / sent, 3) if sent else None,
+                    "latency_ms": {name: None if value is None else round(value, 1) for name, value in (
+                        ("p50", percentile(stats.latencies, 0.5)), ("p90", percentile(stats.latencies, 0.9)),
+                        ("p99", percentile(stats.latencies, 0.99)),
+                        ("max", max(stats.latencies) if stats.latencies else None))},
+                    "harness_cpu": round(own_cpu, 2),
+                }
+                if server_before and baseline:
+                    cpu = server_after["cpu"] - server_before["cpu"]
+                    row.update({
+                        "server_rss_mb": round(server_after["rss"] / 2 ** 20, 1),
+                        "kb_per_connection": round((server_after["rss"] - baseline["rss"]) / 1024 / target, 1),
+                        "server_cpu": round(cpu / elapsed, 2),
+                        "cpu_us_per_event": round(cpu / delivered * 1e6, 2) if delivered else None,
+                    })
+                results.append(row)
+                print(format_row(row), flush=True)
+                if own_cpu > 0.9:
+                    logger.warning("Harness CPU is saturated; latencies above may reflect the client, not the server")
+
+                p99 = row["latency_ms"]["p99"]
+                broken = (p99 is None or p99 > args.max_p99 or stats.failures > target * 0.01
+                          or (row["delivery_ratio"] or 0) < 0.95)
+                if broken:
+                    print(f"Latency broke down at {target} clients "
+                          f"(p99 {p99} ms, {stats.failures} failed, delivery ratio {row['delivery_ratio']})")
+                    break
+            else:
+                print(f"No breakdown up to {steps[-1]} clients")
+            for client in clients:
+                client.cancel()
+            await asyncio.gather(*clients, return_exceptions=True)
+    finally:
+        collector_task.cancel()
+        await asyncio.gather(collector_task, return_exceptions=True)
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+        logger.info(f"Harness used {time.process_time() - own_start:.1f}s CPU")
+    return results
+
+
+def format_row(row: Dict) -> str:
+    latency = row["latency_ms"]
+    text = (f"{row['clients']:>6} clients  p50 {latency['p50']} ms  p90 {latency['p90']} ms  p99 {latency['p99']} ms  "
+            f"delivered {row['delivery_ratio']}  failed {row['failures']}  harness cpu {row['harness_cpu']}")
+    if "server_rss_mb" in row:
+        text += (f"  server rss {row['server_rss_mb']} MB ({row['kb_per_connection']} KB/conn)  "
+                 f"server cpu {row['server_cpu']}  {row['cpu_us_per_event']} us/event")
+    return text
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test /threats with many concurrent SSE/WebSocket clients")
+    parser.add_argument("--steps", default="100,250,500,1000,2000,4000", help="Client counts to ramp through")
+    parser.add_argument("--protocol", choices=("sse", "ws", "mixed"), default="sse")
+    parser.add_argument("--rate", type=float, default=100.0, help="Threat events published per second")
+    parser.add_argument("--batch-size", type=int, default=10, help="Events per published batch")
+    parser.add_argument("--replay", help="Replay records from a JSON/NDJSON file or warm-start checkpoint")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds measured per step")
+    parser.add_argument("--settle", type=float, default=3.0, help="Seconds to wait after connecting a step")
+    parser.add_argument("--measure-clients", type=int, default=50,
+                        help="Clients (the first connected) that parse frames for latency")
+    parser.add_argument("--max-p99", type=float, default=1000.0, help="p99 latency (ms) counted as breakdown")
+    parser.add_argument("--url", help="Target a running server instead of starting one")
+    parser.add_argument("--pid", type=int, help="Server pid for --url runs (found by port otherwise)")
+    parser.add_argument("--port", type=int, default=5055, help="Port of the server started by the harness")
+    parser.add_argument("--socket", default=os.path.join(tempfile.gettempdir(), "lctm-loadtest.sock"))
+    parser.add_argument("--server-log", default=os.path.join(tempfile.gettempdir(), "lctm-loadtest-server.log"))
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    try:
+        results = asyncio.run(run(args))
+    except KeyboardInterrupt:
+        sys.exit(130)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,243 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from country_data import DATA_DIR, ensure_parent
+from threat_event import canonical_label, parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Shared by the process that collects news and every worker serving /news
+NEWS_DB_PATH = os.getenv("LCTM_NEWS_DB", os.path.join(DATA_DIR, "news.sqlite3"))
+# Articles older than this many days, or beyond the newest NEWS_MAX_ARTICLES, are pruned
+NEWS_RETENTION_DAYS = float(os.getenv("LCTM_NEWS_RETENTION_DAYS", "180"))
+NEWS_MAX_ARTICLES = int(os.getenv("LCTM_NEWS_MAX_ARTICLES", "50000"))
+# Number of articles /news returns
+NEWS_LIMIT = int(os.getenv("LCTM_NEWS_LIMIT", "100"))
+
+# Query parameters that only track the click, not the article
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid", "ref", "cmpid")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    url_key TEXT NOT NULL UNIQUE,
+    content_hash TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    link TEXT NOT NULL,
+    source TEXT,
+    published TEXT,
+    timestamp_ms INTEGER NOT NULL,
+    first_seen_ms INTEGER NOT NULL,
+    summary TEXT NOT NULL DEFAULT '',
+    primary_keywords TEXT NOT NULL DEFAULT '',
+    secondary_keywords TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS articles_timestamp ON articles (timestamp_ms DESC);
+"""
+
+# Full-text index over the articles table; triggers keep it in step with inserts and prunes
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+    title, summary, primary_keywords, secondary_keywords, content='articles', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS articles_fts_insert AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts (rowid, title, summary, primary_keywords, secondary_keywords)
+    VALUES (new.id, new.title, new.summary, new.primary_keywords, new.secondary_keywords);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_fts_delete AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_fts (articles_fts, rowid, title, summary, primary_keywords, secondary_keywords)
+    VALUES ('delete', old.id, old.title, old.summary, old.primary_keywords, old.secondary_keywords);
+END;
+"""
+# Column weights for ranking: title matches count most, then keywords, then the summary
+BM25_WEIGHTS = (5.0, 1.0, 2.0, 2.0)
+
+
+def normalize_url(url: str) -> str:
+    """Identity key for an article link: lower-cased scheme and host, no fragment,
+    tracking parameters or trailing slash, and sorted query parameters."""
+    parts = urlsplit(url.strip())
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if not key.lower().startswith(TRACKING_PARAMS))
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return urlunsplit(("https" if parts.scheme in ("http", "https") else parts.scheme.lower(),
+                       host, parts.path.rstrip("/") or "/", urlencode(query), ""))
+
+
+def content_hash(title: str, summary: Optional[str] = None, published: Optional[str] = None) -> str:
+    """Hash of the normalized title and summary, catching the same story syndicated under different links.
+
+    Recurring titles (weekly recaps and the like) differ in their summaries;
+    without a summary the publication day tells them apart instead.
+    """
+    body = canonical_label(_plain_text(summary))
+    if not body:
+        body = time.strftime("%Y-%m-%d", time.gmtime(published_ms(published) / 1000))
+    return hashlib.sha1(f"{canonical_label(title)}\n{body}".encode("utf-8")).hexdigest()
+
+
+def published_ms(published: Optional[str]) -> int:
+    """Parse an RSS (RFC 822) or ISO 8601 date to epoch milliseconds; now if unparseable."""
+    if published:
+        try:
+            return int(parsedate_to_datetime(published).timestamp() * 1000)
+        except (TypeError, ValueError, IndexError):
+            pass
+    return parse_timestamp(published)
+
+
+def parse_since(value: str) -> int:
+    """Parse a ``since`` bound: a relative age (``90m``, ``24h``, ``30d``), epoch seconds
+    or milliseconds, or an ISO 8601 date. Raises ValueError otherwise."""
+    value = value.strip()
+    relative = re.fullmatch(r"(\d+(?:\.\d+)?)([mhdw])", value)
+    if relative:
+        seconds = float(relative.group(1)) * {"m": 60, "h": 3600, "d": 86400, "w": 604800}[relative.group(2)]
+        return int((time.time() - seconds) * 1000)
+    try:
+        return parse_timestamp(float(value))
+    except ValueError:
+        pass
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+def fts_phrase(text: str) -> str:
+    """Quote text as an FTS5 phrase, so user input is never parsed as query syntax."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _plain_text(html: str) -> str:
+    return " ".join(re.sub(r"<[^>]+>", " ", html or "").split())
+
+
+class NewsStore:
+    """Embedded SQLite store of collected articles, deduplicated across feeds.
+
+    An article is new only if neither its normalized URL nor the hash of its
+    title and summary has been stored before, so repeated polls and cross-posted stories insert
+    nothing. Inserts are incremental, and each one prunes articles beyond the
+    retention limits. Titles, summaries and matched keywords are indexed with
+    FTS5 for ``search``. The database runs in WAL mode so the collecting process
+    can write while web workers read; each thread uses its own connection.
+    """
+    def __init__(self, path: str = NEWS_DB_PATH, retention_days: float = NEWS_RETENTION_DAYS,
+                 max_articles: int = NEWS_MAX_ARTICLES):
+        self.path = path
+        self.retention_ms = int(retention_days * 86400 * 1000)
+        self.max_articles = max_articles
+        self._local = threading.local()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            ensure_parent(self.path)
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                connection.executescript(SCHEMA)
+                self._migrate(connection)
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _migrate(db: sqlite3.Connection) -> None:
+        """Add the search columns and index to a store created before they existed."""
+        columns = {row["name"] for row in db.execute("PRAGMA table_info(articles)")}
+        for column in ("summary", "primary_keywords", "secondary_keywords"):
+            if column not in columns:
+                db.execute(f"ALTER TABLE articles ADD COLUMN {column} TEXT NOT NULL DEFAULT ''")
+        indexed = db.execute("SELECT 1 FROM sqlite_master WHERE name = 'articles_fts'").fetchone()
+        db.executescript(FTS_SCHEMA)
+        if not indexed:
+            db.execute("INSERT INTO articles_fts (articles_fts) VALUES ('rebuild')")
+
+    def add(self, articles: List[Dict]) -> List[Dict]:
+        """Insert the articles not stored yet and return them."""
+        now_ms = int(time.time() * 1000)
+        added = []
+        with self.db as db:
+            for article in articles:
+                keywords = article.get("keywords") or {}
+                cursor = db.execute(
+                    "INSERT OR IGNORE INTO articles (url_key, content_hash, title, link, source, published, "
+                    "timestamp_ms, first_seen_ms, summary, primary_keywords, secondary_keywords) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (normalize_url(article["link"]), content_hash(article["title"], article.get("summary"), article.get("timestamp")), article["title"],
+                     article["link"], article.get("source"), article.get("timestamp"),
+                     published_ms(article.get("timestamp")), now_ms, _plain_text(article.get("summary")),
+                     ", ".join(keywords.get("primary", ())), ", ".join(keywords.get("secondary", ())))
+                )
+                if cursor.rowcount:
+                    added.append(article)
+            if added:
+                self._prune(db, now_ms)
+        if added:
+            logger.info(f"News store: Added {len(added)} of {len(articles)} articles")
+        return added
+
+    def _prune(self, db: sqlite3.Connection, now_ms: int) -> None:
+        db.execute("DELETE FROM articles WHERE timestamp_ms < ?", (now_ms - self.retention_ms,))
+        db.execute("DELETE FROM articles WHERE id NOT IN "
+                   "(SELECT id FROM articles ORDER BY timestamp_ms DESC LIMIT ?)", (self.max_articles,))
+
+    def latest(self, limit: int = NEWS_LIMIT) -> List[Dict]:
+        """The newest articles in the public /news shape."""
+        rows = self.db.execute(
+            "SELECT title, link, published FROM articles ORDER BY timestamp_ms DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [{"title": row["title"], "link": row["link"], "timestamp": row["published"]} for row in rows]
+
+    def search(self, query: str = "", since_ms: Optional[int] = None, keyword: Optional[str] = None,
+               limit: int = NEWS_LIMIT) -> List[Dict]:
+        """Articles matching every word of ``query``, best match first.
+
+        ``keyword`` restricts results to articles whose matched primary or
+        secondary keywords include it, and ``since_ms`` to articles published
+        since then. Without a query, results are newest first.
+        """
+        terms = [fts_phrase(word) for word in query.split()]
+        if keyword:
+            terms.append("{primary_keywords secondary_keywords} : " + fts_phrase(keyword))
+        conditions, params = [], []
+        if terms:
+            conditions.append("articles_fts MATCH ?")
+            params.append(" AND ".join(terms))
+        if since_ms is not None:
+            conditions.append("a.timestamp_ms >= ?")
+            params.append(since_ms)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = f"bm25(articles_fts, {', '.join(map(str, BM25_WEIGHTS))})" if query.split() else "a.timestamp_ms DESC"
+        source = "articles_fts JOIN articles a ON a.id = articles_fts.rowid" if terms else "articles a"
+        rows = self.db.execute(
+            f"SELECT a.title, a.link, a.published, a.source, a.primary_keywords, a.secondary_keywords "
+            f"FROM {source} {where} ORDER BY {order} LIMIT ?", (*params, limit)
+        ).fetchall()
+        return [{
+            "title": row["title"],
+            "link": row["link"],
+            "timestamp": row["published"],
+            "source": row["source"],
+            "keywords": {
+                "primary": [kw for kw in row["primary_keywords"].split(", ") if kw],
+                "secondary": [kw for kw in row["secondary_keywords"].split(", ") if kw],
+            },
+        } for row in rows]
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
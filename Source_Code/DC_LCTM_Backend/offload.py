@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Where CPU-heavy parsing runs: "thread", "process" (pure functions only; the rest still uses
+# threads) or "inline" to keep everything on the event loop
+OFFLOAD_EXECUTOR = os.getenv("LCTM_OFFLOAD_EXECUTOR", "thread").lower()
+OFFLOAD_WORKERS = int(os.getenv("LCTM_OFFLOAD_WORKERS", "4"))
+# The loop is sampled every LOOP_LAG_INTERVAL seconds; delays beyond the threshold are logged
+LOOP_LAG_INTERVAL = 0.1
+LOOP_LAG_THRESHOLD = float(os.getenv("LCTM_LOOP_LAG_THRESHOLD", "0.1"))
+# Seconds between loop lag summaries in the log
+LOOP_REPORT_INTERVAL = 60.0
+
+
+class StageTiming:
+    __slots__ = ("calls", "loop_seconds", "offloaded_seconds", "max_loop_ms", "blocked")
+
+    def __init__(self):
+        self.calls = 0
+        self.loop_seconds = 0.0  # Time spent running on the event loop
+        self.offloaded_seconds = 0.0  # Time spent in a pool while the loop kept running
+        self.max_loop_ms = 0.0
+        self.blocked = 0  # On-loop runs longer than LOOP_LAG_THRESHOLD
+
+    def public(self) -> Dict:
+        return {"calls": self.calls, "loop_seconds": round(self.loop_seconds, 3),
+                "offloaded_seconds": round(self.offloaded_seconds, 3),
+                "max_loop_ms": round(self.max_loop_ms, 1), "blocked": self.blocked}
+
+
+class LoopMonitor:
+    """Measures event loop scheduling delay and times the stages that do CPU work.
+
+    ``run`` wakes every ``interval`` seconds and records how late it was
+    woken, which is how long everything else (SSE fan-out included) was
+    kept waiting. Stages report their work through ``offload``, which runs
+    it in a pool, or ``on_loop``, which times synchronous work left on the
+    loop and flags any run that held it past ``threshold``. Lag spikes are
+    logged with the stages that ran on the loop since the previous sample.
+    """
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold: float = LOOP_LAG_THRESHOLD,
+                 executor: str = OFFLOAD_EXECUTOR, workers: int = OFFLOAD_WORKERS):
+        self.interval = interval
+        self.threshold = threshold
+        self.executor = executor
+        self.workers = workers
+        self.lags: Deque[float] = deque(maxlen=int(LOOP_REPORT_INTERVAL / interval))
+        self.max_lag = 0.0
+        self.stages: Dict[str, StageTiming] = {}
+        self._recent: Dict[str, float] = {}  # On-loop seconds per stage since the last sample
+        self._threads: Optional[Executor] = None
+        self._processes: Optional[Executor] = None
+        self._running = False
+
+    def _pool(self, pure: bool) -> Optional[Executor]:
+        if self.executor == "inline":
+            return None
+        if pure and self.executor == "process":
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(max_workers=self.workers)
+            return self._processes
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="lctm-offload")
+        return self._threads
+
+    def _timing(self, stage: str) -> StageTiming:
+        timing = self.stages.get(stage)
+        if timing is None:
+            timing = self.stages[stage] = StageTiming()
+        return timing
+
+    @contextmanager
+    def on_loop(self, stage: str):
+        """Time synchronous work that stays on the event loop."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            timing = self._timing(stage)
+            timing.calls += 1
+            timing.loop_seconds += elapsed
+            timing.max_loop_ms = max(timing.max_loop_ms, elapsed * 1000)
+            self._recent[stage] = self._recent.get(stage, 0.0) + elapsed
+            if elapsed > self.threshold:
+                timing.blocked += 1
+                logger.warning(f"Loop monitor: {stage} blocked the event loop for {elapsed * 1000:.0f}ms")
+
+    async def offload(self, stage: str, func: Callable, *args, pure: bool = False):
+        """Run ``func(*args)`` in the pool and await its result, keeping the loop free meanwhile.
+
+        Hand over a whole response or batch per call; per-item calls cost more
+        in hand-off than they save. ``pure`` marks a module-level function
+        that touches no process state (it may then run in a process pool);
+        anything using shared objects such as the id tables or the GeoIP
+        reader runs in a thread.
+        """
+        pool = self._pool(pure)
+        if pool is None:
+            with self.on_loop(stage):
+                return func(*args)
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+        finally:
+            timing = self._timing(stage)
+            timing.calls += 1
+            timing.offloaded_seconds += time.perf_counter() - started
+
+    def stats(self) -> Dict:
+        lags = sorted(self.lags)
+
+        def percentile(fraction: float) -> float:
+            return round(lags[min(len(lags) - 1, int(len(lags) * fraction))] * 1000, 1) if lags else 0.0
+
+        return {
+            "executor": self.executor,
+            "lag_ms": {"p50": percentile(0.5), "p99": percentile(0.99), "max": round(self.max_lag * 1000, 1),
+                       "samples": len(lags)},
+            "stages": {name: timing.public() for name, timing in sorted(self.stages.items())},
+        }
+
+    async def run(self) -> None:
+        """Sample loop lag until cancelled; a second call on a running monitor returns at once."""
+        if self._running:
+            return
+        self._running = True
+        last_report = time.monotonic()
+        try:
+            while True:
+                expected = time.monotonic() + self.interval
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                lag = max(0.0, now - expected)
+                self.lags.append(lag)
+                self.max_lag = max(self.max_lag, lag)
+                if lag > self.threshold:
+                    culprits = ", ".join(f"{stage} {seconds * 1000:.0f}ms" for stage, seconds in
+                                         sorted(self._recent.items(), key=lambda item: -item[1])[:3])
+                    logger.warning(f"Loop monitor: Event loop lagged {lag * 1000:.0f}ms"
+                                   + (f" (on loop: {culprits})" if culprits else ""))
+                self._recent.clear()
+                if now - last_report >= LOOP_REPORT_INTERVAL:
+                    last_report = now
+                    lag_ms = self.stats()["lag_ms"]
+                    logger.info(f"Loop monitor: Lag p50 {lag_ms['p50']}ms, p99 {lag_ms['p99']}ms, "
+                                f"max {lag_ms['max']}ms")
+        finally:
+            self._running = False
+
+
+# Shared by every collector and route of this process
+loop_monitor = LoopMonitor()
+
+
+async def offload(stage: str, func: Callable, *args, pure: bool = False):
+    """``loop_monitor.offload``: run CPU-heavy ``func(*args)`` off the event loop."""
+    return await loop_monitor.offload(stage, func, *args, pure=pure)
@@ -0,0 +1,195 @@
+import asyncio
+import inspect
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from offload import loop_monitor, offload
+
+logger = logging.getLogger(__name__)
+
+# Default capacity of each queue between pipeline stages (items are whole batches)
+PIPELINE_QUEUE_SIZE = int(os.getenv("LCTM_PIPELINE_QUEUE_SIZE", "64"))
+# Seconds between pipeline statistics log lines while anything is being dropped
+STATS_INTERVAL = 60.0
+
+POLICIES = ("drop-oldest", "coalesce", "sample")
+
+
+class BoundedQueue:
+    """Queue with a fixed capacity that never blocks the producer.
+
+    When full, ``put`` applies the overflow policy and counts what it cost:
+    ``drop-oldest`` discards the oldest item; ``coalesce`` merges the two
+    oldest items with ``merge`` (so nothing is lost outright, only folded
+    together); ``sample`` keeps the new item with probability
+    capacity / (capacity + items offered since the queue filled up), in place
+    of a random queued item, so the queue holds a uniform sample of the burst.
+    """
+    def __init__(self, name: str, maxsize: int = PIPELINE_QUEUE_SIZE, policy: str = "drop-oldest",
+                 merge: Optional[Callable[[object, object], object]] = None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy!r}")
+        if policy == "coalesce" and (merge is None or maxsize < 2):
+            raise ValueError("coalesce needs a merge function and room for two items")
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        self.merge = merge
+        self.items: Deque = deque()
+        self.offered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self._overflow = 0
+        self._ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def put(self, item) -> None:
+        self.offered += 1
+        if len(self.items) < self.maxsize:
+            self._overflow = 0
+            self.items.append(item)
+        elif self.policy == "drop-oldest":
+            self.items.popleft()
+            self.items.append(item)
+            self.dropped += 1
+        elif self.policy == "coalesce":
+            oldest = self.items.popleft()
+            self.items[0] = self.merge(oldest, self.items[0])
+            self.items.append(item)
+            self.coalesced += 1
+        else:
+            self._overflow += 1
+            if random.random() < self.maxsize / (self.maxsize + self._overflow):
+                self.items[random.randrange(len(self.items))] = item
+            self.dropped += 1
+        self._ready.set()
+
+    def extend(self, items) -> None:
+        for item in items:
+            self.put(item)
+
+    def popleft(self):
+        """Take the oldest item without waiting; raises IndexError when empty."""
+        return self.items.popleft()
+
+    def drain(self) -> List:
+        items = list(self.items)
+        self.items.clear()
+        return items
+
+    async def get(self):
+        while not self.items:
+            self._ready.clear()
+            await self._ready.wait()
+        return self.items.popleft()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self.items), "offered": self.offered, "dropped": self.dropped, "coalesced": self.coalesced}
+
+
+class Stage:
+    """Workers that move items from ``inbox`` through ``func`` into ``outbox``.
+
+    ``func`` may be a plain function or a coroutine function; a result of
+    None or an empty list is not forwarded. A plain function runs on the event
+    loop, so extra workers only add parallelism when it is a coroutine
+    function or ``offload`` is set, which runs each call in the offload pool
+    (``func`` must then be safe to call from several threads at once). With a
+    ``window`` (seconds), the single worker waits that long after the first
+    item and hands ``func`` the list of every item that arrived meanwhile.
+    """
+    def __init__(self, name: str, func: Callable[[object], object], inbox: BoundedQueue,
+                 outbox: Optional[BoundedQueue] = None, concurrency: int = 1, window: float = 0.0,
+                 offload: bool = False):
+        if concurrency > 1 and window:
+            raise ValueError(f"Stage {name}: a windowed stage runs a single worker")
+        if concurrency > 1 and not offload and not inspect.iscoroutinefunction(func):
+            raise ValueError(f"Stage {name}: a synchronous function needs offload to run more than one worker")
+        self.name = name
+        self.func = func
+        self.inbox = inbox
+        self.outbox = outbox
+        self.concurrency = concurrency
+        self.window = window
+        self.offload = offload
+        self.processed = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+
+    async def _worker(self) -> None:
+        while True:
+            item = await self.inbox.get()
+            if self.window:
+                await asyncio.sleep(self.window)
+                item = [item] + self.inbox.drain()
+            started = time.perf_counter()
+            try:
+                if self.offload:
+                    result = await offload(f"pipeline {self.name}", self.func, item)
+                else:
+                    # Synchronous stages run on the event loop; the loop monitor flags slow ones
+                    with loop_monitor.on_loop(f"pipeline {self.name}"):
+                        result = self.func(item)
+                if inspect.isawaitable(result):
+                    result = await result
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Pipeline: Stage {self.name} failed: {e}")
+                continue
+            finally:
+                self.busy_seconds += time.perf_counter() - started
+            self.processed += 1
+            if self.outbox is not None and result:
+                self.outbox.put(result)
+
+    async def run(self) -> None:
+        await asyncio.gather(*(self._worker() for _ in range(self.concurrency)))
+
+    def stats(self) -> Dict[str, float]:
+        return {"processed": self.processed, "errors": self.errors, "busy_seconds": round(self.busy_seconds, 3),
+                "concurrency": self.concurrency}
+
+
+class Pipeline:
+    """Source coroutines feeding a chain of stages through bounded queues."""
+    def __init__(self, name: str):
+        self.name = name
+        self.sources: List[Awaitable] = []
+        self.stages: List[Stage] = []
+        self.queues: List[BoundedQueue] = []
+
+    def add_source(self, source: Awaitable) -> None:
+        self.sources.append(source)
+
+    def add_stage(self, stage: Stage) -> Stage:
+        self.stages.append(stage)
+        for queue in (stage.inbox, stage.outbox):
+            if queue is not None and queue not in self.queues:
+                self.queues.append(queue)
+        return stage
+
+    def stats(self) -> Dict[str, Dict]:
+        return {
+            "queues": {queue.name: queue.stats() for queue in self.queues},
+            "stages": {stage.name: stage.stats() for stage in self.stages},
+        }
+
+    async def _report(self) -> None:
+        """Log queue statistics whenever a queue dropped or coalesced items since the last report."""
+        losses = {}
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            current = {queue.name: (queue.dropped, queue.coalesced) for queue in self.queues}
+            if current != losses and any(dropped or coalesced for dropped, coalesced in current.values()):
+                logger.warning(f"Pipeline {self.name}: Shedding load: "
+                               + ", ".join(f"{queue.name} {queue.stats()}" for queue in self.queues))
+            losses = current
+
+    async def run(self) -> None:
+        await asyncio.gather(*self.sources, *(stage.run() for stage in self.stages), self._report())
@@ -1,11 +1,37 @@
-from flask import Flask, Response, jsonify, render_template
+import time
+PROCESS_START = time.perf_counter()  # Taken before the heavier imports below
+
+from flask import Flask, Response, jsonify, render_template, request
 from flask_cors import CORS
+from flask_sock import Sock
 import asyncio
-import json
-from typing import AsyncGenerator, List, Dict
-from cyber_threat_intel import ThreatIntelligenceAggregator, logger
 import math
-from collections import deque
+import os
+import queue
+import threading
+import zlib
+from ipaddress import ip_address
+from blocklist import BLOCKLIST_FORMATS, DEFAULT_SET_NAME, BlocklistCache
+from cyber_threat_intel import ThreatIntelligenceAggregator, logger
+from collector_service import CollectorSubscriber
+from stream_hub import ThreatStreamHub, ThreatFilter
+from geo_clusters import ClusterCache
+from ip_reputation import ReputationCache
+from ip_snapshot import IPSnapshotReader
+from news_store import NewsStore, parse_since
+from offload import loop_monitor
+from threat_event import dictionary
+from threat_matrix import CountryMatrix, parse_window
+from ws_session import MultiplexSession
+
+# Cold start (module import to first response sent) should stay within this many seconds
+STARTUP_BUDGET = float(os.getenv("LCTM_STARTUP_BUDGET", "1.0"))
+# When set, subscribe to a collector service on this socket instead of scraping in-process
+COLLECTOR_SOCKET = os.getenv("LCTM_COLLECTOR_SOCKET")
+# How long a route waits for the first news / IP snapshot after startup
+SNAPSHOT_WAIT = float(os.getenv("LCTM_SNAPSHOT_WAIT", "30"))
+# Reconnect delay suggested to EventSource clients
+RECONNECT_DELAY_MS = 3000
 
 app = Flask(__name__)
 # Enable CORS for all routes
@@ -16,21 +42,64 @@ CORS(app, resources={
         "allow_headers": ["Content-Type", "Authorization"]
     }
 })
+sock = Sock(app)
 
-# Initialize the aggregator
+# Background event loop shared by every request thread of this process
 aggregator = None
 loop = None
+hub = ThreatStreamHub()
+ip_snapshots = IPSnapshotReader()
+news_store = NewsStore()
+reputation_cache = ReputationCache()
+ip_clusters = ClusterCache()
+blocklists = BlocklistCache()
+threat_matrix = CountryMatrix()
+first_request_seconds = None
+_start_lock = threading.Lock()
 
 async def initialize_aggregator():
-    global aggregator, loop
-    loop = asyncio.get_event_loop()
-    aggregator = ThreatIntelligenceAggregator()
-    # Set interval for MaliciousIPCollector to ensure periodic fetching
-    aggregator.ip_collector.interval = 60.0  # Fetch IPs every 60 seconds
-    await aggregator.threat_collector.initialize()
-    await aggregator.news_collector.initialize()
-    await aggregator.ip_collector.initialize()
-    logger.info("Aggregator initialized for threat, news, and malicious IP collectors")
+    """Feed the hub, from the collector service or from in-process collectors."""
+    global aggregator
+    if COLLECTOR_SOCKET:
+        logger.info(f"Subscribing to collector service at {COLLECTOR_SOCKET}")
+        feed = CollectorSubscriber(hub.publish, COLLECTOR_SOCKET).run()
+    else:
+        aggregator = ThreatIntelligenceAggregator()
+        logger.info("Running collectors in-process; collectors initialize on first use")
+        feed = aggregator.start_collectors(publish=hub.publish)
+    await asyncio.gather(hub.run(), feed, loop_monitor.run())
+
+def precompute_ip_clusters(_metadata):
+    """Cluster each new IP snapshot off the event loop, before any tile request needs it."""
+    snapshot = ip_snapshots.current()
+    if snapshot is not None:
+        threading.Thread(target=ip_clusters.get, args=(snapshot,), name="lctm-clusters", daemon=True).start()
+
+hub.add_listener("ips", precompute_ip_clusters)
+# Every threat batch reaching this process is counted as it arrives, before pacing
+hub.add_listener("threats", threat_matrix.add)
+
+def ensure_started():
+    """Start the background loop on first use (gunicorn workers never run __main__)."""
+    global loop
+    with _start_lock:
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="lctm-loop", daemon=True).start()
+            asyncio.run_coroutine_threadsafe(initialize_aggregator(), loop)
+    return hub
+
+@app.after_request
+def record_first_request(response):
+    """Log the cold-start time once, warning when it exceeds STARTUP_BUDGET."""
+    global first_request_seconds
+    if first_request_seconds is None:
+        first_request_seconds = time.perf_counter() - PROCESS_START
+        if first_request_seconds > STARTUP_BUDGET:
+            logger.warning(f"Cold start took {first_request_seconds:.3f}s, over the {STARTUP_BUDGET:.3f}s budget")
+        else:
+            logger.info(f"Cold start took {first_request_seconds:.3f}s (budget {STARTUP_BUDGET:.3f}s)")
+    return response
 
 @app.route('/')
 def index():
@@ -38,69 +107,57 @@ def index():
     logger.info("Accessed root endpoint (/)")
     return render_template('index.html')
 
-async def stream_threat_data() -> AsyncGenerator[str, None]:
-    """Stream threat data as SSE, sending batches every second."""
-    logger.info("Starting SSE stream for /threats endpoint")
-    threat_queue = deque()
-    
-    async def collect_threat():
-        async for data in aggregator.threat_collector.stream_data():
-            threat_queue.extend(data)
-            logger.debug(f"Collected {len(data)} threat data items into queue")
-    
-    # Start collecting threat data in the background
-    asyncio.create_task(collect_threat())
-    
-    while True:
-        if threat_queue:
-            # Calculate batch size: total items over 10s interval, divided by 10, rounded up
-            batch_size = math.ceil(len(threat_queue) / 10)
-            batch = []
-            for _ in range(min(batch_size, len(threat_queue))):
-                batch.append(threat_queue.popleft())
-            if batch:
-                logger.info(f"Sending SSE batch with {len(batch)} threat data items")
-                yield f"data: {json.dumps(batch)}\n\n"
-            else:
-                logger.debug("Sending empty SSE batch (no data in queue)")
-                yield "data: []\n\n"
-        else:
-            logger.debug("Sending empty SSE batch (queue empty)")
-            yield "data: []\n\n"
-        await asyncio.sleep(1)  # Send every second
-
 @app.route('/threats')
 def stream_threats():
-    """SSE endpoint for threat data."""
+    """SSE endpoint for threat data, paced to follow the events' own timestamps.
+
+    Optional filters: src / dst (country codes), type (attack types; each
+    comma-separated), min_count, and sample (fraction of events in (0, 1]).
+    A Last-Event-ID header (or last_event_id argument) replays what was missed.
+    A client that falls behind receives ``event: summary`` frames, and one
+    that stalls is disconnected (see ``Subscriber``).
+    """
+    ensure_started()
+    try:
+        threat_filter = ThreatFilter.from_args(request.args)
+        last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError as e:
+        return jsonify({"error": f"Invalid filter: {e}"}), 400
+    subscriber = hub.subscribe(threat_filter, last_event_id)
+
     def generate():
-        # Create a new event loop for this request
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
         try:
-            # Run the async generator synchronously
-            gen = stream_threat_data()
+            yield f"retry: {RECONNECT_DELAY_MS}\n\n"
             while True:
                 try:
-                    # Get the next value from the async generator
-                    future = asyncio.ensure_future(gen.__anext__(), loop=loop)
-                    result = loop.run_until_complete(future)
-                    yield result
-                except StopAsyncIteration:
-                    break
+                    entry = subscriber.get(timeout=hub.heartbeat * 5)
+                except queue.Empty:
+                    # Keep the connection alive if the hub stalls
+                    yield ": keepalive\n\n"
+                    continue
+                if entry is None:
+                    # Disconnected by the hub after stalling; the client reconnects and catches up
+                    return
+                yield entry[2]
         finally:
-            loop.close()
-    
+            hub.unsubscribe(subscriber)
+
     logger.info("Accessed /threats endpoint")
     return Response(generate(), mimetype='text/event-stream')
 
 @app.route('/news')
 def get_news():
-    """GET endpoint for news data."""
+    """GET endpoint for the newest stored news articles."""
     logger.info("Accessed /news endpoint")
     try:
-        # Use the global loop to fetch news data
-        news_data = loop.run_until_complete(aggregator.news_collector.fetch_data())
-        logger.info(f"Fetched and returning {len(news_data)} news articles")
+        ensure_started()
+        news_data = news_store.latest()
+        if not news_data:
+            # Nothing stored yet: wait for the first poll
+            hub.get_snapshot("news", timeout=SNAPSHOT_WAIT)
+            news_data = news_store.latest()
+        logger.info(f"Returning {len(news_data)} news articles")
         if not news_data:
             logger.warning("No news articles fetched; check RSS feeds or filtering")
         return jsonify(news_data)
@@ -108,46 +165,205 @@ def get_news():
         logger.error(f"Error fetching news data: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/news/search')
+def search_news():
+    """GET endpoint ranking stored articles against ``q`` (all words must match).
+
+    Optional ``since`` (ISO date, epoch, or a relative age such as ``7d``),
+    ``keyword`` (a matched primary or secondary keyword) and ``limit`` (1 to 500, default 50).
+    """
+    try:
+        since = request.args.get("since")
+        since_ms = parse_since(since) if since else None
+        limit = max(1, min(int(request.args.get("limit", 50)), 500))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid search: {e}"}), 400
+    started = time.perf_counter()
+    results = news_store.search(request.args.get("q", ""), since_ms, request.args.get("keyword"), limit)
+    logger.info(f"News search returned {len(results)} articles in {(time.perf_counter() - started) * 1000:.1f}ms")
+    return jsonify(results)
+
+@app.route('/dictionary')
+def get_dictionary():
+    """GET endpoint with the id tables for countries and canonical attack types."""
+    ensure_started()
+    return jsonify(dictionary())
+
+def current_ip_snapshot():
+    """Return the mapped IP snapshot, waiting for the first one to be written if needed."""
+    ensure_started()
+    snapshot = ip_snapshots.current()
+    if snapshot is None:
+        hub.get_snapshot("ips", timeout=SNAPSHOT_WAIT)
+        snapshot = ip_snapshots.current()
+    return snapshot
+
+@app.route('/stats/loop')
+def get_loop_stats():
+    """GET endpoint with the event loop's scheduling delay and the time each stage spends on and off it."""
+    ensure_started()
+    stats = loop_monitor.stats()
+    if aggregator is not None:
+        stats["pipeline"] = aggregator.pipeline_stats()
+    return jsonify(stats)
+
+@app.route('/stats/streams')
+def get_stream_stats():
+    """GET endpoint with subscriber queue sizes and slow-consumer coalescing and disconnect counters."""
+    ensure_started()
+    return jsonify(hub.stats())
+
+@app.route('/stats/matrix')
+def get_threat_matrix():
+    """GET endpoint with source × destination attack counts over a rolling window.
+
+    ``window`` (``300``, ``5m``, ``1h``) is rounded up to the nearest
+    maintained window, ``group`` selects an attack-type group, and
+    ``format=binary`` returns the dense matrix instead of sparse JSON.
+    """
+    ensure_started()
+    try:
+        window = threat_matrix.window_for(parse_window(request.args.get("window", "5m")))
+        group = request.args.get("group") or None
+        if group is not None and group not in threat_matrix.groups:
+            raise ValueError(f"unknown group {group!r}; expected one of {', '.join(threat_matrix.groups)}")
+    except ValueError as e:
+        return jsonify({"error": f"Invalid matrix request: {e}"}), 400
+    matrix = threat_matrix.matrix(window, group)
+    if request.args.get("format") == "binary":
+        return Response(threat_matrix.to_binary(matrix, window), mimetype="application/octet-stream")
+    return jsonify(threat_matrix.to_sparse(matrix, window, group))
+
 @app.route('/malicious-ips')
 def get_malicious_ips():
-    """GET endpoint for malicious IP data."""
+    """GET endpoint for malicious IP data (JSON array, or NDJSON with ?format=ndjson)."""
     logger.info("Accessed /malicious-ips endpoint")
     try:
-        # Create a new MaliciousIPCollector instance to avoid session conflicts
-        from cyber_threat_intel import MaliciousIPCollector
-        ip_collector = MaliciousIPCollector(
-            sources=["alienvault", "bd_banlist", "fraudguard", "talos"],
-            interval=0.0  # No streaming, fetch on demand
-        )
-        # Create a new event loop for this request
-        new_loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(new_loop)
-        try:
-            # Initialize and fetch data
-            new_loop.run_until_complete(ip_collector.initialize())
-            malicious_ips_data = new_loop.run_until_complete(ip_collector.fetch_data())
-            logger.info(f"Fetched and returning {len(malicious_ips_data)} malicious IPs")
-            if not malicious_ips_data:
-                logger.warning("No malicious IPs fetched; check data sources or GeoLite2 database path")
-            return jsonify(malicious_ips_data)
-        finally:
-            new_loop.run_until_complete(ip_collector.close())
-            new_loop.close()
+        snapshot = current_ip_snapshot()
+        if snapshot is None or not len(snapshot):
+            logger.warning("No malicious IPs fetched; check data sources or GeoLite2 database path")
+            return jsonify([])
+        logger.info(f"Returning {len(snapshot)} malicious IPs (generation {snapshot.generation})")
+        headers = {"X-Snapshot-Generation": str(snapshot.generation)}
+        if request.args.get("format") == "ndjson":
+            return Response(snapshot.iter_ndjson(), mimetype='application/x-ndjson', headers=headers)
+        return Response(snapshot.iter_json(), mimetype='application/json', headers=headers)
     except Exception as e:
         logger.error(f"Error fetching malicious IPs data: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/malicious-ips/tiles')
+def get_malicious_ip_tiles():
+    """GET endpoint with the malicious-IP clusters in view at a zoom level.
+
+    ``z`` is the map zoom and ``bbox`` the view as west,south,east,north in
+    degrees (west > east crosses the antimeridian); without ``bbox`` every
+    cluster at that zoom is returned.
+    """
+    try:
+        zoom = int(request.args.get("z", 0))
+        bbox = request.args.get("bbox")
+        bbox = tuple(float(value) for value in bbox.split(",")) if bbox else None
+        if bbox is not None:
+            if len(bbox) != 4 or bbox[1] > bbox[3]:
+                raise ValueError("bbox must be west,south,east,north")
+            west, south, east, north = bbox
+            if not all(math.isfinite(value) for value in bbox):
+                raise ValueError("bbox values must be finite numbers")
+            if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= 90 and -90 <= north <= 90):
+                raise ValueError("bbox longitudes must be within ±180 and latitudes within ±90")
+    except ValueError as e:
+        return jsonify({"error": f"Invalid tile request: {e}"}), 400
+    snapshot = current_ip_snapshot()
+    if snapshot is None:
+        return jsonify({"zoom": zoom, "generation": None, "clusters": []})
+    index = ip_clusters.get(snapshot)
+    return jsonify({
+        "zoom": max(0, min(zoom, index.max_zoom)),
+        "generation": snapshot.generation,
+        "clusters": index.query(zoom, bbox),
+    })
+
+@app.route('/malicious-ips/blocklist')
+def get_malicious_ip_blocklist():
+    """GET endpoint with the malicious-IP set collapsed to a minimal CIDR list for firewalls.
+
+    ``format`` is ``text`` (default), ``ipset`` or ``nftables``; ``source``
+    and ``type`` take comma-separated names to export only some of the set,
+    and ``name`` names the ipset set or nftables table. Output is rendered
+    once per snapshot generation and honours ``If-None-Match``.
+    """
+    def names(arg: str):
+        value = request.args.get(arg)
+        return [name.strip() for name in value.split(",") if name.strip()] if value else None
+
+    snapshot = current_ip_snapshot()
+    if snapshot is None:
+        return jsonify({"error": "No malicious IP snapshot is available yet"}), 503
+    fmt = request.args.get("format", "text")
+    try:
+        body = blocklists.get(snapshot, fmt, names("source"), names("type"),
+                              request.args.get("name", DEFAULT_SET_NAME))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid blocklist request: {e}"}), 400
+    response = Response(body, mimetype=BLOCKLIST_FORMATS[fmt],
+                        headers={"X-Snapshot-Generation": str(snapshot.generation)})
+    response.set_etag(f"{snapshot.generation}-{zlib.crc32(body):08x}")
+    return response.make_conditional(request)
+
+@app.route('/malicious-ips/<address>')
+def lookup_malicious_ip(address: str):
+    """GET endpoint returning one IP's snapshot record, including the sources that listed it."""
+    snapshot = current_ip_snapshot()
+    entry = snapshot.lookup(address) if snapshot else None
+    if entry is None:
+        return jsonify({"error": f"{address} is not in the malicious IP set"}), 404
+    return jsonify(entry)
+
+@sock.route('/ws')
+def multiplexed_stream(ws):
+    """WebSocket carrying threats, news and malicious-IP deltas, each subscribed separately.
+
+    ``?encoding=binary`` switches to packed binary frames (default json).
+    """
+    ensure_started()
+    encoding = request.args.get("encoding", "json")
+    if encoding not in ("json", "binary"):
+        ws.close(message=f"Unsupported encoding {encoding}")
+        return
+    logger.info(f"Accessed /ws endpoint ({encoding})")
+    MultiplexSession(ws, hub, ip_snapshots, encoding).run()
+
+@app.route('/ip/<address>')
+def ip_reputation(address: str):
+    """GET endpoint with an IP's cached reputation and, if listed, its malicious-IP record.
+
+    Reads only the cache; IPs from the malicious-IP feeds are checked in the
+    background. ``stale`` marks an entry past its TTL that is due a recheck.
+    """
+    try:
+        address = str(ip_address(address))
+    except ValueError:
+        return jsonify({"error": f"{address} is not an IP address"}), 400
+    ensure_started()
+    snapshot = ip_snapshots.current()
+    listed = snapshot.lookup(address) if snapshot else None
+    reputation = reputation_cache.get(address)
+    if reputation is None and listed is None:
+        return jsonify({"error": f"No reputation cached for {address}"}), 404
+    return jsonify({"ip": address, "reputation": reputation, "listed": listed})
+
 if __name__ == "__main__":
     try:
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(initialize_aggregator())
+        ensure_started()
         logger.info("Starting Flask server on http://0.0.0.0:5000")
         # For production, use Gunicorn instead of app.run()
-        # Example: gunicorn -w 4 -b 0.0.0.0:5000 server:app
-        app.run(host='0.0.0.0', port=5000)  # Debug mode removed for production
+        # Example: gunicorn -w 4 -k gthread --threads 32 -b 0.0.0.0:5000 server:app
+        app.run(host='0.0.0.0', port=5000, threaded=True)  # Debug mode removed for production
     except KeyboardInterrupt:
         logger.info("Server stopped by user")
     finally:
         logger.info("Closing aggregator and event loop")
-        loop.run_until_complete(aggregator.close())
-        loop.close()
\ No newline at end of file
+        if aggregator:
+            asyncio.run_coroutine_threadsafe(aggregator.close(), loop).result(timeout=10)
+        loop.call_soon_threadsafe(loop.stop)
@@ -0,0 +1,389 @@
+"""Pluggable feeds behind the ``BaseDataCollector`` interface, registered by name.
+
+Threat sources return raw ``ThreatEvent`` lists and IP sources return
+sorted address lists; ``ThreatDataCollector`` and ``MaliciousIPCollector``
+compose them with the shared normalization, deduplication and geo
+enrichment. Run as a script to poll any set of sources on one event loop:
+
+    python sources.py fortiguard radware bd_tor --once
+"""
+import argparse
+import asyncio
+import json
+import logging
+import re
+import sys
+import time
+from ipaddress import ip_address
+from typing import Callable, Dict, Iterable, List, Optional, Type
+
+from collector_base import PROXY, BaseDataCollector, PollCursor
+from http_pool import request_headers
+from offload import offload
+from threat_event import ThreatEvent, parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Source classes by name, filled by @register_source
+SOURCES: Dict[str, Type[BaseDataCollector]] = {}
+
+
+def register_source(cls: Type[BaseDataCollector]) -> Type[BaseDataCollector]:
+    """Class decorator making a source available to the collectors and the CLI under ``cls.name``."""
+    if cls.name in SOURCES:
+        raise ValueError(f"Source {cls.name!r} is already registered")
+    SOURCES[cls.name] = cls
+    return cls
+
+
+def create_source(name: str, **kwargs) -> BaseDataCollector:
+    if name not in SOURCES:
+        raise KeyError(f"Unknown source {name!r}")
+    return SOURCES[name](**kwargs)
+
+
+def source_names(kind: Optional[str] = None) -> List[str]:
+    """Registered names, optionally only those of one kind ("threats" or "ips")."""
+    return [name for name, cls in SOURCES.items() if kind is None or cls.kind == kind]
+
+
+class ThreatSource(BaseDataCollector):
+    """A feed of source/destination attack events.
+
+    ``fetch_data`` returns one poll's events, before normalization and
+    deduplication. A ``streaming`` source holds its connection open for a
+    while on each call and is polled back to back. Polled sources keep a
+    ``cursor`` so each poll only parses records newer than the last one.
+    """
+    name = ""
+    kind = "threats"
+    streaming = False
+
+    def __init__(self, interval: float = 10.0, max_retries: int = 5):
+        super().__init__(self.name, interval, max_retries)
+        self.cursor: Optional[PollCursor] = None if self.streaming else PollCursor()
+
+
+@register_source
+class FortiGuardSource(ThreatSource):
+    """FortiGuard outbreak map; returns its whole window, keyed by timestamp."""
+    name = "fortiguard"
+    url = "https://fortiguard.fortinet.com/api/threatmap/live/outbreak"
+
+    async def fetch_data(self) -> List[ThreatEvent]:
+        headers = {
+            'Accept': 'application/json',
+            'Accept-Language': 'en-US,en;q=0.9',
+            'Connection': 'keep-alive',
+            'Referer': 'https://fortiguard.fortinet.com/'
+        }
+        data = await self.fetch_with_retry(self.url, params={"outbreak_id": 0}, headers=headers, stage=self.name)
+        if not data:
+            logger.error(f"{self.name}: Failed to retrieve data")
+            return []
+        return await offload(f"{self.name} parse", self.parse, data)
+
+    def parse(self, data: Dict) -> List[ThreatEvent]:
+        cursor = self.cursor
+        parsed_data = []
+        skipped = 0
+        ips_data = data.get("ips", {})
+        for timestamp_key, attacks in ips_data.items():
+            bucket_ms = parse_timestamp(timestamp_key)
+            if cursor.watermark is not None and bucket_ms < cursor.watermark:
+                skipped += len(attacks)
+                continue
+            for attack in attacks:
+                key = (attack.get("src_country"), attack.get("dest_country"), attack.get("vuln_name"),
+                       attack.get("count"), attack.get("timestamp"))
+                if not cursor.accept(bucket_ms, key):
+                    skipped += 1
+                    continue
+                parsed_data.append(ThreatEvent.from_raw(
+                    timestamp=attack.get("timestamp") or timestamp_key,
+                    src_code=attack.get("src_country"),
+                    dst_code=attack.get("dest_country"),
+                    attack_type=attack.get("vuln_type"),
+                    attack_name=attack.get("vuln_name"),
+                    count=attack.get("count"),
+                    src_lat=attack.get("src_lat"), src_lon=attack.get("src_long"),
+                    dst_lat=attack.get("dest_lat"), dst_lon=attack.get("dest_long")
+                ))
+        cursor.advance()
+        logger.debug(f"{self.name}: Collected {len(parsed_data)} new entries, skipped {skipped} already seen")
+        return parsed_data
+
+
+@register_source
+class CheckpointSource(ThreatSource):
+    """Check Point ThreatMap server-sent events, read for ``window`` seconds per call."""
+    name = "checkpoint"
+    url = "https://threatmap-api.checkpoint.com/ThreatMap/api/feed"
+    streaming = True
+    window = 10.0
+
+    async def fetch_data(self) -> List[ThreatEvent]:
+        payloads = []
+        current_event = None
+        start_time = time.time()
+
+        try:
+            async with self.session.get(self.url, headers=request_headers({'Accept': 'text/event-stream'}), proxy=PROXY, timeout=10) as response:
+                if response.status != 200:
+                    logger.warning(f"{self.name}: Status {response.status}")
+                    return []
+
+                async for line in response.content:
+                    if time.time() - start_time > self.window:
+                        logger.debug(f"{self.name}: Stopping collection after {self.window}s")
+                        break
+                    if line:
+                        decoded_line = line.decode('utf-8').strip()
+                        if decoded_line.startswith("event:"):
+                            current_event = decoded_line[6:].strip()
+                        elif decoded_line.startswith("data:") and current_event == "attack":
+                            payloads.append(decoded_line[5:])
+        except Exception as e:
+            logger.error(f"{self.name}: Fetch error: {e}")
+
+        # The whole window is parsed in one hand-off rather than event by event
+        threat_data_list = await offload(f"{self.name} parse", self.parse, payloads)
+        logger.debug(f"{self.name}: Collected {len(threat_data_list)} events in {self.window}s")
+        return threat_data_list
+
+    def parse(self, payloads: List[str]) -> List[ThreatEvent]:
+        threat_data_list = []
+        for payload in payloads:
+            try:
+                json_data = json.loads(payload)
+            except json.JSONDecodeError as e:
+                logger.warning(f"{self.name}: Failed to parse JSON: {payload}, error: {e}")
+                continue
+            fields = {key: value for key, value in json_data.items() if value not in [None, "None"]}
+            if fields:
+                threat_data_list.append(ThreatEvent.from_raw(
+                    timestamp=fields.get("t"),
+                    src_code=fields.get("s_co"),
+                    dst_code=fields.get("d_co"),
+                    attack_type=fields.get("a_t"),
+                    attack_name=fields.get("a_n"),
+                    count=fields.get("a_c"),
+                    src_lat=fields.get("s_la"), src_lon=fields.get("s_lo"),
+                    dst_lat=fields.get("d_la"), dst_lon=fields.get("d_lo")
+                ))
+        return threat_data_list
+
+
+@register_source
+class RadwareSource(ThreatSource):
+    """Radware live threat map, paged by ``limit``."""
+    name = "radware"
+    url = "https://ltm-prod-api.radware.com/map/attacks"
+
+    def __init__(self, interval: float = 10.0, max_retries: int = 5):
+        super().__init__(interval, max_retries)
+        self.cursor = PollCursor(page_size=20, max_page_size=1000)
+
+    async def fetch_data(self) -> List[ThreatEvent]:
+        data = await self.fetch_with_retry(self.url, params={"limit": self.cursor.page_size}, stage=self.name)
+        if not data:
+            logger.error(f"{self.name}: Failed to retrieve data")
+            return []
+        return await offload(f"{self.name} parse", self.parse, data)
+
+    def parse(self, data: List) -> List[ThreatEvent]:
+        cursor = self.cursor
+        parsed_data = []
+        skipped = 0
+        for attack_group in data:
+            if not isinstance(attack_group, list):
+                logger.debug(f"{self.name}: Skipping non-list attack group: {attack_group}")
+                continue
+            for attack in attack_group:
+                if not isinstance(attack, dict):
+                    logger.debug(f"{self.name}: Skipping non-dict attack: {attack}")
+                    continue
+                key = (attack.get("sourceCountry"), attack.get("destinationCountry"), attack.get("type"))
+                if not cursor.accept(parse_timestamp(attack.get("attackTime")), key):
+                    skipped += 1
+                    continue
+                # Coordinates are left unset; country centroids are filled in at the edge
+                parsed_data.append(ThreatEvent.from_raw(
+                    timestamp=attack.get("attackTime"),
+                    src_code=attack.get("sourceCountry"),
+                    dst_code=attack.get("destinationCountry"),
+                    attack_type=attack.get("type"),
+                    attack_name=attack.get("type")
+                ))
+        page_size = cursor.page_size
+        cursor.advance(returned=len(data) if isinstance(data, list) else 0)
+        if cursor.page_size != page_size:
+            logger.info(f"{self.name}: Page size now {cursor.page_size} (poll returned {len(data)} of {page_size})")
+        logger.debug(f"{self.name}: Collected {len(parsed_data)} new entries, skipped {skipped} already seen")
+        return parsed_data
+
+
+# Blocklist parsers are module-level and free of shared state, so they can run in a process pool
+IP_PATTERN = re.compile(r'\b(?:\d{1,3}\.){3}\d{1,3}\b')
+FRAUDGUARD_DATA = re.compile(r'const threatData = (\[.*?\]);', re.DOTALL)
+
+def is_valid_ip(ip_str: str) -> bool:
+    try:
+        ip_address(ip_str)
+        return True
+    except ValueError:
+        return False
+
+def valid_ips(candidates: Iterable[Optional[str]]) -> List[str]:
+    """Sorted unique valid addresses among ``candidates``."""
+    return sorted({ip for ip in candidates if ip and is_valid_ip(ip)})
+
+def find_ips(text: str) -> List[str]:
+    """Addresses appearing anywhere in ``text``."""
+    return valid_ips(IP_PATTERN.findall(text))
+
+def listed_ips(text: str) -> List[str]:
+    """Addresses listed one per line."""
+    return valid_ips(line.strip() for line in text.splitlines())
+
+def fraudguard_ips(text: str) -> List[str]:
+    """Addresses in the ``threatData`` array embedded in the FraudGuard map page."""
+    match = FRAUDGUARD_DATA.search(text)
+    if not match:
+        return []
+    return valid_ips(attack.get("ip") for attack in json.loads(match.group(1)))
+
+def talos_ips(data: Dict) -> List[str]:
+    """Addresses in the ``spam`` list of the Talos top senders response."""
+    return valid_ips(entry.get("ip") for entry in data.get("spam", []))
+
+
+class IPListSource(BaseDataCollector):
+    """A blocklist fetched from ``url`` whose addresses are all tagged ``source_type``.
+
+    ``fetch_data`` returns the sorted addresses of one download;
+    ``MaliciousIPCollector`` geolocates and merges them.
+    """
+    name = ""
+    kind = "ips"
+    url = ""
+    source_type = "malicious"
+    parser: Callable[[str], List[str]] = staticmethod(find_ips)
+
+    def __init__(self, interval: float = 0.0, max_retries: int = 5):
+        super().__init__(self.name, interval, max_retries)
+
+    async def fetch_data(self) -> List[str]:
+        try:
+            async with self.session.get(self.url, headers=request_headers(), proxy=PROXY, timeout=10) as response:
+                if response.status != 200:
+                    return []
+                text = await response.text()
+            return await offload(f"{self.name} parse", self.parser, text, pure=True)
+        except Exception as e:
+            logger.error(f"{self.name}: Error fetching: {e}")
+            return []
+
+
+@register_source
+class AlienVaultSource(IPListSource):
+    name = "alienvault"
+    url = "https://reputation.alienvault.com/reputation.unix"
+
+
+@register_source
+class BinaryDefenseBanlistSource(IPListSource):
+    name = "bd_banlist"
+    url = "https://www.binarydefense.com/banlist.txt"
+    parser = staticmethod(listed_ips)
+
+
+@register_source
+class BinaryDefenseTorSource(IPListSource):
+    name = "bd_tor"
+    url = "https://www.binarydefense.com/tor.txt"
+    source_type = "tor"
+
+
+@register_source
+class FraudGuardSource(IPListSource):
+    name = "fraudguard"
+    url = "https://api.fraudguard.io/landing-page-map"
+    parser = staticmethod(fraudguard_ips)
+
+
+@register_source
+class TalosSource(IPListSource):
+    """Talos top spam senders, served as JSON."""
+    name = "talos"
+    url = "https://talosintelligence.com/cloud_intel/top_senders_list"
+    source_type = "spam"
+
+    async def fetch_data(self) -> List[str]:
+        data = await self.fetch_with_retry(self.url, stage=self.name)
+        if not data:
+            return []
+        return await offload(f"{self.name} parse", talos_ips, data, pure=True)
+
+
+async def run_sources(names: List[str], interval: Optional[float] = None, once: bool = False) -> None:
+    """Poll ``names`` together, printing each batch as a JSON line ``{"topic": ..., "data": [...]}``."""
+    # Deferred: the collectors import this module for the registry
+    from cyber_threat_intel import MaliciousIPCollector, ThreatDataCollector
+    from threat_event import to_public
+
+    collectors = []
+    threat_names = [name for name in names if SOURCES[name].kind == "threats"]
+    ip_names = [name for name in names if SOURCES[name].kind == "ips"]
+    if threat_names:
+        collectors.append(("threats", ThreatDataCollector(threat_names, interval=interval or 10.0), to_public))
+    if ip_names:
+        collectors.append(("ips", MaliciousIPCollector(ip_names, interval=interval or 60.0), list))
+
+    def emit(topic: str, data: List) -> None:
+        print(json.dumps({"topic": topic, "data": data}, separators=(",", ":")), flush=True)
+
+    async def collect(topic: str, collector: BaseDataCollector, encode: Callable) -> None:
+        if once:
+            # Streaming feeds are then read for one window inside fetch_data
+            await (collector.initialize(background_streams=False) if topic == "threats" else collector.initialize())
+            emit(topic, encode(await collector.fetch_data()))
+            return
+        async for batch in collector.stream_data():
+            if batch:
+                emit(topic, encode(batch))
+
+    try:
+        await asyncio.gather(*(collect(topic, collector, encode) for topic, collector, encode in collectors))
+    finally:
+        from http_pool import close_session
+        await asyncio.gather(*(collector.close() for _, collector, _ in collectors))
+        await close_session()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Poll threat and IP sources concurrently and print JSON lines.")
+    parser.add_argument("names", nargs="*", help="sources to run (default: all registered sources)")
+    parser.add_argument("--list", action="store_true", help="list the registered sources and exit")
+    parser.add_argument("--once", action="store_true", help="poll every source once and exit")
+    parser.add_argument("--interval", type=float, help="seconds between polls (default: 10 for threats, 60 for IPs)")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, cls in SOURCES.items():
+            print(f"{name:12} {cls.kind:8} {cls.url}")
+        return 0
+    unknown = [name for name in args.names if name not in SOURCES]
+    if unknown:
+        parser.error(f"unknown source(s): {', '.join(unknown)}; see --list")
+    names = list(dict.fromkeys(args.names)) or source_names()
+    try:
+        asyncio.run(run_sources(names, args.interval, args.once))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(main())
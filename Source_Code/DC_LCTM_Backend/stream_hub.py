@@ -0,0 +1,511 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import queue
+import random
+import struct
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from threat_event import (ThreatEvent, to_public, pack_events, canonical_label, group_by_pair, COUNTRIES,
+                          ATTACK_TYPES)
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TOPICS = ("dictionary", "news", "ips")
+
+# Pacing defaults; the budget should exceed the slowest regular poll interval
+LATENCY_BUDGET = float(os.getenv("LCTM_LATENCY_BUDGET", "12"))
+PRIORITY_COUNT = int(os.getenv("LCTM_PRIORITY_COUNT", "100"))
+PRIORITY_TYPES = [name for name in os.getenv("LCTM_PRIORITY_TYPES", "").split(",") if name.strip()]
+# Seconds of delivered batches kept for Last-Event-ID catch-up
+REPLAY_WINDOW = float(os.getenv("LCTM_REPLAY_WINDOW", "300"))
+# Encoded bytes queued for one client before its pending frames are coalesced into a summary
+SUBSCRIBER_BUFFER = int(os.getenv("LCTM_SUBSCRIBER_BUFFER", str(1 << 20)))
+# A client that takes nothing from its queue for this many seconds is disconnected
+STALL_TIMEOUT = float(os.getenv("LCTM_STALL_TIMEOUT", "30"))
+
+# Frame encodings: SSE text, WebSocket JSON text, WebSocket binary
+ENCODINGS = ("sse", "json", "binary")
+BINARY_KINDS = {"batch": 0, "summary": 1}
+
+
+def encode_threats(encoding: str, sequence: int, events: List[ThreatEvent], kind: str = "batch"):
+    """Encode one threat frame; ``kind`` is "batch" or "summary"."""
+    if encoding == "binary":
+        # b"T", kind, sequence id, then the packed records
+        return b"T" + struct.pack("<Bq", BINARY_KINDS[kind], sequence) + pack_events(events)
+    if encoding == "json":
+        return json.dumps({"topic": "threats", "kind": kind, "id": sequence, "data": to_public(events)})
+    prefix = "event: summary\n" if kind == "summary" else ""
+    id_line = f"id: {sequence}\n" if sequence else ""
+    return f"{prefix}{id_line}data: {json.dumps(to_public(events))}\n\n"
+
+
+class PacingScheduler:
+    """Replays threat events in the order, and with the spacing, of their timestamps.
+
+    An event stamped ``t`` is due at ``t + latency_budget``, so a batch polled
+    every few seconds plays back as it happened, delayed by the budget. When a
+    batch arrives too late for that, it is shifted to start now, and a batch
+    spanning more than the budget is compressed into it, so playback never
+    falls further behind than the budget; a batch stamped ahead of the local
+    clock starts one budget from now. Events in the priority lane (attack
+    count of at least ``priority_count`` or a priority attack type) skip the
+    pacing and go out on the next tick.
+    """
+    def __init__(self, latency_budget: float = LATENCY_BUDGET, priority_count: int = PRIORITY_COUNT,
+                 priority_types: Iterable[str] = PRIORITY_TYPES):
+        self.budget_ms = int(latency_budget * 1000)
+        self.priority_count = priority_count
+        self.priority_labels: Set[str] = {canonical_label(name) for name in priority_types}
+        self._priority_ids: Dict[int, bool] = {}
+        self._heap: list = []
+        self._sequence = itertools.count()
+        self.priority: List[ThreatEvent] = []
+
+    def __len__(self) -> int:
+        return len(self._heap) + len(self.priority)
+
+    def _is_priority(self, event: ThreatEvent) -> bool:
+        if self.priority_count and event.count >= self.priority_count:
+            return True
+        for type_id in event.attack_types:
+            flagged = self._priority_ids.get(type_id)
+            if flagged is None:
+                flagged = canonical_label(ATTACK_TYPES.value(type_id) or "") in self.priority_labels
+                self._priority_ids[type_id] = flagged
+            if flagged:
+                return True
+        return False
+
+    def add(self, events: List[ThreatEvent], now_ms: Optional[int] = None) -> None:
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        paced = []
+        for event in events:
+            if self._is_priority(event):
+                self.priority.append(event)
+            else:
+                paced.append(event)
+        if not paced:
+            return
+        oldest = min(event.timestamp_ms for event in paced)
+        newest = max(event.timestamp_ms for event in paced)
+        span = newest - oldest
+        scale = min(1.0, self.budget_ms / span) if span else 1.0
+        # Never later than one budget from now, however far ahead of the local clock a feed stamps
+        start = min(max(now_ms, oldest + self.budget_ms), now_ms + self.budget_ms)
+        for event in paced:
+            due = start + int((event.timestamp_ms - oldest) * scale)
+            heapq.heappush(self._heap, (due, next(self._sequence), event))
+
+    def pop_due(self, now_ms: Optional[int] = None) -> List[ThreatEvent]:
+        """Return the priority lane plus every paced event that is due, in timestamp order."""
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        batch, self.priority = self.priority, []
+        while self._heap and self._heap[0][0] <= now_ms:
+            batch.append(heapq.heappop(self._heap)[2])
+        return batch
+
+
+class ThreatFilter:
+    """Server-side filter for a /threats subscription.
+
+    Country and attack-type sets are held as ids; an empty set matches
+    anything. Equal filters compare and hash equal, so subscribers with the
+    same query share one group and one encoded frame per batch.
+    """
+    __slots__ = ("src", "dst", "types", "min_count", "sample", "_key")
+
+    def __init__(self, src: Iterable[int] = (), dst: Iterable[int] = (), types: Iterable[int] = (),
+                 min_count: int = 0, sample: float = 1.0):
+        self.src = frozenset(src)
+        self.dst = frozenset(dst)
+        self.types = frozenset(types)
+        self.min_count = min_count
+        self.sample = sample
+        self._key = (self.src, self.dst, self.types, self.min_count, self.sample)
+
+    @classmethod
+    def from_args(cls, args) -> "ThreatFilter":
+        """Parse ``src``, ``dst``, ``type`` (comma-separated), ``min_count`` and ``sample`` query arguments.
+
+        Raises ValueError on malformed numbers, unknown country codes or a
+        sample rate outside (0, 1]. Query values are only looked up, never added
+        to the vocabularies; an attack type no feed has reported yet matches
+        nothing.
+        """
+        def codes(name):
+            values = ",".join(args.getlist(name)) if hasattr(args, "getlist") else args.get(name, "")
+            return [value.strip() for value in values.split(",") if value.strip()]
+
+        def countries(name):
+            ids = []
+            for code in codes(name):
+                country = COUNTRIES.find(code.upper())
+                if not country:
+                    raise ValueError(f"unknown country code {code!r} in {name}")
+                ids.append(country)
+            return ids
+
+        sample = float(args.get("sample", 1.0))
+        if not 0 < sample <= 1:
+            raise ValueError("sample must be in (0, 1]")
+        return cls(
+            src=countries("src"),
+            dst=countries("dst"),
+            # Id 0 never appears in an event's types, so an unknown type matches nothing
+            types=[ATTACK_TYPES.find(name) for name in codes("type")],
+            min_count=int(args.get("min_count", 0)),
+            sample=sample,
+        )
+
+    @property
+    def is_empty(self) -> bool:
+        return self._key == ThreatFilter()._key
+
+    def matches(self, event: ThreatEvent) -> bool:
+        if self.src and event.src not in self.src:
+            return False
+        if self.dst and event.dst not in self.dst:
+            return False
+        if self.types and self.types.isdisjoint(event.attack_types):
+            return False
+        return event.count >= self.min_count
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ThreatFilter) and self._key == other._key
+
+    def __hash__(self) -> int:
+        return hash(self._key)
+
+
+class SlowConsumerStats:
+    """Counters of the slow-consumer handling, shared by every subscriber of a hub."""
+    __slots__ = ("coalesced", "trimmed_events", "disconnected")
+
+    def __init__(self):
+        self.coalesced = 0  # Times a client's pending frames were merged into one summary
+        self.trimmed_events = 0  # Pairs left out of summaries that still exceeded the budget
+        self.disconnected = 0  # Clients dropped after stalling
+
+    def public(self) -> Dict:
+        return {"coalesced": self.coalesced, "trimmed_events": self.trimmed_events,
+                "disconnected": self.disconnected}
+
+
+class Subscriber(queue.Queue):
+    """Queue for one client, tagged with its filter and frame encoding.
+
+    Entries are ``(sequence, events, frame)`` tuples: the pre-encoded frame
+    plus the events behind it, for consumers that coalesce before sending.
+    At most ``budget`` encoded bytes are held: a frame that would exceed it
+    merges everything pending into one per-pair summary frame, keeping the
+    client current instead of further behind, and a summary still over the
+    budget keeps only its largest pairs. Heartbeats are skipped while frames
+    wait. ``close`` empties the queue and leaves a single ``None``, which
+    tells the consumer to hang up.
+    """
+    def __init__(self, threat_filter: ThreatFilter, encoding: str = "sse", budget: int = SUBSCRIBER_BUFFER,
+                 stats: Optional[SlowConsumerStats] = None):
+        super().__init__()
+        self.filter = threat_filter
+        self.encoding = encoding
+        self.budget = budget
+        self.stats = stats or SlowConsumerStats()
+        self.queued_bytes = 0
+        self.closed = False
+        # When the client last took a frame, or when a frame started waiting in an empty queue
+        self.last_progress = time.monotonic()
+
+    @property
+    def key(self) -> Tuple[ThreatFilter, str]:
+        return self.filter, self.encoding
+
+    def _put(self, entry: tuple) -> None:
+        if self.closed or (self.queue and not entry[1]):
+            return
+        if not self.queue:
+            self.last_progress = time.monotonic()
+        if self.queued_bytes + len(entry[2]) > self.budget:
+            entry = self._coalesce(list(self.queue) + [entry])
+            self.queue.clear()
+            self.queued_bytes = 0
+        self.queue.append(entry)
+        self.queued_bytes += len(entry[2])
+
+    def _get(self) -> Optional[tuple]:
+        entry = self.queue.popleft()
+        if entry is not None:
+            self.queued_bytes -= len(entry[2])
+        self.last_progress = time.monotonic()
+        return entry
+
+    def _coalesce(self, entries: List[tuple]) -> tuple:
+        """One summary frame for ``entries``, trimmed to its largest pairs if it is still over budget."""
+        sequence = entries[-1][0]
+        events = group_by_pair(event for _, batch, _ in entries for event in batch)
+        frame = encode_threats(self.encoding, sequence, events, "summary")
+        self.stats.coalesced += 1
+        if len(frame) > self.budget and events:
+            keep = max(1, int(len(events) * self.budget / len(frame) * 0.9))
+            self.stats.trimmed_events += len(events) - keep
+            events = sorted(events, key=lambda event: -event.count)[:keep]
+            frame = encode_threats(self.encoding, sequence, events, "summary")
+        return sequence, events, frame
+
+    def stalled(self, now: float, timeout: float = STALL_TIMEOUT) -> bool:
+        """True if frames have waited ``timeout`` seconds without the client taking any."""
+        return bool(self.queue) and now - self.last_progress > timeout
+
+    def close(self) -> None:
+        with self.mutex:
+            self.closed = True
+            self.queue.clear()
+            self.queued_bytes = 0
+            self.queue.append(None)
+            self.not_empty.notify_all()
+
+
+class SubscriberGroup:
+    """All subscribers sharing one filter and encoding."""
+    def __init__(self, threat_filter: ThreatFilter, encoding: str):
+        self.filter = threat_filter
+        self.encoding = encoding
+        self.subscribers: List[Subscriber] = []
+        self.last_sent = 0.0
+
+
+class ThreatStreamHub:
+    """Fan-out point between the collectors and the web routes of one process.
+
+    Collector output arrives through ``publish`` on the background event loop,
+    either from in-process collectors or from a collector service subscription.
+    Threat batches are queued as ``ThreatEvent`` records in a
+    ``PacingScheduler``. Every tick the due events are matched against the
+    subscriber groups, found through indexes on their source and destination
+    country filters, and each group's events are encoded to the public JSON
+    shape once and handed to its subscribers' queues. News and IP data are
+    kept as snapshots that routes read directly.
+
+    Every non-empty batch gets a sequence id, its delivery time in epoch
+    milliseconds forced to increase, which is sent as the SSE ``id:``. Since
+    all workers pace the same feed by timestamp, the ids line up closely
+    across workers too. Batches from the last ``replay_window`` seconds are
+    retained so a reconnecting client can catch up from its Last-Event-ID.
+
+    Each subscriber holds at most ``subscriber_buffer`` encoded bytes (see
+    ``Subscriber``), so a client on a slow link gets coalesced summaries
+    rather than an ever-growing backlog, and one that takes nothing for
+    ``stall_timeout`` seconds is disconnected.
+    """
+    def __init__(self, tick: float = 0.25, heartbeat: float = 1.0, scheduler: Optional[PacingScheduler] = None,
+                 replay_window: float = REPLAY_WINDOW, subscriber_buffer: int = SUBSCRIBER_BUFFER,
+                 stall_timeout: float = STALL_TIMEOUT):
+        self.tick = tick
+        self.heartbeat = heartbeat
+        self.subscriber_buffer = subscriber_buffer
+        self.stall_timeout = stall_timeout
+        self.slow_consumers = SlowConsumerStats()
+        self.scheduler = scheduler or PacingScheduler()
+        self.replay_window_ms = int(replay_window * 1000)
+        self.sequence = 0
+        self.history: Deque[Tuple[int, List[ThreatEvent]]] = deque()
+        self.groups: Dict[Tuple[ThreatFilter, str], SubscriberGroup] = {}
+        self._filter_refs: Dict[ThreatFilter, int] = {}
+        # Filters indexed by the countries they select; filters with neither are "wildcards"
+        self._by_src: Dict[int, Set[ThreatFilter]] = {}
+        self._by_dst: Dict[int, Set[ThreatFilter]] = {}
+        self._wildcards: Set[ThreatFilter] = set()
+        self.snapshots: Dict[str, object] = {}
+        self._snapshot_ready = {topic: threading.Event() for topic in SNAPSHOT_TOPICS}
+        self._listeners: Dict[str, List[Callable[[object], None]]] = {
+            topic: [] for topic in ("threats",) + SNAPSHOT_TOPICS
+        }
+        self._lock = threading.Lock()
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(group.subscribers) for group in list(self.groups.values()))
+
+    def publish(self, topic: str, data) -> None:
+        """Accept collector output; must be called on the hub's event loop."""
+        if topic == "threats":
+            self.scheduler.add(data)
+            for listener in self._listeners[topic]:
+                listener(data)
+            return
+        if topic == "dictionary":
+            # Adopt the collector's id assignments so every worker decodes ids the same way
+            COUNTRIES.update(data["countries"])
+            ATTACK_TYPES.update(data["attack_types"])
+        if topic in self._snapshot_ready:
+            self.snapshots[topic] = data
+            self._snapshot_ready[topic].set()
+            for listener in self._listeners[topic]:
+                listener(data)
+        else:
+            logger.debug(f"Hub: Ignoring unknown topic {topic}")
+
+    def add_listener(self, topic: str, listener: Callable[[object], None]) -> None:
+        """Call ``listener(data)`` on the event loop whenever a new ``topic`` snapshot (or threat batch) arrives."""
+        self._listeners[topic].append(listener)
+
+    def get_snapshot(self, topic: str, timeout: Optional[float] = None):
+        """Return the latest snapshot for a topic, waiting up to ``timeout`` for the first one."""
+        if timeout and not self._snapshot_ready[topic].is_set():
+            self._snapshot_ready[topic].wait(timeout)
+        return self.snapshots.get(topic)
+
+    def _index(self, threat_filter: ThreatFilter, add: bool) -> None:
+        if not threat_filter.src and not threat_filter.dst:
+            (self._wildcards.add if add else self._wildcards.discard)(threat_filter)
+            return
+        # Index on one side only: a filter must match both, so either index finds it
+        index, ids = (self._by_src, threat_filter.src) if threat_filter.src else (self._by_dst, threat_filter.dst)
+        for country_id in ids:
+            if add:
+                index.setdefault(country_id, set()).add(threat_filter)
+            else:
+                index.get(country_id, set()).discard(threat_filter)
+                if not index.get(country_id, True):
+                    del index[country_id]
+
+    def subscribe(self, threat_filter: Optional[ThreatFilter] = None,
+                  last_event_id: Optional[int] = None, encoding: str = "sse") -> Subscriber:
+        """Register a subscriber; with ``last_event_id``, queue what it missed first."""
+        subscriber = Subscriber(threat_filter or ThreatFilter(), encoding, self.subscriber_buffer,
+                                self.slow_consumers)
+        with self._lock:
+            if last_event_id is not None:
+                entry = self._catch_up(subscriber.filter, last_event_id, encoding)
+                if entry:
+                    subscriber.put(entry)
+            group = self.groups.get(subscriber.key)
+            if group is None:
+                group = self.groups[subscriber.key] = SubscriberGroup(subscriber.filter, encoding)
+                if not self._filter_refs.get(subscriber.filter):
+                    self._index(subscriber.filter, add=True)
+                self._filter_refs[subscriber.filter] = self._filter_refs.get(subscriber.filter, 0) + 1
+            group.subscribers.append(subscriber)
+        logger.info(f"Hub: Subscriber added ({self.subscriber_count} connected, {len(self.groups)} filters)")
+        return subscriber
+
+    def _catch_up(self, threat_filter: ThreatFilter, last_event_id: int, encoding: str) -> Optional[tuple]:
+        """Build the frame for batches after ``last_event_id``; caller holds the lock.
+
+        Within the retained window the missed events are replayed in one frame.
+        If the gap reaches past the window, an ``event: summary`` frame carries
+        the whole window aggregated per source/destination pair instead.
+        """
+        if not self.history or last_event_id >= self.sequence:
+            return None
+        if last_event_id >= self.history[0][0] - 1:
+            events = [event for sequence, batch in self.history if sequence > last_event_id
+                      for event in batch if threat_filter.matches(event)]
+            kind = "catch-up"
+        else:
+            events = group_by_pair(event for _, batch in self.history
+                                   for event in batch if threat_filter.matches(event))
+            kind = "summary"
+        logger.info(f"Hub: Sending {kind} of {len(events)} items after event {last_event_id}")
+        frame_kind = "summary" if kind == "summary" else "batch"
+        return self.sequence, events, encode_threats(encoding, self.sequence, events, frame_kind)
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            group = self.groups.get(subscriber.key)
+            if group and subscriber in group.subscribers:
+                group.subscribers.remove(subscriber)
+                if not group.subscribers:
+                    del self.groups[subscriber.key]
+                    self._filter_refs[subscriber.filter] -= 1
+                    if not self._filter_refs[subscriber.filter]:
+                        del self._filter_refs[subscriber.filter]
+                        self._index(subscriber.filter, add=False)
+        logger.info(f"Hub: Subscriber removed ({self.subscriber_count} connected)")
+
+    def _match(self, batch: List[ThreatEvent]) -> Dict[ThreatFilter, List[ThreatEvent]]:
+        """Route each event to the filters that want it, via the country indexes."""
+        matched: Dict[ThreatFilter, List[ThreatEvent]] = {}
+        with self._lock:
+            wildcards = list(self._wildcards)
+            by_src = {key: list(value) for key, value in self._by_src.items()}
+            by_dst = {key: list(value) for key, value in self._by_dst.items()}
+        for event in batch:
+            for candidates in (wildcards, by_src.get(event.src, ()), by_dst.get(event.dst, ())):
+                for threat_filter in candidates:
+                    if threat_filter.matches(event):
+                        if threat_filter.sample < 1.0 and random.random() >= threat_filter.sample:
+                            continue
+                        matched.setdefault(threat_filter, []).append(event)
+        return matched
+
+    def _record(self, batch: List[ThreatEvent]) -> None:
+        """Assign the batch its sequence id and retain it; caller holds the lock."""
+        now_ms = int(time.time() * 1000)
+        self.sequence = max(self.sequence + 1, now_ms)
+        self.history.append((self.sequence, batch))
+        while self.history and self.history[0][0] < now_ms - self.replay_window_ms:
+            self.history.popleft()
+
+    def _deliver(self, batch: List[ThreatEvent]) -> None:
+        now = time.monotonic()
+        matched = self._match(batch) if batch else {}
+        with self._lock:
+            # Recording and snapshotting together keeps catch-up and live frames from overlapping
+            if batch:
+                self._record(batch)
+            sequence = self.sequence
+            groups = [(group, list(group.subscribers)) for group in self.groups.values()]
+        for group, subscribers in groups:
+            events = matched.get(group.filter)
+            if not events:
+                if now - group.last_sent < self.heartbeat:
+                    continue
+                # Heartbeats carry the latest id too, so a reconnect resumes from here
+                events = []
+            entry = (sequence, events, encode_threats(group.encoding, sequence, events))
+            group.last_sent = now
+            for subscriber in subscribers:
+                if subscriber.stalled(now, self.stall_timeout):
+                    self.disconnect(subscriber)
+                else:
+                    subscriber.put(entry)
+
+    def disconnect(self, subscriber: Subscriber) -> None:
+        """Drop a stalled subscriber and free its queue; its consumer finds ``None`` and hangs up."""
+        logger.warning(f"Hub: Disconnecting a subscriber that took nothing for {self.stall_timeout:.0f}s "
+                       f"({subscriber.queued_bytes} bytes queued)")
+        self.slow_consumers.disconnected += 1
+        subscriber.close()
+        self.unsubscribe(subscriber)
+
+    def stats(self) -> Dict:
+        """Subscriber queue sizes against the byte budget, plus the slow-consumer counters."""
+        with self._lock:
+            subscribers = [subscriber for group in self.groups.values() for subscriber in group.subscribers]
+        queued = [subscriber.queued_bytes for subscriber in subscribers]
+        return {
+            "subscribers": len(subscribers),
+            "budget_bytes": self.subscriber_buffer,
+            "stall_timeout": self.stall_timeout,
+            "queued_bytes": sum(queued),
+            "max_queued_bytes": max(queued, default=0),
+            "behind": sum(1 for subscriber in subscribers if subscriber.qsize() > 1),
+            **self.slow_consumers.public(),
+        }
+
+    async def run(self) -> None:
+        """Deliver due threats every tick, and an empty frame to groups idle for a heartbeat."""
+        while True:
+            batch = self.scheduler.pop_due()
+            if batch:
+                logger.debug(f"Hub: Delivering {len(batch)} threat data items to {len(self.groups)} filters")
+            self._deliver(batch)
+            await asyncio.sleep(self.tick)
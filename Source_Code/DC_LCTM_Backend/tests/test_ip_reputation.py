@@ -0,0 +1,288 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+from http_pool import close_session
+from ip_reputation import (AbuseIPDBProvider, MockReputationProvider, ProviderBusy, RateLimiter,
+                           ReputationCache, ReputationEnricher)
+
+IPS = ["192.0.2.1", "192.0.2.2", "198.51.100.7", "2001:db8::1"]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ReputationCache(str(tmp_path / "reputation.sqlite3"), ttl=3600)
+
+
+async def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.01)
+
+
+async def enrich(enricher: ReputationEnricher, ips, done):
+    """Run ``enricher`` on ``ips`` until ``done()`` holds, then stop it."""
+    task = asyncio.create_task(enricher.run())
+    try:
+        await enricher.submit(ips)
+        await wait_for(done)
+    finally:
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await close_session()
+
+
+class StubAbuseIPDB:
+    """Local stand-in for the AbuseIPDB check API.
+
+    IPs in ``busy`` get one 429 (with ``retry_after``) before being answered,
+    IPs in ``failing`` always get a 500 and IPs in ``malformed`` a 200 whose
+    body is not JSON.
+    """
+    def __init__(self, busy=(), failing=(), malformed=(), retry_after: float = 0.2):
+        self.busy = set(busy)
+        self.failing = set(failing)
+        self.malformed = set(malformed)
+        self.retry_after = retry_after
+        self.requests = []
+        self.runner = None
+        self.url = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        ip = request.query["ipAddress"]
+        self.requests.append((ip, request.headers.get("Key"), time.monotonic()))
+        if ip in self.failing:
+            return web.Response(status=500)
+        if ip in self.malformed:
+            return web.Response(text="<html>Service temporarily unavailable</html>", content_type="text/html")
+        if ip in self.busy:
+            self.busy.discard(ip)
+            return web.Response(status=429, headers={"Retry-After": str(self.retry_after)})
+        return web.json_response({"data": {
+            "ipAddress": ip, "abuseConfidenceScore": 87, "totalReports": 12,
+            "lastReportedAt": "2026-10-01T00:00:00+00:00", "countryCode": "NL",
+            "isp": "Example ISP", "usageType": "Data Center/Web Hosting/Transit",
+        }})
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get("/api/v2/check", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}/api/v2/check"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+
+def stub_provider(stub: StubAbuseIPDB) -> AbuseIPDBProvider:
+    provider = AbuseIPDBProvider(api_key="test-key")
+    provider.url = stub.url
+    return provider
+
+
+def test_mock_provider_enriches_submitted_ips(cache):
+    enricher = ReputationEnricher(MockReputationProvider(), cache, RateLimiter(rate=1000, burst=100), batch_size=3)
+
+    asyncio.run(enrich(enricher, IPS, lambda: cache.fresh(IPS) == set(IPS)))
+
+    expected = {ip: asyncio.run(MockReputationProvider().check(ip)) for ip in IPS}
+    for ip in IPS:
+        entry = cache.get(ip)
+        assert entry["score"] == expected[ip]["score"]
+        assert entry["provider"] == "mock"
+        assert not entry["stale"]
+    assert not enricher.pending
+
+
+def test_submit_skips_cached_ips(cache):
+    cache.put_many({IPS[0]: {"ip": IPS[0], "score": 1}})
+    enricher = ReputationEnricher(MockReputationProvider(), cache, RateLimiter(rate=1000, burst=100))
+
+    asyncio.run(enricher.submit(IPS))
+
+    assert list(enricher.pending) == IPS[1:]
+
+
+def test_submit_replaces_backlog_up_to_limit(cache):
+    enricher = ReputationEnricher(MockReputationProvider(), cache, RateLimiter(rate=1000, burst=100), backlog=2)
+
+    asyncio.run(enricher.submit(IPS[:1]))
+    asyncio.run(enricher.submit(IPS[1:]))
+
+    assert list(enricher.pending) == IPS[1:3]
+
+
+def test_expired_entries_are_checked_again(tmp_path):
+    cache = ReputationCache(str(tmp_path / "reputation.sqlite3"), ttl=0.05)
+    cache.put_many({ip: {"ip": ip, "score": 5} for ip in IPS})
+    assert cache.fresh(IPS) == set(IPS)
+
+    time.sleep(0.1)
+
+    assert cache.fresh(IPS) == set()
+    assert cache.get(IPS[0])["stale"]
+    enricher = ReputationEnricher(MockReputationProvider(), cache, RateLimiter(rate=1000, burst=100))
+    asyncio.run(enricher.submit(IPS))
+    assert list(enricher.pending) == IPS
+
+
+def test_cache_is_shared_through_the_database(cache):
+    cache.put_many({IPS[0]: {"ip": IPS[0], "score": 42}})
+
+    other = ReputationCache(cache.path, ttl=3600)
+
+    assert other.get(IPS[0])["score"] == 42
+    assert other.get(IPS[1]) is None
+
+
+def test_rate_limiter_allows_burst_then_throttles():
+    async def main():
+        limiter = RateLimiter(rate=20, burst=2)
+        started = time.monotonic()
+        await limiter.acquire()
+        await limiter.acquire()
+        burst = time.monotonic() - started
+        await limiter.acquire()
+        throttled = time.monotonic() - started
+        return burst, throttled
+
+    burst, throttled = asyncio.run(main())
+
+    assert burst < 0.03
+    assert throttled >= 0.045
+
+
+def test_rate_limiter_refills_over_time():
+    async def main():
+        limiter = RateLimiter(rate=20, burst=2)
+        await limiter.acquire()
+        await limiter.acquire()
+        await asyncio.sleep(0.12)  # Refills both tokens (20/s), capped at the burst
+        started = time.monotonic()
+        await limiter.acquire()
+        await limiter.acquire()
+        refilled = time.monotonic() - started
+        await limiter.acquire()
+        return refilled, time.monotonic() - started, limiter.tokens
+
+    refilled, throttled, tokens = asyncio.run(main())
+
+    assert refilled < 0.03
+    assert throttled >= 0.045
+    assert tokens < 1
+
+
+def test_rate_limiter_pause_holds_every_waiter():
+    async def main():
+        limiter = RateLimiter(rate=100, burst=5)
+        limiter.pause(0.2)
+        started = time.monotonic()
+        await asyncio.gather(limiter.acquire(), limiter.acquire())
+        return time.monotonic() - started
+
+    assert asyncio.run(main()) >= 0.2
+
+
+def test_abuseipdb_provider_parses_check_response():
+    async def main():
+        async with StubAbuseIPDB() as stub:
+            provider = stub_provider(stub)
+            await provider.initialize()
+            try:
+                return await provider.check(IPS[0]), stub.requests
+            finally:
+                await provider.close()
+                await close_session()
+
+    result, requests = asyncio.run(main())
+
+    assert result == {
+        "ip": IPS[0], "provider": "abuseipdb", "score": 87, "reports": 12,
+        "last_reported": "2026-10-01T00:00:00+00:00", "country": "NL",
+        "isp": "Example ISP", "usage_type": "Data Center/Web Hosting/Transit",
+    }
+    assert requests[0][:2] == (IPS[0], "test-key")
+
+
+def test_abuseipdb_provider_raises_busy_on_429():
+    async def main():
+        async with StubAbuseIPDB(busy=[IPS[0]], retry_after=7) as stub:
+            provider = stub_provider(stub)
+            await provider.initialize()
+            try:
+                with pytest.raises(ProviderBusy) as busy:
+                    await provider.check(IPS[0])
+                return busy.value
+            finally:
+                await provider.close()
+                await close_session()
+
+    assert asyncio.run(main()).retry_after == 7
+
+
+def test_enricher_backs_off_on_429_and_retries(cache):
+    async def main():
+        async with StubAbuseIPDB(busy=[IPS[1]], retry_after=0.2) as stub:
+            limiter = RateLimiter(rate=1000, burst=100)
+            paused = []
+            pause = limiter.pause
+            limiter.pause = lambda seconds: (paused.append(seconds), pause(seconds))
+            enricher = ReputationEnricher(stub_provider(stub), cache, limiter, batch_size=10)
+            await enrich(enricher, IPS[:3], lambda: cache.fresh(IPS[:3]) == set(IPS[:3]))
+            return stub.requests, paused
+
+    requests, paused = asyncio.run(main())
+
+    assert paused == [0.2]
+    busy = [at for ip, _, at in requests if ip == IPS[1]]
+    assert len(busy) == 2
+    assert busy[1] - busy[0] >= 0.2
+    assert cache.get(IPS[1])["score"] == 87
+
+
+def test_enricher_skips_failed_checks(cache):
+    async def main():
+        async with StubAbuseIPDB(failing=[IPS[0]]) as stub:
+            enricher = ReputationEnricher(stub_provider(stub), cache, RateLimiter(rate=1000, burst=100))
+            await enrich(enricher, IPS[:2], lambda: len(stub.requests) >= 2 and cache.fresh(IPS[1:2]))
+            return stub.requests
+
+    requests = asyncio.run(main())
+
+    assert sorted(ip for ip, _, _ in requests) == sorted(IPS[:2])
+    assert cache.get(IPS[0]) is None
+    assert cache.get(IPS[1])["score"] == 87
+
+
+def test_enricher_survives_malformed_responses(cache):
+    async def main():
+        async with StubAbuseIPDB(malformed=[IPS[0]]) as stub:
+            enricher = ReputationEnricher(stub_provider(stub), cache, RateLimiter(rate=1000, burst=100))
+            task = asyncio.create_task(enricher.run())
+            try:
+                await enricher.submit(IPS[:2])
+                await wait_for(lambda: len(stub.requests) >= 2 and cache.fresh(IPS[1:2]))
+                # The loop is still running and checks what is submitted next
+                await enricher.submit(IPS[2:3])
+                await wait_for(lambda: cache.fresh(IPS[2:3]))
+                assert not task.done()
+            finally:
+                task.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+                await close_session()
+
+    asyncio.run(main())
+
+    assert cache.get(IPS[0]) is None
+    assert cache.get(IPS[2])["score"] == 87
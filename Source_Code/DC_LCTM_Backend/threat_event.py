@@ -0,0 +1,314 @@
+import json
+import os
+import re
+import struct
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from country_data import DATA_DIR, country_centroid, country_name, ensure_parent, load_country_table
+
+
+def canonical_label(value: str) -> str:
+    """Identity key for a label: case-folded with runs of whitespace, '_' and '-' collapsed."""
+    return " ".join(re.split(r"[\s_\-]+", value.strip().casefold())).strip()
+
+
+class Vocabulary:
+    """Process-wide mapping between strings and small integer ids.
+
+    Id 0 is reserved for "missing", so an id can be tested for truthiness the
+    same way the original string fields were. Ids are never reassigned while
+    the process runs; ``update`` adopts another process's assignments (the
+    collector service publishes its vocabulary to the web workers) and
+    ``save``/``load`` keep them stable across restarts. With ``normalize``,
+    values that normalize to the same key share one id and the first spelling
+    seen (whitespace-collapsed) is kept for display.
+    """
+    def __init__(self, initial: Iterable[str] = (), normalize: Optional[Callable[[str], str]] = None):
+        self.normalize = normalize
+        self._values: List[Optional[str]] = [None]
+        self._ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        for value in initial:
+            self.id(value)
+
+    def id(self, value: Optional[str]) -> int:
+        if not value:
+            return 0
+        found = self._ids.get(value)
+        if found is not None:
+            return found
+        with self._lock:
+            found = self._ids.get(value)
+            if found is None:
+                key = self.normalize(value) if self.normalize else value
+                if not key:
+                    return 0
+                found = self._ids.get(key)
+                if found is None:
+                    found = len(self._values)
+                    self._values.append(sys.intern(" ".join(value.split())))
+                    self._ids[key] = found
+                # Remember the raw spelling too, so repeats skip normalization
+                self._ids[value] = found
+        return found
+
+    def find(self, value: Optional[str]) -> int:
+        """The id of ``value``, or 0 when it has none; unlike ``id`` it never adds an entry."""
+        if not value:
+            return 0
+        found = self._ids.get(value)
+        if found is None:
+            key = self.normalize(value) if self.normalize else value
+            found = self._ids.get(key, 0) if key else 0
+        return found
+
+    def value(self, id_: int) -> Optional[str]:
+        return self._values[id_] if 0 <= id_ < len(self._values) else None
+
+    def values(self) -> List[Optional[str]]:
+        """All values indexed by id (index 0 is None)."""
+        return list(self._values)
+
+    def update(self, values: List[Optional[str]]) -> None:
+        """Adopt ids assigned elsewhere; ``values`` is indexed by id like ``values()``."""
+        with self._lock:
+            for id_, value in enumerate(values):
+                if not id_ or not value:
+                    continue
+                while len(self._values) <= id_:
+                    self._values.append(None)
+                self._values[id_] = sys.intern(value)
+                self._ids[self.normalize(value) if self.normalize else value] = id_
+                self._ids[value] = id_
+
+    def save(self, path: str) -> None:
+        ensure_parent(path)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.values(), f)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> bool:
+        try:
+            with open(path, "r") as f:
+                self.update(json.load(f))
+            return True
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+
+    def __len__(self) -> int:
+        return len(self._values) - 1
+
+
+# Countries are seeded in code order so their ids match across processes
+COUNTRIES = Vocabulary(sorted(load_country_table()["codes"]))
+# Attack types from every feed share ids once case and spacing are normalized
+ATTACK_TYPES = Vocabulary(normalize=canonical_label)
+ATTACK_TYPES_PATH = os.getenv("LCTM_ATTACK_TYPES", os.path.join(DATA_DIR, "attack-types.json"))
+# Raw events share one ``(type_id,)`` tuple per attack type instead of allocating their own
+_single_types: Dict[int, Tuple[int]] = {}
+
+
+def parse_timestamp(value) -> int:
+    """Normalize the feeds' timestamp formats to integer epoch milliseconds.
+
+    Accepts epoch seconds or milliseconds (numbers or numeric strings), ISO 8601
+    strings with or without a zone, and ``YYYY-MM-DD HH:MM:SS`` strings; naive
+    times are taken as UTC. Anything else (including missing values) maps to now.
+    """
+    if isinstance(value, str):
+        value = value.strip()
+        try:
+            value = float(value)
+        except ValueError:
+            pass
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+        # Values beyond year ~5138 in seconds are treated as milliseconds
+        return int(value if value > 1e11 else value * 1000)
+    if isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            parsed = None
+        if parsed is not None:
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            return int(parsed.timestamp() * 1000)
+    return int(time.time() * 1000)
+
+
+def format_timestamp(timestamp_ms: int) -> str:
+    """Format epoch milliseconds as an ISO 8601 UTC string."""
+    moment = datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.") + f"{timestamp_ms % 1000:03d}Z"
+
+
+def _single_type(type_id: int) -> Tuple[int, ...]:
+    if not type_id:
+        return ()
+    types = _single_types.get(type_id)
+    if types is None:
+        types = _single_types.setdefault(type_id, (type_id,))
+    return types
+
+
+def _coordinate(value) -> Optional[float]:
+    try:
+        return None if value in (None, "", "None") else float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ThreatEvent:
+    """Compact threat record used throughout the pipeline.
+
+    Countries and attack types are stored as ids from ``COUNTRIES`` and
+    ``ATTACK_TYPES``, and timestamps as epoch milliseconds. A raw event from a
+    parser carries one attack type and its attack name; an aggregated event
+    (one source/destination pair) carries every type seen and no name.
+    ``to_public`` produces the JSON shape served to clients.
+    """
+    __slots__ = ("timestamp_ms", "src", "dst", "attack_types", "count", "attack_name",
+                 "src_lat", "src_lon", "dst_lat", "dst_lon")
+
+    def __init__(self, timestamp_ms: int, src: int, dst: int, attack_types: Tuple[int, ...],
+                 count: int = 1, attack_name: Optional[str] = None,
+                 src_lat: Optional[float] = None, src_lon: Optional[float] = None,
+                 dst_lat: Optional[float] = None, dst_lon: Optional[float] = None):
+        self.timestamp_ms = timestamp_ms
+        self.src = src
+        self.dst = dst
+        self.attack_types = attack_types
+        self.count = count
+        self.attack_name = attack_name
+        self.src_lat = src_lat
+        self.src_lon = src_lon
+        self.dst_lat = dst_lat
+        self.dst_lon = dst_lon
+
+    @classmethod
+    def from_raw(cls, timestamp, src_code: Optional[str], dst_code: Optional[str],
+                 attack_type: Optional[str], attack_name: Optional[str] = None, count=None,
+                 src_lat=None, src_lon=None, dst_lat=None, dst_lon=None) -> "ThreatEvent":
+        """Build an event from the loosely typed values a feed provides."""
+        try:
+            count = int(count) if count not in (None, "") else 1
+        except (TypeError, ValueError):
+            count = 1
+        return cls(
+            timestamp_ms=parse_timestamp(timestamp),
+            src=COUNTRIES.id(src_code.strip().upper() if src_code else None),
+            dst=COUNTRIES.id(dst_code.strip().upper() if dst_code else None),
+            attack_types=_single_type(ATTACK_TYPES.id(attack_type)),
+            count=count or 1,
+            attack_name=sys.intern(attack_name) if attack_name else None,
+            src_lat=_coordinate(src_lat), src_lon=_coordinate(src_lon),
+            dst_lat=_coordinate(dst_lat), dst_lon=_coordinate(dst_lon),
+        )
+
+    @classmethod
+    def from_public(cls, record: Dict) -> "ThreatEvent":
+        """Rebuild an aggregated event from its public JSON shape."""
+        return cls(
+            timestamp_ms=parse_timestamp(record.get("Timestamp")),
+            src=COUNTRIES.id(record.get("Source Country Code")),
+            dst=COUNTRIES.id(record.get("Destination Country Code")),
+            attack_types=tuple(ATTACK_TYPES.id(name) for name in record.get("Attack Types") or ()),
+            count=record.get("Attack Count") or 1,
+            src_lat=record.get("Source Latitude"), src_lon=record.get("Source Longitude"),
+            dst_lat=record.get("Destination Latitude"), dst_lon=record.get("Destination Longitude"),
+        )
+
+    def fingerprint(self) -> bytes:
+        """Compact identity of a raw event, for recognizing it again in a later poll."""
+        return (struct.pack(f"<qHHI{len(self.attack_types)}H", self.timestamp_ms, self.src, self.dst,
+                            min(self.count, 0xFFFFFFFF), *self.attack_types)
+                + (self.attack_name or "").encode("utf-8"))
+
+    def to_public(self) -> Dict:
+        src_code, dst_code = COUNTRIES.value(self.src), COUNTRIES.value(self.dst)
+        src_lat, src_lon = (self.src_lat, self.src_lon) if self.src_lat is not None else country_centroid(src_code)
+        dst_lat, dst_lon = (self.dst_lat, self.dst_lon) if self.dst_lat is not None else country_centroid(dst_code)
+        return {
+            "Source Country Code": src_code,
+            "Source Country Name": country_name(src_code),
+            "Source Latitude": src_lat,
+            "Source Longitude": src_lon,
+            "Destination Country Code": dst_code,
+            "Destination Country Name": country_name(dst_code),
+            "Destination Latitude": dst_lat,
+            "Destination Longitude": dst_lon,
+            "Attack Count": self.count,
+            "Attack Types": [ATTACK_TYPES.value(type_id) for type_id in self.attack_types],
+            "Timestamp": format_timestamp(self.timestamp_ms)
+        }
+
+    def __repr__(self) -> str:
+        return (f"ThreatEvent({COUNTRIES.value(self.src)}->{COUNTRIES.value(self.dst)}, "
+                f"types={self.attack_types}, count={self.count}, t={self.timestamp_ms})")
+
+
+def to_public(events: Iterable[ThreatEvent]) -> List[Dict]:
+    return [event.to_public() for event in events]
+
+
+def group_by_pair(events: Iterable[ThreatEvent]) -> List[ThreatEvent]:
+    """Merge events per source/destination pair: summed counts, united attack types, latest time."""
+    pairs: Dict[Tuple[int, int], ThreatEvent] = {}
+    for event in events:
+        pair = pairs.get((event.src, event.dst))
+        if pair is None:
+            pairs[(event.src, event.dst)] = ThreatEvent(
+                event.timestamp_ms, event.src, event.dst, event.attack_types, event.count,
+                src_lat=event.src_lat, src_lon=event.src_lon, dst_lat=event.dst_lat, dst_lon=event.dst_lon
+            )
+            continue
+        pair.count += event.count
+        pair.timestamp_ms = max(pair.timestamp_ms, event.timestamp_ms)
+        for type_id in event.attack_types:
+            if type_id not in pair.attack_types:
+                pair.attack_types += (type_id,)
+    return list(pairs.values())
+
+
+# Binary record: src id, dst id, count, timestamp (ms), src lat/lon, dst lat/lon (float32, NaN if
+# unknown), number of attack types; followed by that many uint16 attack-type ids
+BINARY_RECORD = struct.Struct("<HHIqffffB")
+_NAN = float("nan")
+
+
+def pack_events(events: List[ThreatEvent]) -> bytes:
+    """Pack events into little-endian binary records, decodable with the ``/dictionary`` ids."""
+    parts = [struct.pack("<I", len(events))]
+    for event in events:
+        src_lat, src_lon = (event.src_lat, event.src_lon) if event.src_lat is not None \
+            else country_centroid(COUNTRIES.value(event.src))
+        dst_lat, dst_lon = (event.dst_lat, event.dst_lon) if event.dst_lat is not None \
+            else country_centroid(COUNTRIES.value(event.dst))
+        types = event.attack_types[:255]
+        parts.append(BINARY_RECORD.pack(
+            event.src, event.dst, min(event.count, 0xFFFFFFFF), event.timestamp_ms,
+            _NAN if src_lat is None else src_lat, _NAN if src_lon is None else src_lon,
+            _NAN if dst_lat is None else dst_lat, _NAN if dst_lon is None else dst_lon,
+            len(types)
+        ))
+        parts.append(struct.pack(f"<{len(types)}H", *types))
+    return b"".join(parts)
+
+
+def dictionary() -> Dict:
+    """Id tables clients use to decode country and attack-type ids."""
+    return {
+        "countries": [
+            {"id": id_, "code": code, "name": country_name(code)}
+            for id_, code in enumerate(COUNTRIES.values()) if code
+        ],
+        "attack_types": [
+            {"id": id_, "name": name}
+            for id_, name in enumerate(ATTACK_TYPES.values()) if name
+        ],
+    }
@@ -0,0 +1,190 @@
+import logging
+import os
+import re
+import struct
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+from threat_event import ATTACK_TYPES, COUNTRIES, ThreatEvent, canonical_label
+
+logger = logging.getLogger(__name__)
+
+# Rolling windows (seconds) served by /stats/matrix
+MATRIX_WINDOWS = tuple(sorted(int(value) for value in os.getenv("LCTM_MATRIX_WINDOWS", "60,300,900,3600").split(",")))
+# Arrivals are bucketed by this many seconds; a window is exact to within one bucket
+MATRIX_BUCKET_SECONDS = float(os.getenv("LCTM_MATRIX_BUCKET_SECONDS", "10"))
+# Optional attack-type groups, e.g. "ddos=ddos,dos attack;web=web attacker,sql injection";
+# types in no group count as "other"
+MATRIX_GROUPS = os.getenv("LCTM_MATRIX_GROUPS", "")
+
+# magic, country count, group count, window (s), total attacks, generated (epoch ms)
+MATRIX_HEADER = struct.Struct("<4sHHIQq")
+MATRIX_MAGIC = b"LCM1"
+
+
+def parse_groups(value: str) -> Dict[str, List[str]]:
+    """``name=type,type;name=type`` to {name: [canonical type labels]}."""
+    groups: Dict[str, List[str]] = {}
+    for item in value.split(";"):
+        name, _, types = item.partition("=")
+        if name.strip() and types.strip():
+            groups[name.strip()] = [canonical_label(label) for label in types.split(",") if label.strip()]
+    return groups
+
+
+def parse_window(value: Optional[str]) -> int:
+    """Window length in seconds from ``300``, ``300s``, ``5m`` or ``1h``."""
+    match = re.fullmatch(r"\s*(\d+)\s*([smh]?)\s*", value or "")
+    if not match:
+        raise ValueError(f"Invalid window {value!r}")
+    return int(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+
+
+class CountryMatrix:
+    """Source × destination attack counts over rolling windows, per attack-type group.
+
+    Each window keeps a dense ``groups × countries × countries`` int64 array,
+    indexed by the country ids of ``COUNTRIES``. A batch is added to every
+    window with one scatter-add; arrivals are also kept sparsely, per time
+    bucket, so a bucket is subtracted the same way once it leaves a window.
+    An event counts towards the group of its first attack type. Counts use
+    arrival time, since feed timestamps lag by different amounts. numpy is
+    only imported, and the arrays allocated, once the first batch or query
+    arrives, so creating a matrix costs nothing at startup.
+    """
+    def __init__(self, windows: Tuple[int, ...] = MATRIX_WINDOWS, bucket_seconds: float = MATRIX_BUCKET_SECONDS,
+                 groups: Optional[Dict[str, List[str]]] = None):
+        self.windows = tuple(sorted(windows))
+        self.bucket_seconds = bucket_seconds
+        group_types = parse_groups(MATRIX_GROUPS) if groups is None else groups
+        self.groups = list(group_types) + ["other"]
+        self._group_of_label = {label: index for index, labels in enumerate(group_types.values()) for label in labels}
+        self._type_groups: Optional["np.ndarray"] = None  # Group index per attack-type id
+        self.size = 0
+        self.counts: Dict[int, "np.ndarray"] = {}
+        # (bucket number, group, source, destination, count) arrays; the last bucket is still filling
+        self.buckets: Deque[Tuple[int, List["np.ndarray"]]] = deque()
+        self._step: Optional[int] = None  # Last bucket number expiry was brought up to
+        self._lock = threading.Lock()
+
+    def _grow(self, countries: int) -> None:
+        size = max(256, 1 << (countries - 1).bit_length())
+        if size <= self.size:
+            return
+        import numpy as np  # Deferred: only loaded once threats are counted or a matrix is requested
+        for window in self.windows:
+            grown = np.zeros((len(self.groups), size, size), dtype=np.int64)
+            if window in self.counts:
+                grown[:, :self.size, :self.size] = self.counts[window]
+            self.counts[window] = grown
+        self.size = size
+
+    def _groups_for(self, type_ids: "np.ndarray") -> "np.ndarray":
+        import numpy as np
+        if self._type_groups is None:
+            self._type_groups = np.zeros(0, dtype=np.int16)
+        known = len(self._type_groups)
+        needed = int(type_ids.max(initial=0)) + 1
+        if needed > known:
+            other = len(self.groups) - 1
+            added = [self._group_of_label.get(canonical_label(ATTACK_TYPES.value(type_id) or ""), other)
+                     for type_id in range(known, needed)]
+            self._type_groups = np.concatenate([self._type_groups, np.array(added, dtype=np.int16)])
+        return self._type_groups[type_ids]
+
+    def _apply(self, window: int, columns: List["np.ndarray"], sign: int) -> None:
+        import numpy as np
+        group, src, dst, count = columns
+        np.add.at(self.counts[window], (group, src, dst), count * sign)
+
+    def _expire(self, bucket: int) -> None:
+        """Subtract buckets that have left each window; caller holds the lock."""
+        for number, columns in self.buckets:
+            age = (bucket - number) * self.bucket_seconds
+            for window in self.windows:
+                # A bucket leaves a window exactly once: in the bucket step where its age first reaches it
+                if window <= age < window + self.bucket_seconds:
+                    self._apply(window, columns, -1)
+        while self.buckets and (bucket - self.buckets[0][0]) * self.bucket_seconds >= self.windows[-1]:
+            self.buckets.popleft()
+
+    def _advance(self, now: float) -> int:
+        """Bring the buckets up to ``now``, expiring one bucket step at a time; caller holds the lock."""
+        bucket = int(now // self.bucket_seconds)
+        if self._step is not None:
+            for step in range(self._step + 1, bucket + 1):
+                if not self.buckets:
+                    break
+                self._expire(step)
+        self._step = bucket if self._step is None else max(self._step, bucket)
+        return bucket
+
+    def add(self, events: List[ThreatEvent], now: Optional[float] = None) -> None:
+        if not events:
+            return
+        import numpy as np
+        src = np.fromiter((event.src for event in events), dtype=np.int32, count=len(events))
+        dst = np.fromiter((event.dst for event in events), dtype=np.int32, count=len(events))
+        count = np.fromiter((event.count for event in events), dtype=np.int64, count=len(events))
+        first_type = np.fromiter((event.attack_types[0] if event.attack_types else 0 for event in events),
+                                 dtype=np.int32, count=len(events))
+        with self._lock:
+            self._grow(int(max(src.max(), dst.max())) + 1)
+            columns = [self._groups_for(first_type), src, dst, count]
+            bucket = self._advance(time.time() if now is None else now)
+            if self.buckets and self.buckets[-1][0] == bucket:
+                self.buckets[-1] = (bucket, [np.concatenate(pair) for pair in zip(self.buckets[-1][1], columns)])
+            else:
+                self.buckets.append((bucket, columns))
+            for window in self.windows:
+                self._apply(window, columns, 1)
+
+    def window_for(self, seconds: int) -> int:
+        """The smallest maintained window covering ``seconds`` (the largest if none does)."""
+        return next((window for window in self.windows if window >= seconds), self.windows[-1])
+
+    def matrix(self, window: int, group: Optional[str] = None, now: Optional[float] = None) -> "np.ndarray":
+        """Counts for ``window`` (one of ``windows``) as a countries × countries array (row = source).
+
+        ``group`` selects one attack-type group; by default all groups are summed.
+        """
+        with self._lock:
+            countries = len(COUNTRIES) + 1
+            self._grow(countries)
+            self._advance(time.time() if now is None else now)
+            counts = self.counts[window]
+            if group is None:
+                return counts[:, :countries, :countries].sum(axis=0)
+            return counts[self.groups.index(group), :countries, :countries].copy()
+
+    def to_binary(self, matrix: "np.ndarray", window: int) -> bytes:
+        """Header, then the matrix, row sums and column sums as little-endian uint32 (ids per /dictionary)."""
+        import numpy as np
+        clipped = np.minimum(matrix, 0xFFFFFFFF).astype("<u4")
+        header = MATRIX_HEADER.pack(MATRIX_MAGIC, matrix.shape[0], len(self.groups), window,
+                                    int(matrix.sum()), int(time.time() * 1000))
+        return (header + clipped.tobytes()
+                + np.minimum(matrix.sum(axis=1), 0xFFFFFFFF).astype("<u4").tobytes()
+                + np.minimum(matrix.sum(axis=0), 0xFFFFFFFF).astype("<u4").tobytes())
+
+    def to_sparse(self, matrix: "np.ndarray", window: int, group: Optional[str] = None) -> Dict:
+        """Non-zero cells as [source, destination, count] by country code, with row and column sums."""
+        import numpy as np
+        src, dst = np.nonzero(matrix)
+        codes = COUNTRIES.values()
+        rows, cols = matrix.sum(axis=1), matrix.sum(axis=0)
+        return {
+            "window": window,
+            "group": group or "all",
+            "groups": self.groups,
+            "total": int(matrix.sum()),
+            "pairs": [[codes[s], codes[d], int(c)] for s, d, c in zip(src.tolist(), dst.tolist(),
+                                                                       matrix[src, dst].tolist())],
+            "sources": {codes[i]: int(rows[i]) for i in np.flatnonzero(rows).tolist()},
+            "destinations": {codes[i]: int(cols[i]) for i in np.flatnonzero(cols).tolist()},
+        }
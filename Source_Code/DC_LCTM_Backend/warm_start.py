@@ -0,0 +1,84 @@
+import gzip
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from country_data import DATA_DIR, ensure_parent
+
+logger = logging.getLogger(__name__)
+
+# Collector state checkpoint loaded at startup; set LCTM_STATE_PATH to "" to disable warm starts
+STATE_PATH = os.getenv("LCTM_STATE_PATH", os.path.join(DATA_DIR, "state.json.gz"))
+# Seconds between checkpoints (one is also written on shutdown)
+STATE_INTERVAL = float(os.getenv("LCTM_STATE_INTERVAL", "60"))
+# Threat batches received within this many seconds before a checkpoint are kept in it
+STATE_THREAT_WINDOW = float(os.getenv("LCTM_STATE_THREAT_WINDOW", "300"))
+# Checkpoints older than this many seconds are ignored at startup
+STATE_MAX_AGE = float(os.getenv("LCTM_STATE_MAX_AGE", str(24 * 3600)))
+STATE_VERSION = 1
+
+
+def pack_ips(entries: List[Dict], source_masks: Dict[str, int]) -> Dict[str, List]:
+    """Store an IP list column by column, with each type name listed once."""
+    types: List[Optional[str]] = []
+    type_index: Dict[Optional[str], int] = {}
+    columns = {"ip": [], "lat": [], "lon": [], "type": [], "mask": []}
+    for item in entries:
+        source_type = item.get("type")
+        if source_type not in type_index:
+            type_index[source_type] = len(types)
+            types.append(source_type)
+        columns["ip"].append(item["ip"])
+        columns["lat"].append(item.get("latitude"))
+        columns["lon"].append(item.get("longitude"))
+        columns["type"].append(type_index[source_type])
+        columns["mask"].append(source_masks.get(item["ip"], 0))
+    columns["types"] = types
+    return columns
+
+
+def unpack_ips(columns: Dict[str, List]) -> Tuple[List[Dict], Dict[str, int]]:
+    """Rebuild the IP entries and source masks stored by ``pack_ips``."""
+    types = columns["types"]
+    entries = [
+        {"ip": ip, "latitude": lat, "longitude": lon, "type": types[type_id]}
+        for ip, lat, lon, type_id in zip(columns["ip"], columns["lat"], columns["lon"], columns["type"])
+    ]
+    return entries, dict(zip(columns["ip"], columns["mask"]))
+
+
+def save_state(state: Dict, path: str = STATE_PATH) -> int:
+    """Write a checkpoint as gzipped JSON and atomically replace ``path``; returns its size in bytes."""
+    payload = gzip.compress(
+        json.dumps({"version": STATE_VERSION, "saved_ms": int(time.time() * 1000), **state},
+                   separators=(",", ":")).encode("utf-8"),
+        compresslevel=6
+    )
+    ensure_parent(path)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(payload)
+    os.replace(temporary, path)
+    return len(payload)
+
+
+def load_state(path: str = STATE_PATH, max_age: float = STATE_MAX_AGE) -> Optional[Dict]:
+    """The checkpoint at ``path``, or None when it is missing, unreadable, from another version or too old."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            state = json.loads(gzip.decompress(f.read()))
+    except (OSError, EOFError, ValueError) as e:
+        logger.warning(f"Warm start: Ignoring unreadable state {path}: {e}")
+        return None
+    if state.get("version") != STATE_VERSION:
+        logger.info(f"Warm start: Ignoring state version {state.get('version')} in {path}")
+        return None
+    age = time.time() - state.get("saved_ms", 0) / 1000
+    if age > max_age:
+        logger.info(f"Warm start: Ignoring state saved {age:.0f}s ago")
+        return None
+    return state
@@ -0,0 +1,189 @@
+import json
+import logging
+import queue
+import zlib
+from typing import Dict, List, Optional
+
+from ip_snapshot import IPSnapshot, IPSnapshotReader
+from stream_hub import ThreatStreamHub, ThreatFilter, Subscriber, encode_threats
+from threat_event import ThreatEvent, dictionary, group_by_pair, COUNTRIES, ATTACK_TYPES
+
+logger = logging.getLogger(__name__)
+
+WS_TOPICS = ("threats", "news", "ips")
+# Threat frames held back for a client out of credit before they are merged into one summary
+MAX_PENDING = 32
+# How long each loop iteration waits for a control message
+POLL_SECONDS = 0.05
+
+
+class TopicState:
+    """One topic subscription on a WebSocket session.
+
+    ``credit`` is the number of frames the client is still willing to take,
+    or None for no flow control; each frame sent uses one and ``ack``
+    messages grant more.
+    """
+    def __init__(self, credit: Optional[int] = None):
+        self.credit = credit
+        self.subscriber: Optional[Subscriber] = None
+        self.pending: List[tuple] = []
+        self.sent = None
+
+    @property
+    def can_send(self) -> bool:
+        return self.credit is None or self.credit > 0
+
+    def spend(self) -> None:
+        if self.credit is not None:
+            self.credit -= 1
+
+
+class MultiplexSession:
+    """Serves threats, news and malicious-IP updates over one WebSocket.
+
+    Clients send JSON control messages, ``{"op": "subscribe", "topic": ...}``
+    (with optional ``filter``, ``last_event_id``, ``window`` and, for ips,
+    ``generation``), ``{"op": "unsubscribe", "topic": ...}`` and
+    ``{"op": "ack", "topic": ..., "credit": n}``. With the ``json`` encoding
+    every frame is a JSON text message carrying its ``topic``. With
+    ``binary``, threat batches are packed records (see
+    ``threat_event.pack_events``) behind a ``T`` tag and news / ips are
+    zlib-compressed JSON behind ``N`` / ``I`` tags, while the dictionary
+    needed to decode ids stays JSON text and is re-sent whenever it grows.
+    Malicious IPs are sent in full once, then as deltas between generations.
+    """
+    def __init__(self, ws, hub: ThreatStreamHub, ip_snapshots: IPSnapshotReader, encoding: str = "json"):
+        if encoding not in ("json", "binary"):
+            raise ValueError("encoding must be json or binary")
+        self.ws = ws
+        self.hub = hub
+        self.ip_snapshots = ip_snapshots
+        self.encoding = encoding
+        self.topics: Dict[str, TopicState] = {}
+        self.dictionary_sizes = (0, 0)
+
+    def run(self) -> None:
+        try:
+            while True:
+                message = self.ws.receive(timeout=POLL_SECONDS)
+                if message is not None:
+                    self.handle(message)
+                self.flush()
+        finally:
+            for name in list(self.topics):
+                self.unsubscribe(name)
+
+    def send_json(self, message: Dict) -> None:
+        self.ws.send(json.dumps(message))
+
+    def send_blob(self, tag: bytes, message: Dict) -> None:
+        """Send a snapshot-style message as JSON text, or tagged and compressed when binary."""
+        text = json.dumps(message)
+        self.ws.send(tag + zlib.compress(text.encode("utf-8")) if self.encoding == "binary" else text)
+
+    def handle(self, message) -> None:
+        try:
+            request = json.loads(message)
+            op, topic = request.get("op"), request.get("topic")
+            if topic not in WS_TOPICS:
+                raise ValueError(f"unknown topic {topic!r}")
+            if op == "subscribe":
+                self.subscribe(topic, request)
+            elif op == "unsubscribe":
+                self.unsubscribe(topic)
+            elif op == "ack":
+                state = self.topics.get(topic)
+                if state and state.credit is not None:
+                    state.credit += int(request.get("credit", 1))
+            else:
+                raise ValueError(f"unknown op {op!r}")
+        except (ValueError, TypeError, AttributeError) as e:
+            self.send_json({"topic": "error", "error": str(e)})
+
+    def subscribe(self, topic: str, request: Dict) -> None:
+        self.unsubscribe(topic)
+        window = request.get("window")
+        state = TopicState(int(window) if window is not None else None)
+        if topic == "threats":
+            args = {key: ",".join(value) if isinstance(value, list) else str(value)
+                    for key, value in (request.get("filter") or {}).items()}
+            last_event_id = request.get("last_event_id")
+            state.subscriber = self.hub.subscribe(
+                ThreatFilter.from_args(args), int(last_event_id) if last_event_id is not None else None,
+                encoding=self.encoding
+            )
+        elif topic == "ips" and request.get("generation") is not None:
+            # The client already holds this generation; only later changes are sent
+            snapshot = self.ip_snapshots.current()
+            if snapshot is not None and snapshot.generation == int(request["generation"]):
+                state.sent = snapshot
+        self.topics[topic] = state
+        logger.info(f"WebSocket: Subscribed to {topic} ({self.encoding})")
+
+    def unsubscribe(self, topic: str) -> None:
+        state = self.topics.pop(topic, None)
+        if state and state.subscriber:
+            self.hub.unsubscribe(state.subscriber)
+
+    def flush(self) -> None:
+        if "threats" in self.topics:
+            self._flush_threats(self.topics["threats"])
+        if "news" in self.topics:
+            self._flush_news(self.topics["news"])
+        if "ips" in self.topics:
+            self._flush_ips(self.topics["ips"])
+
+    def _send_dictionary(self) -> None:
+        # Binary frames carry ids only, so the client needs the tables first
+        sizes = (len(COUNTRIES), len(ATTACK_TYPES))
+        if self.encoding == "binary" and sizes != self.dictionary_sizes:
+            self.dictionary_sizes = sizes
+            self.send_json({"topic": "dictionary", "data": dictionary()})
+
+    def _flush_threats(self, state: TopicState) -> None:
+        while True:
+            try:
+                entry = state.subscriber.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                # Disconnected by the hub after stalling
+                self.ws.close(message="Threat subscription stalled")
+                return
+            if entry[1]:  # Heartbeats are unnecessary on a WebSocket
+                state.pending.append(entry)
+        behind = state.credit is not None and len(state.pending) > max(state.credit, 1)
+        if len(state.pending) > 1 and (behind or len(state.pending) > MAX_PENDING):
+            # More held back than the client will take: merge it into one per-pair summary
+            events: List[ThreatEvent] = group_by_pair(event for _, batch, _ in state.pending for event in batch)
+            sequence = state.pending[-1][0]
+            state.pending = [(sequence, events, encode_threats(self.encoding, sequence, events, "summary"))]
+        while state.pending and state.can_send:
+            self._send_dictionary()
+            self.ws.send(state.pending.pop(0)[2])
+            state.spend()
+
+    def _flush_news(self, state: TopicState) -> None:
+        news = self.hub.snapshots.get("news")
+        if news is None or news is state.sent or not state.can_send:
+            return
+        self.send_blob(b"N", {"topic": "news", "data": news})
+        state.sent = news
+        state.spend()
+
+    def _flush_ips(self, state: TopicState) -> None:
+        snapshot = self.ip_snapshots.current()
+        if snapshot is None or not state.can_send:
+            return
+        base: Optional[IPSnapshot] = state.sent
+        if base is not None and base.generation == snapshot.generation:
+            return
+        if base is None:
+            text = "".join(snapshot.iter_json())
+            message = f'{{"topic": "ips", "kind": "full", "generation": {snapshot.generation}, "data": {text}}}'
+            self.ws.send(b"I" + zlib.compress(message.encode("utf-8")) if self.encoding == "binary" else message)
+        else:
+            self.send_blob(b"I", {"topic": "ips", "kind": "delta", **self.ip_snapshots.delta(base, snapshot)})
+        state.sent = snapshot
+        state.spend()
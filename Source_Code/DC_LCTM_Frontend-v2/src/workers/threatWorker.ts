@@ -15,8 +15,8 @@ interface RawSSEThreat {
   Timestamp: string;
 }
 
-// Convert raw SSE data to our Attack type
-const convertSSEToAttack = (rawThreat: RawSSEThreat): Attack => {
+// Convert raw SSE data to our Attack type; ids derive from the server's event id
+const convertSSEToAttack = (rawThreat: RawSSEThreat, index: number, eventId: string): Attack => {
   // Helper function to map severity string to enum
   const mapSeverity = (severity: string): AttackSeverity => {
     const severityMap: { [key: string]: AttackSeverity } = {
@@ -46,7 +46,7 @@ const convertSSEToAttack = (rawThreat: RawSSEThreat): Attack => {
   };
 
   return {
-    id: crypto.randomUUID(),
+    id: eventId ? `${eventId}-${index}` : crypto.randomUUID(),
     source,
     target,
     type: rawThreat["Attack Types"] as AttackType[],
@@ -58,9 +58,12 @@ const convertSSEToAttack = (rawThreat: RawSSEThreat): Attack => {
 // Handle messages from the main thread
 self.onmessage = (event: MessageEvent) => {
   if (event.data.type === "START_SSE") {
-  const eventSource = new EventSource("/threats");
+  // Optional server-side filters: { src, dst, type, min_count, sample }
+  const params = new URLSearchParams(event.data.filters || {});
+  const query = params.toString();
+  const eventSource = new EventSource(query ? `/threats?${query}` : "/threats");
 
-    eventSource.onmessage = (event) => {
+    const handleBatch = (event: MessageEvent) => {
       try {
         const data = event.data;
         const trimmed = data && data.trim();
@@ -76,16 +79,20 @@ self.onmessage = (event: MessageEvent) => {
           self.postMessage({ type: "ERROR", error: "Error parsing SSE data: " + trimmed });
           return;
         }
-        const threats = rawThreats.map(convertSSEToAttack);
+        const threats = rawThreats.map((raw, index) => convertSSEToAttack(raw, index, event.lastEventId));
         self.postMessage({ type: "THREATS", data: threats });
       } catch (error) {
         self.postMessage({ type: "ERROR", error: "Error parsing SSE data (outer catch)" });
       }
     };
 
-    eventSource.onerror = (error) => {
-      self.postMessage({ type: "ERROR", error: "SSE Error" });
-      eventSource.close();
+    eventSource.onmessage = handleBatch;
+    // Sent on reconnect when the gap exceeds the server's replay window
+    eventSource.addEventListener("summary", handleBatch as EventListener);
+
+    eventSource.onerror = () => {
+      // Leave the connection open: the browser reconnects and sends Last-Event-ID
+      self.postMessage({ type: "ERROR", error: "SSE Error (reconnecting)" });
     };
 
     // Store the EventSource instance